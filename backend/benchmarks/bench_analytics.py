@@ -0,0 +1,149 @@
+# benchmarks/bench_analytics.py
+# Throughput of POST /analytics/track, driven in-process through httpx against a throwaway
+# analytics database. Requests never leave the process, so latency is the time the handler
+# holds the event loop; "persisted" includes the time the writer needs to catch up, and
+# "writer drain" is the writer alone working through a full backlog. Profile loads then
+# revalidate GET /analytics/user/{visitor_id} with the ETag from a first load.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_analytics --requests 5000 --concurrency 64 --visitors 200
+#   python -m benchmarks.bench_analytics --batch-size 1     # one transaction per event, for comparison
+import argparse
+import asyncio
+import os
+import random
+import resource
+import tempfile
+import time
+from typing import Dict
+
+import httpx
+
+from benchmarks.bench_process_audio import percentile
+
+PAGES = ["/", "/pricing", "/exercise/1", "/exercise/2", "/blog", "/waitlist"]
+EVENTS = [None, None, "start_session", "complete_exercise", "click"]
+
+def payload(rng: random.Random, visitors: int) -> Dict:
+    visitor = rng.randrange(visitors)
+    return {
+        "visitor_id": f"visitor-{visitor}",
+        "session_id": f"session-{visitor}-{rng.randrange(3)}",
+        "timestamp": int(time.time() * 1000),
+        "page": rng.choice(PAGES),
+        "user_agent": "Mozilla/5.0 (bench)",
+        "screen_resolution": "1920x1080",
+        "device_type": rng.choice(["desktop", "mobile", "tablet"]),
+        "location": {"city": "San Francisco", "country": "US"},
+        "event_type": rng.choice(EVENTS),
+        "event_data": {"source": "bench"},
+    }
+
+async def run(args) -> Dict:
+    from fastapi import FastAPI
+    from database.analytics import analytics_store
+    from route.models.analytics import router
+
+    app = FastAPI()
+    app.include_router(router, prefix="/analytics")
+    rng = random.Random(args.seed)
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one():
+                nonlocal failures
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post("/analytics/track", json=payload(rng, args.visitors))
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200 or not response.json().get("success"):
+                        failures += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(args.requests)))
+            accepted = time.perf_counter() - started
+            # Time for the writer to persist everything that was accepted
+            await asyncio.to_thread(analytics_store.join)
+            persisted = time.perf_counter() - started
+
+            # Profile loads as the site makes them: revalidating with the ETag it already holds
+            etags = {}
+            for visitor in range(args.visitors):
+                response = await client.get(f"/analytics/user/visitor-{visitor}")
+                etags[visitor] = response.headers["etag"]
+            profile_latencies, not_modified = [], 0
+
+            async def load_profile():
+                nonlocal not_modified
+                visitor = rng.randrange(args.visitors)
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(
+                        f"/analytics/user/visitor-{visitor}", headers={"If-None-Match": etags[visitor]}
+                    )
+                    profile_latencies.append(time.perf_counter() - started)
+                    not_modified += response.status_code == 304
+
+            started = time.perf_counter()
+            await asyncio.gather(*(load_profile() for _ in range(args.requests)))
+            profiles = time.perf_counter() - started
+
+        # Writer on its own: the same volume queued at once, without HTTP in front of it
+        backlog = [payload(rng, args.visitors) for _ in range(args.requests)]
+        started = time.perf_counter()
+        for data in backlog:
+            analytics_store.submit(data)
+        await asyncio.to_thread(analytics_store.join)
+        drained = time.perf_counter() - started
+
+    return {
+        "latencies": latencies,
+        "failures": failures,
+        "accepted": accepted,
+        "persisted": persisted,
+        "drained": drained,
+        "profile_latencies": profile_latencies,
+        "profiles": profiles,
+        "not_modified": not_modified,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark for POST /analytics/track")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--visitors", type=int, default=100, help="Distinct visitor ids in the synthetic traffic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=500, help="ANALYTICS_BATCH_SIZE for the writer")
+    parser.add_argument("--flush-interval", type=float, default=0.25, help="ANALYTICS_FLUSH_INTERVAL for the writer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before database.analytics is imported
+        os.environ["ANALYTICS_DB_PATH"] = os.path.join(tmp, "analytics.db")
+        os.environ.setdefault("ANALYTICS_QUEUE_SIZE", str(max(args.requests, 10000)))
+        os.environ["ANALYTICS_BATCH_SIZE"] = str(args.batch_size)
+        os.environ["ANALYTICS_FLUSH_INTERVAL"] = str(args.flush_interval)
+        stats = asyncio.run(run(args))
+
+    latencies = stats["latencies"]
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}, {args.visitors} visitors, "
+          f"batch size {args.batch_size}, flush interval {args.flush_interval}s")
+    print(f"accepted      {len(latencies) / stats['accepted']:>9.1f} req/s")
+    print(f"persisted     {len(latencies) / stats['persisted']:>9.1f} events/s")
+    print(f"writer drain  {args.requests / stats['drained']:>9.1f} events/s")
+    print(f"p50 / p95 / p99  {percentile(latencies, 50) * 1000:.1f} / "
+          f"{percentile(latencies, 95) * 1000:.1f} / {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"errors        {stats['failures']}")
+    profile_latencies = stats["profile_latencies"]
+    print(f"profile loads {len(profile_latencies) / stats['profiles']:>9.1f} req/s, "
+          f"p50 {percentile(profile_latencies, 50) * 1000:.1f} ms, "
+          f"p99 {percentile(profile_latencies, 99) * 1000:.1f} ms, "
+          f"{stats['not_modified'] / len(profile_latencies):.0%} 304")
+    # ru_maxrss is KB on Linux
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/bench_analytics_rollups.py
+# Dashboard queries answered from the hourly/daily rollups versus the same questions asked of raw
+# per-event rows, over a synthetic dataset. Rollup query time should stay flat as --events grows;
+# raw scans grow with it.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_analytics_rollups --events 2000000 --days 90 --visitors 50000
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from database.analytics import SCHEMA, connect
+from database.analytics_rollups import active_visitors, record_rollups, summary, top_values
+
+CHUNK = 50000
+EVENT_TYPES = ["view", "view", "view", "click", "start_session", "complete_exercise"]
+DEVICES = ["desktop", "mobile", "tablet"]
+COUNTRIES = ["US", "GB", "DE", "FR", "IN", "BR", "CA", "JP"]
+
+def populate(conn, args, end: datetime):
+    """Write the synthetic events to user_events and, in the same chunks, to the rollups."""
+    rng = random.Random(args.seed)
+    span_ms = args.days * 86400 * 1000
+    end_ms = int((end - datetime(1970, 1, 1)).total_seconds() * 1000)
+    pages = [f"/page/{i}" for i in range(args.pages)]
+    c = conn.cursor()
+    written = 0
+    while written < args.events:
+        size = min(CHUNK, args.events - written)
+        rollup_rows, raw_rows = [], []
+        for _ in range(size):
+            timestamp = end_ms - rng.randrange(span_ms)
+            visitor_id = f"visitor-{int(rng.paretovariate(1.2)) % args.visitors}"
+            page = pages[min(int(rng.expovariate(0.1)), args.pages - 1)]
+            event_type = rng.choice(EVENT_TYPES)
+            rollup_rows.append((timestamp, visitor_id, page, rng.choice(DEVICES), rng.choice(COUNTRIES), event_type, 1.0))
+            moment = datetime.utcfromtimestamp(timestamp / 1000).isoformat()
+            raw_rows.append((visitor_id, event_type, None, moment, page, 1.0))
+        record_rollups(c, rollup_rows)
+        c.executemany(
+            'INSERT INTO user_events (visitor_id, event_type, event_data, timestamp, page, engagement_value) VALUES (?, ?, ?, ?, ?, ?)',
+            raw_rows
+        )
+        conn.commit()
+        written += size
+        print(f"\r  {written}/{args.events} events", end="", flush=True)
+    print()
+
+def timed(query: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup vs raw-scan dashboard queries over synthetic analytics")
+    parser.add_argument("--events", type=int, default=2000000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--visitors", type=int, default=50000)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--range-days", type=int, default=30, help="Range each dashboard query covers")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=args.range_days)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(os.path.join(tmp, "analytics.db"))
+        for statement in SCHEMA:
+            conn.execute(statement)
+        started = time.perf_counter()
+        populate(conn, args, end)
+        ingest = time.perf_counter() - started
+        c = conn.cursor()
+
+        def raw(sql: str, *params):
+            return lambda: c.execute(sql, params).fetchall()
+
+        iso_start, iso_end = start.isoformat(), end.isoformat()
+        queries: Dict[str, List[Callable[[], object]]] = {
+            f"daily series, {args.range_days}d": [
+                lambda: summary(c, start, end, "day"),
+                raw('''SELECT substr(timestamp, 1, 10), COUNT(*), COUNT(DISTINCT visitor_id) FROM user_events
+                       WHERE timestamp >= ? AND timestamp < ? GROUP BY 1''', iso_start, iso_end),
+            ],
+            "hourly series, 7d": [
+                lambda: summary(c, end - timedelta(days=7), end, "hour"),
+                raw('''SELECT substr(timestamp, 1, 13), COUNT(*) FROM user_events
+                       WHERE timestamp >= ? AND timestamp < ? GROUP BY 1''', (end - timedelta(days=7)).isoformat(), iso_end),
+            ],
+            f"top pages, {args.range_days}d": [
+                lambda: top_values(c, "page", start, end),
+                raw('''SELECT page, COUNT(*) AS views FROM user_events WHERE timestamp >= ? AND timestamp < ?
+                       GROUP BY page ORDER BY views DESC LIMIT 10''', iso_start, iso_end),
+            ],
+            "DAU/WAU/MAU": [
+                lambda: active_visitors(c, end),
+                raw('''SELECT COUNT(DISTINCT visitor_id) FROM user_events WHERE timestamp >= ? AND timestamp < ?''',
+                    (end - timedelta(days=30)).isoformat(), iso_end),
+            ],
+        }
+
+        sizes = {
+            table: c.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("user_events", "analytics_hourly", "analytics_daily", "analytics_daily_visitors")
+        }
+        print(f"\n{args.events} events over {args.days} days, {args.visitors} visitors; "
+              f"ingest with rollups {args.events / ingest:.0f} events/s")
+        print("rows: " + ", ".join(f"{table} {count}" for table, count in sizes.items()))
+        print(f"{'query':<24}{'rollup ms':>12}{'raw scan ms':>14}{'speedup':>10}")
+        for name, (rollup_query, raw_query) in queries.items():
+            rollup_time = timed(rollup_query, args.repeat)
+            raw_time = timed(raw_query, args.repeat)
+            print(f"{name:<24}{rollup_time * 1000:>12.2f}{raw_time * 1000:>14.1f}{raw_time / rollup_time:>9.0f}x")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_device_registration.py
+# Fleet-sized device registration traffic, per-device calls versus the bulk endpoints, driven
+# in-process through httpx against a throwaway SQLite database:
+#   register    N x POST /register            vs  POST /register/bulk in MAX_BULK_DEVICES batches
+#   check       N x POST /register/check      vs  POST /register/check/bulk
+#   list        walking every X-Next-Cursor page of GET /register; the last page should cost
+#               about as much as the first, since each one is an index seek
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_device_registration --devices 5000 --page-size 500
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+def registrations(rng: random.Random, devices: int, accounts: int) -> List[Dict]:
+    return [
+        {
+            "google_account_id": f"account-{rng.randrange(accounts)}",
+            "device_uuid": f"device-{i:08d}",
+            "id_token": "bench-token",
+            "device_name": "iPhone",
+            "os_version": "18.0",
+            "app_version": "1.0",
+        }
+        for i in range(devices)
+    ]
+
+def batches(items: List, size: int) -> List[List]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+async def run(args) -> Dict[str, Dict]:
+    from fastapi import FastAPI
+    from database.database_events import register_db_events
+    from database.devices import MAX_BULK_DEVICES
+    from route.models.device_registration import router
+
+    app = FastAPI()
+    register_db_events(app)
+    app.include_router(router, prefix="/v2/device")
+    rng = random.Random(args.seed)
+    first = registrations(rng, args.devices, args.accounts)
+    # Second fleet for the bulk run, so both runs insert rather than refresh
+    second = [{**item, "device_uuid": item["device_uuid"].replace("device-", "bulk-")} for item in first]
+    checks = [{"google_account_id": item["google_account_id"], "device_uuid": item["device_uuid"]} for item in first]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timings: Dict[str, Dict] = {}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def post(path: str, body) -> httpx.Response:
+                async with semaphore:
+                    response = await client.post(f"/v2/device{path}", json=body)
+                    response.raise_for_status()
+                    return response
+
+            async def timed(work) -> float:
+                started = time.perf_counter()
+                await work
+                return time.perf_counter() - started
+
+            timings["register"] = {
+                "per-device": await timed(asyncio.gather(*(post("/register", item) for item in first))),
+                "bulk": await timed(asyncio.gather(*(
+                    post("/register/bulk", {"devices": batch}) for batch in batches(second, MAX_BULK_DEVICES)
+                ))),
+            }
+            timings["check"] = {
+                "per-device": await timed(asyncio.gather(*(post("/register/check", item) for item in checks))),
+                "bulk": await timed(asyncio.gather(*(
+                    post("/register/check/bulk", {"devices": batch}) for batch in batches(checks, MAX_BULK_DEVICES)
+                ))),
+            }
+
+            pages: List[float] = []
+            cursor = None
+            while True:
+                params = {"limit": args.page_size, **({"cursor": cursor} if cursor else {})}
+                started = time.perf_counter()
+                response = await client.get("/v2/device/register", params=params)
+                pages.append(time.perf_counter() - started)
+                cursor = response.headers.get("x-next-cursor")
+                if not cursor:
+                    break
+            timings["list"] = {"pages": len(pages), "total": sum(pages), "first": pages[0], "last": pages[-1]}
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-device vs bulk device registration endpoints")
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--accounts", type=int, default=1500, help="Distinct Google accounts across the fleet")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent per-device requests (SQLite serializes writers)")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before utils.db_state is imported
+        os.environ["ENVIRONMENT"] = "development"
+        os.environ["DATABASE_PATH"] = os.path.join(tmp, "devices.db")
+        timings = asyncio.run(run(args))
+
+    print(f"\n{args.devices} devices across {args.accounts} accounts, concurrency {args.concurrency}")
+    listing = timings.pop("list")
+    print(f"{'operation':<10}{'mode':<14}{'seconds':>10}{'devices/s':>12}")
+    for operation, modes in timings.items():
+        for mode, seconds in modes.items():
+            print(f"{operation:<10}{mode:<14}{seconds:>10.2f}{args.devices / seconds:>12.0f}")
+        baseline, bulk = modes.values()
+        print(f"{'':<10}{'speedup':<14}{baseline / bulk:>10.1f}x")
+    print(f"list: {listing['pages']} pages of {args.page_size} in {listing['total']:.2f}s, "
+          f"first page {listing['first'] * 1000:.1f} ms, last page {listing['last'] * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
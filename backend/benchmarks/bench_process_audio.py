@@ -0,0 +1,134 @@
+# benchmarks/bench_process_audio.py
+# Load benchmark for POST /production/v1/process-audio against a local fake Gemini server.
+# Also probes GET /health during the run, which stalls if Gemini calls block the event loop.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_process_audio --requests 200 --concurrency 32 --latency 0.5
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from typing import List
+
+import aiohttp
+
+from benchmarks.fake_gemini_server import FakeGeminiServer
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(name: str, samples: List[float]) -> str:
+    if not samples:
+        return f"{name:<16} no samples"
+    return (
+        f"{name:<16} n={len(samples):<5} "
+        f"p50={percentile(samples, 50) * 1000:8.1f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.1f}ms "
+        f"max={max(samples) * 1000:8.1f}ms "
+        f"mean={statistics.mean(samples) * 1000:8.1f}ms"
+    )
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_api_server(port: int, fake_gemini_url: str):
+    """Import the app, point the Gemini SDK at the fake server and serve it on a background thread."""
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+    os.environ["GEMINI_API_BASE_URL"] = fake_gemini_url
+    import uvicorn
+    import google.generativeai as genai
+    from index import app
+
+    # Route modules call genai.configure() at import time, so the override has to come last
+    genai.configure(api_key="fake-key", transport="rest", client_options={"api_endpoint": fake_gemini_url})
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="api-server", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+async def run_load(base_url: str, total: int, concurrency: int, payload: bytes) -> dict:
+    audio_latencies: List[float] = []
+    health_latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+    # Every request reuses the same payload, so bypass the result cache to measure the Gemini path
+    audio_request = json.dumps({"prompt_type": "transcription_v1", "use_cache": False})
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as session:
+
+        async def one_request():
+            nonlocal failures
+            async with semaphore:
+                form = aiohttp.FormData()
+                form.add_field("files", payload, filename="bench.ogg", content_type="audio/ogg")
+                form.add_field("audio_processing_request", audio_request)
+                start = time.perf_counter()
+                async with session.post(f"{base_url}/production/v1/process-audio", data=form) as response:
+                    body = await response.json()
+                    audio_latencies.append(time.perf_counter() - start)
+                    if response.status != 200 or body["results"][0]["status"] != "success":
+                        failures += 1
+
+        async def probe_health():
+            while not done.is_set():
+                start = time.perf_counter()
+                async with session.get(f"{base_url}/health") as response:
+                    await response.read()
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.1)
+
+        prober = asyncio.create_task(probe_health())
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    return {
+        "elapsed": elapsed,
+        "failures": failures,
+        "audio": audio_latencies,
+        "health": health_latencies,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for /production/v1/process-audio")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini response latency in seconds")
+    parser.add_argument("--file-kb", type=int, default=64, help="Size of the uploaded audio payload")
+    args = parser.parse_args()
+
+    fake = FakeGeminiServer(latency=args.latency).start()
+    port = free_port()
+    server, thread = start_api_server(port, fake.url)
+    try:
+        stats = asyncio.run(run_load(
+            f"http://127.0.0.1:{port}", args.requests, args.concurrency, os.urandom(args.file_kb * 1024)
+        ))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        fake.stop()
+
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}, fake latency {args.latency}s, payload {args.file_kb}KB")
+    print(f"throughput       {args.requests / stats['elapsed']:.1f} req/s over {stats['elapsed']:.2f}s, failures={stats['failures']}")
+    print(summarize("process-audio", stats["audio"]))
+    print(summarize("health", stats["health"]))
+
+if __name__ == "__main__":
+    main()
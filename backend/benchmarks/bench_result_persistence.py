@@ -0,0 +1,63 @@
+# benchmarks/bench_result_persistence.py
+# Time a batch upload spends persisting its processed results, as the file count grows:
+#   per-file insert    the old store_processed_files loop, one awaited INSERT per file
+#   write-behind       processed_results_writer.submit (database/processed_results.py), the
+#                      request only enqueues; "drain" is how long the background batches take
+# against a throwaway SQLite database.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_result_persistence --files 1 10 50 200
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+async def run(args) -> List[Dict[str, float]]:
+    from database.lifecycle import db_lifecycle
+    from database.core import database, processed_audio_files_table
+    from database.processed_results import processed_results_writer, result_row
+
+    gemini_result = {"summary": "x" * args.result_bytes, "topics": ["a", "b"], "confidence_score": 0.9}
+    results = []
+    async with db_lifecycle.connected():
+        for files in args.files:
+            names = [f"{files}-{i}.ogg" for i in range(files)]
+
+            started = time.perf_counter()
+            for name in names:
+                await database.execute(processed_audio_files_table.insert().values(
+                    user_id=1, file_name=name, file_uri="uri", gemini_result=gemini_result,
+                    uploaded_at=datetime.utcnow(), created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+                ))
+            per_file = time.perf_counter() - started
+
+            started = time.perf_counter()
+            await processed_results_writer.submit([result_row(1, name, "uri", gemini_result) for name in names])
+            submitted = time.perf_counter() - started
+            await processed_results_writer.flush()
+            drained = time.perf_counter() - started
+
+            results.append({"files": files, "per_file_ms": per_file * 1e3, "submit_ms": submitted * 1e3, "drain_ms": drained * 1e3})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-file inserts vs write-behind batches for processed results")
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--result-bytes", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before utils.db_state is imported
+        os.environ["ENVIRONMENT"] = "development"
+        os.environ["DATABASE_PATH"] = os.path.join(tmp, "results.db")
+        results = asyncio.run(run(args))
+
+    print(f"\n{'files':>6}{'per-file insert':>17}{'write-behind':>14}{'drain':>10}  (milliseconds per request)")
+    for row in results:
+        print(f"{row['files']:>6}{row['per_file_ms']:>17.2f}{row['submit_ms']:>14.2f}{row['drain_ms']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# benchmarks/bench_result_storage.py
+# Table size and query latency of processed results in the current storage format
+# (database/result_format.py: JSONB on Postgres, compressed blobs on SQLite) against the previous
+# one (json.dumps text), for the same synthetic results:
+#   size      table plus its indexes
+#   queries   a user's newest results filtered on name, on one of the topics, or on a minimum
+#             confidence_score; fetch_results() for the current format, the equivalent JSON
+#             expression query over the text column (decoded like fetch_results does) for the old one
+#
+# Runs on a throwaway SQLite database by default; pass --postgres-url to measure a scratch
+# Postgres database instead (its processed_audio_files table gets the benchmark rows; run
+# `python -m database.processed_results migrate` against it first).
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_result_storage --rows 20000
+#   python -m benchmarks.bench_result_storage --postgres-url postgresql://localhost/scratch
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict
+
+TOPICS = [f"topic-{i}" for i in range(30)]
+NAMES = [f"Name {i}" for i in range(200)]
+WORDS = [f"word{i}" for i in range(500)]
+
+def synthetic_result(rng: random.Random, text_bytes: int) -> Dict:
+    transcription = []
+    while sum(len(word) + 1 for word in transcription) < text_bytes:
+        transcription.append(rng.choice(WORDS))
+    return {
+        "name": rng.choice(NAMES),
+        "confidence_score": rng.randint(0, 100),
+        "topics": rng.sample(TOPICS, rng.randint(1, 3)),
+        "feeling": "Calm, slightly hesitant.",
+        "transcription": " ".join(transcription),
+    }
+
+async def average_ms(repeat: int, query: Callable[[], Awaitable]) -> float:
+    await query()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await query()
+    return (time.perf_counter() - started) / repeat * 1e3
+
+async def table_bytes(database, table: str) -> int:
+    if database.url.dialect == "postgresql":
+        return await database.fetch_val("SELECT pg_total_relation_size(:table)", {"table": table})
+    return await database.fetch_val(
+        "SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = :table)",
+        {"table": table}
+    )
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    from sqlalchemy import Column, Index, Integer, MetaData, Table, Text
+    from sqlalchemy.schema import CreateIndex, CreateTable
+    from database.lifecycle import db_lifecycle
+    from database.core import accounts_table, database
+    from database.processed_results import fetch_results, insert_results, result_row
+
+    legacy = Table(
+        "bench_legacy_results", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, nullable=False),
+        Column("gemini_result", Text, nullable=False),
+        Index("ix_bench_legacy_results_user_id", "user_id", "id"),
+    )
+    postgres = database.url.dialect == "postgresql"
+    if postgres:
+        legacy_filters = {
+            "name": "(gemini_result::jsonb ->> 'name') = :value",
+            "topic": "(gemini_result::jsonb) @> jsonb_build_object('topics', jsonb_build_array(CAST(:value AS text)))",
+            "confidence": "((gemini_result::jsonb ->> 'confidence_score')::float) >= :value",
+        }
+    else:
+        legacy_filters = {
+            "name": "json_extract(gemini_result, '$.name') = :value",
+            "topic": "EXISTS (SELECT 1 FROM json_each(gemini_result, '$.topics') WHERE value = :value)",
+            "confidence": "json_extract(gemini_result, '$.confidence_score') >= :value",
+        }
+
+    rng = random.Random(args.seed)
+    results: Dict[str, Dict[str, float]] = {"current": {}, "json text": {}}
+    async with db_lifecycle.connected():
+        dialect = database._backend._dialect
+        await database.execute(f"DROP TABLE IF EXISTS {legacy.name}")
+        await database.execute(str(CreateTable(legacy).compile(dialect=dialect)))
+        for index in legacy.indexes:
+            await database.execute(str(CreateIndex(index).compile(dialect=dialect)))
+
+        user_ids = []
+        for i in range(args.users):
+            user_ids.append(await database.execute(accounts_table.insert().values(
+                google_account_id=f"bench-{time.time_ns()}-{i}", created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+            )))
+        for start in range(0, args.rows, 1000):
+            batch = [(rng.choice(user_ids), synthetic_result(rng, args.text_bytes)) for _ in range(min(1000, args.rows - start))]
+            await insert_results([result_row(user_id, f"{start + i}.ogg", "uri", result) for i, (user_id, result) in enumerate(batch)])
+            await database.execute_many(
+                f"INSERT INTO {legacy.name} (user_id, gemini_result) VALUES (:user_id, :gemini_result)",
+                [{"user_id": user_id, "gemini_result": json.dumps(result)} for user_id, result in batch]
+            )
+        if postgres:
+            await database.execute("ANALYZE processed_audio_files")
+            await database.execute(f"ANALYZE {legacy.name}")
+
+        results["current"]["size_mb"] = await table_bytes(database, "processed_audio_files") / 1e6
+        results["json text"]["size_mb"] = await table_bytes(database, legacy.name) / 1e6
+
+        user_id = user_ids[0]
+        filters = {"name": NAMES[0], "topic": TOPICS[0], "confidence": 90}
+        for name, value in filters.items():
+            keyword = {"name": "name", "topic": "topic", "confidence": "min_confidence"}[name]
+            results["current"][f"{name}_ms"] = await average_ms(
+                args.repeat, lambda: fetch_results(user_id, limit=args.limit, connection=database, **{keyword: value})
+            )
+
+            async def legacy_query():
+                rows = await database.fetch_all(
+                    f"SELECT id, gemini_result FROM {legacy.name} WHERE user_id = :user_id AND {legacy_filters[name]} "
+                    f"ORDER BY id DESC LIMIT {args.limit}",
+                    {"user_id": user_id, "value": value}
+                )
+                return [json.loads(row["gemini_result"]) for row in rows]
+            results["json text"][f"{name}_ms"] = await average_ms(args.repeat, legacy_query)
+
+        await database.execute(f"DROP TABLE {legacy.name}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Size and query latency of the processed result storage formats")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=10, help="Rows are spread over this many accounts")
+    parser.add_argument("--text-bytes", type=int, default=3000, help="Transcription length per result")
+    parser.add_argument("--limit", type=int, default=50, help="Results per query")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--postgres-url", help="Scratch Postgres database to measure instead of SQLite")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before utils.db_state is imported
+        if args.postgres_url:
+            os.environ["ENVIRONMENT"] = "production"
+            os.environ["SUPABASE_DATABASE_URL"] = args.postgres_url
+        else:
+            os.environ["ENVIRONMENT"] = "development"
+            os.environ["DATABASE_PATH"] = os.path.join(tmp, "results.db")
+        results = asyncio.run(run(args))
+
+    print(f"\n{args.rows} results of ~{args.text_bytes} transcription bytes, {args.limit} per query (ms)")
+    print(f"{'format':<12}{'size MB':>9}{'name':>9}{'topic':>9}{'conf>=90':>10}")
+    for name, row in results.items():
+        print(f"{name:<12}{row['size_mb']:>9.1f}{row['name_ms']:>9.2f}{row['topic_ms']:>9.2f}{row['confidence_ms']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# benchmarks/bench_routes.py
+# In-process benchmark suite for the main audio routes, driven through the ASGI app with httpx.
+# Gemini is replaced by the deterministic FakeBackend (GEMINI_BACKEND=fake); Files API uploads
+# (job submissions) go to the local FakeGeminiServer. No network access or API key needed.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_routes --requests 200 --concurrency 16 --latency 0.2
+#   python -m benchmarks.bench_routes --scenarios process-audio cached --error-rate 0.05
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from benchmarks.bench_process_audio import percentile
+from benchmarks.fake_gemini_server import FakeGeminiServer
+
+API = "/production/v1"
+MULTI_PROMPT_TYPES = ["transcription_v1", "bench_summary", "bench_names"]
+BENCH_PROMPTS = {
+    "bench_summary": {
+        "prompt_text": "Summarize the audio.",
+        "response_schema": {"type": "OBJECT", "properties": {"summary": {"type": "STRING"}}}
+    },
+    "bench_names": {
+        "prompt_text": "List the names mentioned in the audio.",
+        "response_schema": {"type": "OBJECT", "properties": {"names": {"type": "ARRAY", "items": {"type": "STRING"}}}}
+    },
+}
+
+def configure_environment(args, fake_url: str):
+    """Must run before the app is imported: services read their settings at import time."""
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+    os.environ["GEMINI_BACKEND"] = "fake"
+    os.environ["GEMINI_FAKE_LATENCY"] = str(args.latency)
+    os.environ["GEMINI_FAKE_ERROR_RATE"] = str(args.error_rate)
+    os.environ["GEMINI_API_BASE_URL"] = fake_url
+    os.environ["JOB_POLL_INTERVAL"] = "0.05"
+
+def audio_form(payload: bytes, files: int = 1, **request) -> Dict:
+    return {
+        "files": [("files", (f"bench-{i}.ogg", payload, "audio/ogg")) for i in range(files)],
+        "data": {"audio_processing_request": json.dumps(request)},
+    }
+
+def scenarios(client: httpx.AsyncClient, payload_size: int) -> Dict[str, Callable[[], Awaitable[bool]]]:
+    """Each scenario sends one request (or one job round trip) and reports success."""
+    cached_payload = os.urandom(payload_size)
+
+    async def process_audio() -> bool:
+        form = audio_form(os.urandom(payload_size), use_cache=False)
+        response = await client.post(f"{API}/process-audio", **form)
+        return response.status_code == 200 and response.json()["results"][0]["status"] == "success"
+
+    async def process_audio_batch() -> bool:
+        form = audio_form(os.urandom(payload_size), files=4, use_cache=False)
+        response = await client.post(f"{API}/process-audio", **form)
+        return response.status_code == 200 and all(r["status"] == "success" for r in response.json()["results"])
+
+    async def cached() -> bool:
+        response = await client.post(f"{API}/process-audio", **audio_form(cached_payload))
+        return response.status_code == 200 and response.json()["results"][0]["status"] == "success"
+
+    async def multi_prompt() -> bool:
+        response = await client.post(
+            f"{API}/process-audio/multi",
+            files={"file": ("bench.ogg", os.urandom(payload_size), "audio/ogg")},
+            data={"audio_processing_request": json.dumps({"prompt_types": MULTI_PROMPT_TYPES, "use_cache": False})}
+        )
+        return response.status_code == 200 and all(r["status"] == "success" for r in response.json()["results"].values())
+
+    async def job_round_trip() -> bool:
+        form = audio_form(os.urandom(payload_size))
+        response = await client.post(f"{API}/jobs/process-audio", **form)
+        if response.status_code != 202:
+            return False
+        job_id = response.json()["job_id"]
+        while True:
+            job = (await client.get(f"{API}/jobs/{job_id}")).json()
+            if job["status"] in ("succeeded", "failed"):
+                return job["status"] == "succeeded"
+            await asyncio.sleep(0.05)
+
+    async def health() -> bool:
+        return (await client.get(f"{API}/health")).status_code == 200
+
+    return {
+        "process-audio": process_audio,
+        "process-audio-batch": process_audio_batch,
+        "cached": cached,
+        "multi-prompt": multi_prompt,
+        "jobs": job_round_trip,
+        "health": health,
+    }
+
+async def run_scenario(operation: Callable[[], Awaitable[bool]], total: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await operation()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                failures += 1
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"elapsed": elapsed, "failures": failures, "latencies": latencies, "peak": peak}
+
+async def seed_prompts(schema_manager):
+    for prompt_type, config in BENCH_PROMPTS.items():
+        if not await schema_manager.get_config(prompt_type):
+            await schema_manager.create_config(prompt_type, config["prompt_text"], config["response_schema"])
+
+async def run(args) -> List[Dict]:
+    from index import app
+    from route.gemini.unstable.api.routes import schema_manager
+
+    rows = []
+    async with app.router.lifespan_context(app):
+        await seed_prompts(schema_manager)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            available = scenarios(client, args.file_kb * 1024)
+            for name in args.scenarios:
+                # Warm-up request keeps first-call costs (imports, prompt cache fill) out of the numbers
+                await available[name]()
+                stats = await run_scenario(available[name], args.requests, args.concurrency)
+                rows.append({"scenario": name, **stats})
+        for prompt_type in BENCH_PROMPTS:
+            await schema_manager.delete_config(prompt_type)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process benchmark of the audio routes against a fake Gemini backend")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake Gemini latency per call in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake Gemini calls that fail")
+    parser.add_argument("--file-kb", type=int, default=64, help="Size of each uploaded audio payload")
+    parser.add_argument(
+        "--scenarios", nargs="+",
+        default=["process-audio", "process-audio-batch", "cached", "multi-prompt", "jobs", "health"]
+    )
+    args = parser.parse_args()
+
+    fake = FakeGeminiServer(latency=args.latency).start()
+    configure_environment(args, fake.url)
+    try:
+        rows = asyncio.run(run(args))
+    finally:
+        fake.stop()
+
+    print(f"\n{args.requests} requests per scenario, concurrency {args.concurrency}, "
+          f"fake latency {args.latency}s, error rate {args.error_rate}, payload {args.file_kb}KB")
+    print(f"{'scenario':<22}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'peak MB':>9}")
+    for row in rows:
+        latencies = row["latencies"]
+        print(
+            f"{row['scenario']:<22}"
+            f"{len(latencies) / row['elapsed']:>9.1f}"
+            f"{percentile(latencies, 50) * 1000:>10.1f}"
+            f"{percentile(latencies, 95) * 1000:>10.1f}"
+            f"{percentile(latencies, 99) * 1000:>10.1f}"
+            f"{row['failures']:>8}"
+            f"{row['peak'] / 1024 / 1024:>9.1f}"
+        )
+    # ru_maxrss is KB on Linux
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB")
+
+if __name__ == "__main__":
+    main()
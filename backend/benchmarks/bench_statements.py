@@ -0,0 +1,118 @@
+# benchmarks/bench_statements.py
+# Per-call CPU of the hot statements, built and compiled by `databases` on every call versus run
+# from the precompiled registry (database/statements.py), against a throwaway SQLite database:
+#   identity        AuthService.verify_user's account lookup
+#   registration    GET /register/{id}
+#   prompt_schema   SchemaManager cache miss
+#   store_result    one processed_audio_files insert (the write-behind writer runs it per row)
+#
+# CPU time is process time, so it includes the driver thread; "compile" is the SQLAlchemy
+# compilation alone, i.e. the part the registry removes from each call.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_statements --calls 5000
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict
+
+async def measure(calls: int, work: Callable[[int], Awaitable]) -> Dict[str, float]:
+    await work(0)  # first call compiles and warms the driver's statement cache
+    wall, cpu = time.perf_counter(), time.process_time()
+    for i in range(calls):
+        await work(i)
+    return {
+        "wall_us": (time.perf_counter() - wall) / calls * 1e6,
+        "cpu_us": (time.process_time() - cpu) / calls * 1e6,
+    }
+
+def compile_cost(calls: int, build: Callable[[], object], dialect) -> float:
+    started = time.process_time()
+    for _ in range(calls):
+        build().compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    return (time.process_time() - started) / calls * 1e6
+
+async def run(args) -> Dict[str, Dict]:
+    from database.lifecycle import db_lifecycle
+    from database.core import database, devices_table, processed_audio_files_table, prompt_schema_table
+    from database.devices import REGISTRATION_BY_ID, identity_query, identity_statement, registration_select, upsert_device
+    from route.gemini.unstable.configs.schemas import SchemaManager
+    from database.processed_results import INSERT_PROCESSED_FILE
+
+    prompt_by_type = SchemaManager()._config_statement
+    dialect = database._backend._dialect  # the dialect `databases` compiles with
+    results: Dict[str, Dict] = {}
+
+    async with db_lifecycle.connected():
+        registration = await upsert_device("bench-account", "bench-device", "bench-token")
+        await database.execute(prompt_schema_table.insert().values(
+            prompt_type="bench", prompt_text="text", response_schema="{}", created_at=0, updated_at=0
+        ))
+        result = {"summary": "x" * 200}
+
+        cases = {
+            "identity": (
+                lambda i: database.fetch_one(identity_query("bench-account", "bench-device")),
+                lambda i: identity_statement("bench-account", "bench-device").fetch_one(
+                    google_account_id="bench-account", device_uuid="bench-device"
+                ),
+                lambda: identity_query("bench-account", "bench-device"),
+            ),
+            "registration": (
+                lambda i: database.fetch_one(registration_select().where(devices_table.c.id == registration["id"])),
+                lambda i: REGISTRATION_BY_ID.fetch_one(id=registration["id"]),
+                lambda: registration_select().where(devices_table.c.id == registration["id"]),
+            ),
+            "prompt_schema": (
+                lambda i: database.fetch_one(prompt_schema_table.select().where(prompt_schema_table.c.prompt_type == "bench")),
+                lambda i: prompt_by_type.fetch_one(prompt_type="bench"),
+                lambda: prompt_schema_table.select().where(prompt_schema_table.c.prompt_type == "bench"),
+            ),
+            "store_result": (
+                lambda i: database.execute(processed_audio_files_table.insert().values(
+                    user_id=registration["account_id"], file_name=f"{i}.ogg", file_uri="uri", gemini_result=result,
+                    uploaded_at=datetime.utcnow(), created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+                )),
+                lambda i: INSERT_PROCESSED_FILE.execute(
+                    user_id=registration["account_id"], file_name=f"{i}.ogg", file_uri="uri", gemini_result=result,
+                    now=datetime.utcnow()
+                ),
+                lambda: processed_audio_files_table.insert().values(
+                    user_id=1, file_name="f", file_uri="uri", gemini_result=result,
+                    uploaded_at=datetime.utcnow(), created_at=datetime.utcnow(), updated_at=datetime.utcnow()
+                ),
+            ),
+        }
+        for name, (per_call, precompiled, build) in cases.items():
+            results[name] = {
+                "per-call": await measure(args.calls, per_call),
+                "precompiled": await measure(args.calls, precompiled),
+                "compile_us": compile_cost(args.calls, build, dialect),
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call compiled vs precompiled hot statements")
+    parser.add_argument("--calls", type=int, default=3000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before utils.db_state is imported
+        os.environ["ENVIRONMENT"] = "development"
+        os.environ["DATABASE_PATH"] = os.path.join(tmp, "statements.db")
+        results = asyncio.run(run(args))
+
+    print(f"\n{args.calls} calls per statement (microseconds per call)")
+    print(f"{'statement':<15}{'mode':<13}{'wall':>9}{'cpu':>9}")
+    for name, modes in results.items():
+        compile_us = modes.pop("compile_us")
+        for mode, timing in modes.items():
+            print(f"{name:<15}{mode:<13}{timing['wall_us']:>9.1f}{timing['cpu_us']:>9.1f}")
+        saved = modes["per-call"]["cpu_us"] - modes["precompiled"]["cpu_us"]
+        print(f"{'':<15}{'cpu saved':<13}{'':>9}{saved:>9.1f}  (SQLAlchemy compile alone: {compile_us:.1f})")
+
+if __name__ == "__main__":
+    main()
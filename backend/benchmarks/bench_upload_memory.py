@@ -0,0 +1,78 @@
+# benchmarks/bench_upload_memory.py
+# Peak Python heap used while serving one POST /production/v1/process-audio, by upload size.
+# Uploads above GEMINI_INLINE_AUDIO_LIMIT are streamed to the (fake) Files API in fixed chunks,
+# so the peak should stay flat as the file grows.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_upload_memory --sizes-mb 1 8 32 96
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import tracemalloc
+
+import aiohttp
+
+from benchmarks.bench_process_audio import free_port, start_api_server
+from benchmarks.fake_gemini_server import FakeGeminiServer
+
+MB = 1024 * 1024
+
+def write_sample(path: str, size: int):
+    block = os.urandom(MB)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:min(MB, remaining)])
+            remaining -= MB
+
+async def post_file(base_url: str, path: str) -> dict:
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as session:
+        with open(path, "rb") as f:
+            form = aiohttp.FormData()
+            form.add_field("files", f, filename="sample.ogg", content_type="audio/ogg")
+            form.add_field("audio_processing_request", json.dumps({"prompt_type": "transcription_v1"}))
+            async with session.post(f"{base_url}/production/v1/process-audio", data=form) as response:
+                return await response.json()
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory per /process-audio request by upload size")
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 8, 32, 96])
+    args = parser.parse_args()
+
+    fake = FakeGeminiServer(latency=0.05).start()
+    port = free_port()
+    server, thread = start_api_server(port, fake.url)
+    base_url = f"http://127.0.0.1:{port}"
+
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Warm up imports and connections so they don't count towards the first sample
+            warmup = os.path.join(tmp, "warmup.ogg")
+            write_sample(warmup, 64 * 1024)
+            asyncio.run(post_file(base_url, warmup))
+
+            tracemalloc.start()
+            for size_mb in args.sizes_mb:
+                path = os.path.join(tmp, f"sample-{size_mb}.ogg")
+                write_sample(path, size_mb * MB)
+                baseline, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                body = asyncio.run(post_file(base_url, path))
+                _, peak = tracemalloc.get_traced_memory()
+                rows.append((size_mb, (peak - baseline) / MB, body["results"][0]["status"]))
+                os.remove(path)
+            tracemalloc.stop()
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        fake.stop()
+
+    print(f"\n{'upload':>10} {'peak heap':>12}  status")
+    for size_mb, peak_mb, status in rows:
+        print(f"{size_mb:>8}MB {peak_mb:>10.1f}MB  {status}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/fake_gemini_server.py
+# Minimal stand-in for the Gemini REST API (generativelanguage.googleapis.com) used by the benchmarks.
+# Point the SDK at it with:
+#   genai.configure(api_key="fake", transport="rest", client_options={"api_endpoint": server.url})
+import itertools
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE_TEXT = json.dumps({
+    "summary": "Benchmark response from the fake Gemini server.",
+    "topics": ["benchmark"],
+    "emotions": {},
+    "key_points": [],
+    "insights": []
+})
+
+READ_BLOCK = 64 * 1024
+
+class FakeGeminiServer:
+    """
+    Threaded HTTP server answering `models/*:generateContent` after a fixed latency.
+    Also accepts resumable Files API uploads (`/upload/v1beta/files`), discarding the bytes.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5, response_text: str = DEFAULT_RESPONSE_TEXT):
+        self.latency = latency
+        self.response_text = response_text
+        self.request_count = 0
+        self.uploaded_bytes = 0
+        self._upload_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                received = self._drain_body()
+                if path.startswith("/upload/v1beta/files"):
+                    self._handle_upload(path, received)
+                    return
+                if not path.endswith(":generateContent"):
+                    self._send(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+                    return
+                with server._lock:
+                    server.request_count += 1
+                time.sleep(server.latency)
+                self._send(200, {
+                    "candidates": [{
+                        "content": {"role": "model", "parts": [{"text": server.response_text}]},
+                        "finishReason": "STOP",
+                        "index": 0
+                    }],
+                    "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2}
+                })
+
+            def _drain_body(self) -> int:
+                """Read and discard the request body in small blocks so large uploads stay cheap."""
+                remaining = int(self.headers.get("Content-Length", 0))
+                while remaining > 0:
+                    block = self.rfile.read(min(READ_BLOCK, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                return int(self.headers.get("Content-Length", 0)) - remaining
+
+            def _handle_upload(self, path: str, received: int):
+                command = self.headers.get("X-Goog-Upload-Command", "")
+                if command == "start":
+                    upload_id = next(server._upload_ids)
+                    self._send(200, {}, {"X-Goog-Upload-URL": f"{server.url}/upload/v1beta/files/session/{upload_id}"})
+                    return
+                with server._lock:
+                    server.uploaded_bytes += received
+                if "finalize" not in command:
+                    self._send(200, {}, {"X-Goog-Upload-Status": "active"})
+                    return
+                file_id = path.rsplit("/", 1)[-1]
+                expires = datetime.now(timezone.utc) + timedelta(hours=48)
+                self._send(200, {"file": {
+                    "name": f"files/fake-{file_id}",
+                    "uri": f"{server.url}/v1beta/files/fake-{file_id}",
+                    "mimeType": self.headers.get("Content-Type", "audio/ogg"),
+                    "state": "ACTIVE",
+                    "expirationTime": expires.isoformat().replace("+00:00", "Z")
+                }}, {"X-Goog-Upload-Status": "final"})
+
+            def _send(self, status: int, body: dict, headers: Optional[dict] = None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def start(self) -> "FakeGeminiServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-gemini", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Gemini server listening on {self.url} (latency={self.latency}s)")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,898 @@
+# backend/database/analytics.py
+# Storage for the Next.js site analytics (/analytics): a dedicated SQLite file in WAL mode.
+# All writes go through one writer thread that owns its connection and commits them in
+# batches; request handlers only enqueue. Reads run in worker threads on per-thread
+# connections, which WAL lets proceed alongside the writer.
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.telemetry import span
+from database.analytics_rollups import ROLLUP_SCHEMA, backfill_rollups, prune_hourly, record_rollups
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DB_PATH = os.getenv("ANALYTICS_DB_PATH", str(Path(__file__).parent / "analytics.db"))
+ANALYTICS_QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000"))  # events buffered before /track sheds load
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))  # events written per transaction at most
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "0.25"))  # seconds an event may wait for its batch
+ANALYTICS_PROFILE_CACHE_SIZE = int(os.getenv("ANALYTICS_PROFILE_CACHE_SIZE", "10000"))  # visitor profiles kept in memory
+RECENT_EVENTS = 5  # events shown on a visitor profile
+ROLLUP_PRUNE_INTERVAL = 3600  # seconds between hourly-rollup compactions in the writer
+
+SCHEMA = [
+    # User visits table - tracks session-level data with retention metrics
+    '''
+    CREATE TABLE IF NOT EXISTS user_visits (
+        visitor_id TEXT,
+        session_id TEXT,
+        first_visit_timestamp TEXT,
+        last_visit_timestamp TEXT,
+        visit_count INTEGER DEFAULT 1,
+        total_time_spent INTEGER DEFAULT 0,
+        last_page TEXT,
+        user_agent TEXT,
+        screen_resolution TEXT,
+        device_type TEXT,
+        city TEXT,
+        country TEXT,
+        days_active INTEGER DEFAULT 1,
+        weekly_visits INTEGER DEFAULT 1,
+        monthly_visits INTEGER DEFAULT 1,
+        streak_days INTEGER DEFAULT 1,
+        last_streak_update TEXT,
+        engagement_score FLOAT DEFAULT 0.0,
+        PRIMARY KEY (visitor_id, session_id)
+    )
+    ''',
+    # User events table - tracks specific user actions
+    '''
+    CREATE TABLE IF NOT EXISTS user_events (
+        visitor_id TEXT,
+        event_type TEXT,
+        event_data TEXT,
+        timestamp TEXT,
+        page TEXT,
+        engagement_value FLOAT DEFAULT 1.0
+    )
+    ''',
+    # User achievements table - for gamification
+    '''
+    CREATE TABLE IF NOT EXISTS user_achievements (
+        visitor_id TEXT,
+        achievement_type TEXT,
+        achievement_data TEXT,
+        earned_timestamp TEXT,
+        points INTEGER DEFAULT 0,
+        PRIMARY KEY (visitor_id, achievement_type)
+    )
+    ''',
+    # Per-visitor state maintained with every write, so ingestion never rescans a visitor's history
+    '''
+    CREATE TABLE IF NOT EXISTS visitor_aggregates (
+        visitor_id TEXT PRIMARY KEY,
+        last_session_id TEXT,
+        last_visit_timestamp TEXT,
+        last_session_visit_count INTEGER,
+        streak_days INTEGER,
+        last_streak_update TEXT,
+        weekly_visits INTEGER,
+        monthly_visits INTEGER,
+        engagement_score FLOAT,
+        event_counts TEXT,
+        total_events INTEGER DEFAULT 0,
+        total_engagement FLOAT DEFAULT 0.0,
+        updated_at TEXT
+    )
+    ''',
+    # Materialized /analytics/user/{visitor_id} documents, refreshed by the writer
+    '''
+    CREATE TABLE IF NOT EXISTS visitor_profiles (
+        visitor_id TEXT PRIMARY KEY,
+        document TEXT NOT NULL,
+        etag TEXT NOT NULL,
+        updated_at TEXT
+    )
+    ''',
+    # Latest-visit lookups by visitor (aggregate rebuilds, profile)
+    'CREATE INDEX IF NOT EXISTS idx_user_visits_visitor_last ON user_visits (visitor_id, last_visit_timestamp)',
+    # Time-ordered chunks for columnar exports (database/analytics_export.py)
+    'CREATE INDEX IF NOT EXISTS idx_user_visits_last ON user_visits (last_visit_timestamp)',
+    # Per-type counts and time ranges for a visitor (aggregate rebuilds, milestones)
+    'CREATE INDEX IF NOT EXISTS idx_user_events_visitor_type_ts ON user_events (visitor_id, event_type, timestamp)',
+    # A visitor's most recent events (profile)
+    'CREATE INDEX IF NOT EXISTS idx_user_events_visitor_ts ON user_events (visitor_id, timestamp)',
+    # Hourly/daily dashboard rollups
+    *ROLLUP_SCHEMA,
+]
+
+EXERCISE_MILESTONES = {
+    5: ('exercise_novice', 10),
+    25: ('exercise_intermediate', 25),
+    100: ('exercise_master', 50)
+}
+
+def connect(path: str = ANALYTICS_DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL only syncs on checkpoints; a power loss can drop the last few page views, never corrupt the file
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+VISIT_UPSERT = '''
+    INSERT INTO user_visits (
+        visitor_id, session_id, first_visit_timestamp, last_visit_timestamp,
+        visit_count, total_time_spent, last_page, user_agent, screen_resolution,
+        device_type, city, country, streak_days, weekly_visits, monthly_visits,
+        last_streak_update, engagement_score
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(visitor_id, session_id) DO UPDATE SET
+        last_visit_timestamp = MAX(last_visit_timestamp, excluded.last_visit_timestamp),
+        visit_count = visit_count + excluded.visit_count,
+        total_time_spent = (
+            strftime('%s', MAX(last_visit_timestamp, excluded.last_visit_timestamp)) -
+            strftime('%s', first_visit_timestamp)
+        ),
+        -- An event older than the row (out of order) only adds to visit_count; like
+        -- visitor_aggregates, the row keeps the state of its latest event
+        last_page = {newer} THEN excluded.last_page ELSE last_page END,
+        streak_days = {newer} THEN excluded.streak_days ELSE streak_days END,
+        weekly_visits = {newer} THEN excluded.weekly_visits ELSE weekly_visits END,
+        monthly_visits = {newer} THEN excluded.monthly_visits ELSE monthly_visits END,
+        last_streak_update = {newer} THEN excluded.last_streak_update ELSE last_streak_update END,
+        engagement_score = {newer} THEN excluded.engagement_score ELSE engagement_score END
+'''.format(newer="CASE WHEN excluded.last_visit_timestamp >= last_visit_timestamp")
+
+def latest_visit(c, visitor_id: str) -> Optional[Dict]:
+    """The visitor's most recent session row, which retention and engagement are computed from."""
+    c.execute('''
+        SELECT session_id, last_visit_timestamp, streak_days, last_streak_update,
+               weekly_visits, monthly_visits, visit_count
+        FROM user_visits
+        WHERE visitor_id = ?
+        ORDER BY last_visit_timestamp DESC
+        LIMIT 1
+    ''', (visitor_id,))
+    row = c.fetchone()
+    if not row:
+        return None
+    keys = ("session_id", "last_visit_timestamp", "streak_days", "last_streak_update",
+            "weekly_visits", "monthly_visits", "visit_count")
+    return dict(zip(keys, row))
+
+def build_aggregate(c, visitor_id: str) -> Dict:
+    """Aggregate state for one visitor recomputed from user_visits/user_events (indexed lookups)."""
+    c.execute('''
+        SELECT event_type, COUNT(*), SUM(engagement_value)
+        FROM user_events
+        WHERE visitor_id = ?
+        GROUP BY event_type
+    ''', (visitor_id,))
+    event_counts, total_engagement = {}, 0.0
+    for event_type, count, engagement in c.fetchall():
+        event_counts[event_type] = count
+        total_engagement += engagement or 0.0
+    latest = latest_visit(c, visitor_id)
+    return {
+        "visitor_id": visitor_id,
+        "latest": latest,
+        "engagement_score": calculate_engagement_score(latest),
+        "event_counts": event_counts,
+        "total_events": sum(event_counts.values()),
+        "total_engagement": total_engagement,
+    }
+
+def load_aggregate(c, visitor_id: str) -> Dict:
+    """
+    The visitor's aggregate row. Visitors tracked before the table existed (and not yet
+    backfilled) are rebuilt from the base tables on first sight and maintained from then on.
+    """
+    c.execute('''
+        SELECT last_session_id, last_visit_timestamp, last_session_visit_count, streak_days,
+               last_streak_update, weekly_visits, monthly_visits, engagement_score,
+               event_counts, total_events, total_engagement
+        FROM visitor_aggregates
+        WHERE visitor_id = ?
+    ''', (visitor_id,))
+    row = c.fetchone()
+    if not row:
+        return build_aggregate(c, visitor_id)
+    latest = None
+    if row[1]:
+        latest = {
+            "session_id": row[0],
+            "last_visit_timestamp": row[1],
+            "visit_count": row[2],
+            "streak_days": row[3],
+            "last_streak_update": row[4],
+            "weekly_visits": row[5],
+            "monthly_visits": row[6],
+        }
+    return {
+        "visitor_id": visitor_id,
+        "latest": latest,
+        "engagement_score": row[7],
+        "event_counts": json.loads(row[8]) if row[8] else {},
+        "total_events": row[9] or 0,
+        "total_engagement": row[10] or 0.0,
+    }
+
+def save_aggregates(c, aggregates: List[Dict]):
+    now = datetime.utcnow().isoformat()
+    rows = []
+    for agg in aggregates:
+        latest = agg["latest"] or {}
+        rows.append((
+            agg["visitor_id"],
+            latest.get("session_id"),
+            latest.get("last_visit_timestamp"),
+            latest.get("visit_count"),
+            latest.get("streak_days"),
+            latest.get("last_streak_update"),
+            latest.get("weekly_visits"),
+            latest.get("monthly_visits"),
+            agg["engagement_score"],
+            json.dumps(agg["event_counts"]),
+            agg["total_events"],
+            agg["total_engagement"],
+            now
+        ))
+    c.executemany('''
+        INSERT OR REPLACE INTO visitor_aggregates (
+            visitor_id, last_session_id, last_visit_timestamp, last_session_visit_count,
+            streak_days, last_streak_update, weekly_visits, monthly_visits, engagement_score,
+            event_counts, total_events, total_engagement, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+def backfill_aggregates(conn: sqlite3.Connection) -> int:
+    """Rebuild every visitor's aggregate row from user_visits and user_events. Returns the visitor count."""
+    c = conn.cursor()
+    aggregates: Dict[str, Dict] = {}
+
+    def aggregate(visitor_id: str) -> Dict:
+        if visitor_id not in aggregates:
+            aggregates[visitor_id] = {
+                "visitor_id": visitor_id,
+                "latest": None,
+                "engagement_score": 0.0,
+                "event_counts": {},
+                "total_events": 0,
+                "total_engagement": 0.0,
+            }
+        return aggregates[visitor_id]
+
+    c.execute('''
+        SELECT visitor_id, event_type, COUNT(*), SUM(engagement_value)
+        FROM user_events
+        GROUP BY visitor_id, event_type
+    ''')
+    for visitor_id, event_type, count, engagement in c:
+        agg = aggregate(visitor_id)
+        agg["event_counts"][event_type] = count
+        agg["total_events"] += count
+        agg["total_engagement"] += engagement or 0.0
+
+    # Latest session per visitor, same tie-breaking as latest_visit's ORDER BY ... LIMIT 1
+    c.execute('''
+        SELECT visitor_id, session_id, last_visit_timestamp, streak_days, last_streak_update,
+               weekly_visits, monthly_visits, visit_count
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY visitor_id ORDER BY last_visit_timestamp DESC
+            ) AS position
+            FROM user_visits
+        )
+        WHERE position = 1
+    ''')
+    keys = ("session_id", "last_visit_timestamp", "streak_days", "last_streak_update",
+            "weekly_visits", "monthly_visits", "visit_count")
+    for row in c.fetchall():
+        agg = aggregate(row[0])
+        agg["latest"] = dict(zip(keys, row[1:]))
+        agg["engagement_score"] = calculate_engagement_score(agg["latest"])
+
+    c.execute("DELETE FROM visitor_aggregates")
+    save_aggregates(c, list(aggregates.values()))
+    conn.commit()
+    return len(aggregates)
+
+def update_retention_metrics(latest: Optional[Dict], current_time: datetime):
+    """Update retention-related metrics for a user"""
+    if not latest:
+        # First visit: the row defaults apply
+        return 1, 1, 1
+
+    last_visit = datetime.fromisoformat(latest["last_visit_timestamp"])
+    current_streak = latest["streak_days"]
+    last_streak_update = datetime.fromisoformat(latest["last_streak_update"]) if latest["last_streak_update"] else None
+    weekly_visits = latest["weekly_visits"]
+    monthly_visits = latest["monthly_visits"]
+
+    # Update streak
+    if last_streak_update:
+        days_diff = (current_time.date() - last_streak_update.date()).days
+        if days_diff == 1:  # Consecutive day
+            current_streak += 1
+        elif days_diff > 1:  # Streak broken
+            current_streak = 1
+
+    # Update weekly and monthly visits
+    if last_visit:
+        if (current_time - last_visit) <= timedelta(days=7):
+            weekly_visits += 1
+        if (current_time - last_visit) <= timedelta(days=30):
+            monthly_visits += 1
+
+    return current_streak, weekly_visits, monthly_visits
+
+def calculate_engagement_score(latest: Optional[Dict]):
+    """Calculate user engagement score based on various metrics"""
+    if not latest:
+        return 0.0
+
+    visit_weight = 0.3
+    streak_weight = 0.3
+    weekly_weight = 0.2
+    monthly_weight = 0.2
+
+    score = (
+        (latest["visit_count"] * visit_weight) +
+        (latest["streak_days"] * streak_weight) +
+        (latest["weekly_visits"] * weekly_weight) +
+        (latest["monthly_visits"] * monthly_weight)
+    )
+
+    return min(score, 100.0)  # Cap at 100
+
+def engagement_value(event_type: str) -> float:
+    if event_type == 'complete_exercise':
+        return 5.0
+    if event_type == 'start_session':
+        return 2.0
+    return 1.0
+
+def record_visits(c, events: List[Dict]) -> Dict[str, Tuple[str, bytes]]:
+    """
+    Apply a batch of /analytics/track payloads, in arrival order, with one statement per table.
+    Retention state and event counts come from visitor_aggregates (one keyed lookup per visitor)
+    and are folded in memory, so every (visitor_id, session_id) gets a single upsert however many
+    page views it had in the batch. Results match applying the events one by one; an event older
+    than its session's latest (out of order) only counts as a visit, both here and in the aggregates.
+    Returns the refreshed profile responses of the visitors in the batch.
+    """
+    aggregates: Dict[str, Dict] = {}                # visitor_id -> aggregate state, written back at the end
+    visit_counts: Dict[Tuple[str, str], int] = {}   # (visitor_id, session_id) -> visit_count so far
+    sessions: Dict[Tuple[str, str], Dict] = {}      # coalesced upsert per session, in first-seen order
+    event_rows, achievement_rows, rollup_rows = [], [], []
+
+    for data in events:
+        visitor_id, session_id = data["visitor_id"], data["session_id"]
+        key = (visitor_id, session_id)
+        current_time = datetime.fromtimestamp(data["timestamp"] / 1000)
+        current_time_iso = current_time.isoformat()
+
+        if visitor_id not in aggregates:
+            aggregates[visitor_id] = load_aggregate(c, visitor_id)
+        aggregate = aggregates[visitor_id]
+        previous = aggregate["latest"]
+
+        # Update retention metrics
+        streak, weekly, monthly = update_retention_metrics(previous, current_time)
+        engagement_score = calculate_engagement_score(previous)
+
+        if key not in visit_counts:
+            if previous and previous["session_id"] == session_id:
+                visit_counts[key] = previous["visit_count"]
+            else:
+                c.execute(
+                    'SELECT visit_count FROM user_visits WHERE visitor_id = ? AND session_id = ?', key
+                )
+                row = c.fetchone()
+                visit_counts[key] = row[0] if row else 0
+        visit_counts[key] += 1
+
+        session = sessions.get(key)
+        if session is None:
+            location = data.get("location") or {}
+            session = sessions[key] = {
+                "first_visit_timestamp": current_time,
+                "visits": 0,
+                "user_agent": data["user_agent"],
+                "screen_resolution": data["screen_resolution"],
+                "device_type": data["device_type"],
+                "city": location.get('city'),
+                "country": location.get('country'),
+            }
+        session["visits"] += 1
+        if "last_visit_timestamp" not in session or current_time >= session["last_visit_timestamp"]:
+            session.update(
+                last_visit_timestamp=current_time,
+                last_page=data["page"],
+                streak_days=streak,
+                weekly_visits=weekly,
+                monthly_visits=monthly,
+                engagement_score=engagement_score,
+            )
+
+        if previous is None or current_time_iso >= previous["last_visit_timestamp"]:
+            aggregate["latest"] = {
+                "session_id": session_id,
+                "last_visit_timestamp": current_time_iso,
+                "streak_days": streak,
+                "last_streak_update": current_time_iso,
+                "weekly_visits": weekly,
+                "monthly_visits": monthly,
+                "visit_count": visit_counts[key],
+            }
+            aggregate["engagement_score"] = calculate_engagement_score(aggregate["latest"])
+        elif previous["session_id"] == session_id:
+            # A late event of the latest session still adds to its visit_count
+            previous["visit_count"] = visit_counts[key]
+            aggregate["engagement_score"] = calculate_engagement_score(previous)
+
+        event_type = data.get("event_type")
+        location = data.get("location") or {}
+        rollup_rows.append((
+            data["timestamp"],
+            visitor_id,
+            data["page"],
+            data["device_type"],
+            location.get('country'),
+            event_type,
+            engagement_value(event_type) if event_type else None
+        ))
+        if not event_type:
+            continue
+
+        # Track the event with its engagement value
+        event_rows.append((
+            visitor_id,
+            event_type,
+            json.dumps(data["event_data"]) if data.get("event_data") else None,
+            current_time_iso,
+            data["page"],
+            engagement_value(event_type)
+        ))
+
+        counts = aggregate["event_counts"]
+        counts[event_type] = counts.get(event_type, 0) + 1
+        aggregate["total_events"] += 1
+        aggregate["total_engagement"] += engagement_value(event_type)
+
+        # Check for achievements
+        if event_type == 'complete_exercise':
+            exercise_count = counts[event_type]
+
+            # Award achievements based on milestones
+            if exercise_count in EXERCISE_MILESTONES:
+                achievement, points = EXERCISE_MILESTONES[exercise_count]
+                achievement_rows.append((
+                    visitor_id,
+                    achievement,
+                    json.dumps({'exercise_count': exercise_count}),
+                    current_time_iso,
+                    points
+                ))
+
+    c.executemany(VISIT_UPSERT, [
+        (
+            visitor_id,
+            session_id,
+            s["first_visit_timestamp"].isoformat(),
+            s["last_visit_timestamp"].isoformat(),
+            s["visits"],
+            # Only used when the session is new; existing rows recompute it in the upsert
+            int((s["last_visit_timestamp"].replace(microsecond=0) -
+                 s["first_visit_timestamp"].replace(microsecond=0)).total_seconds()),
+            s["last_page"],
+            s["user_agent"],
+            s["screen_resolution"],
+            s["device_type"],
+            s["city"],
+            s["country"],
+            s["streak_days"],
+            s["weekly_visits"],
+            s["monthly_visits"],
+            s["last_visit_timestamp"].isoformat(),
+            s["engagement_score"],
+        )
+        for (visitor_id, session_id), s in sessions.items()
+    ])
+    c.executemany('''
+        INSERT INTO user_events (
+            visitor_id, event_type, event_data, timestamp, page,
+            engagement_value
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    ''', event_rows)
+    save_aggregates(c, list(aggregates.values()))
+    c.executemany('''
+        INSERT OR IGNORE INTO user_achievements
+        (visitor_id, achievement_type, achievement_data,
+         earned_timestamp, points)
+        VALUES (?, ?, ?, ?, ?)
+    ''', achievement_rows)
+    record_rollups(c, rollup_rows)
+    return refresh_profiles(c, event_rows, achievement_rows, aggregates)
+
+FIRST_VISIT_PROFILE = {
+    "is_first_visit": True,
+    "visit_count": 0,
+    "engagement_score": 0
+}
+
+def build_profile(c, visitor_id: str) -> Dict:
+    """Profile document for a visitor computed from the base tables."""
+    # Get latest visit data with retention metrics
+    c.execute('''
+        SELECT
+            first_visit_timestamp,
+            last_visit_timestamp,
+            visit_count,
+            total_time_spent,
+            last_page,
+            device_type,
+            city,
+            country,
+            streak_days,
+            weekly_visits,
+            monthly_visits,
+            engagement_score
+        FROM user_visits
+        WHERE visitor_id = ?
+        ORDER BY last_visit_timestamp DESC
+        LIMIT 1
+    ''', (visitor_id,))
+
+    visit_data = c.fetchone()
+
+    if not visit_data:
+        return dict(FIRST_VISIT_PROFILE)
+
+    # Get recent events
+    c.execute('''
+        SELECT event_type, event_data, timestamp, engagement_value
+        FROM user_events
+        WHERE visitor_id = ?
+        ORDER BY timestamp DESC
+        LIMIT ?
+    ''', (visitor_id, RECENT_EVENTS))
+
+    recent_events = [{
+        "type": event[0],
+        "data": event[1],
+        "timestamp": event[2],
+        "engagement_value": event[3]
+    } for event in c.fetchall()]
+
+    # Get achievements
+    c.execute('''
+        SELECT achievement_type, achievement_data, earned_timestamp, points
+        FROM user_achievements
+        WHERE visitor_id = ?
+        ORDER BY earned_timestamp DESC
+    ''', (visitor_id,))
+
+    achievements = [{
+        "type": ach[0],
+        "data": json.loads(ach[1]) if ach[1] else None,
+        "earned_timestamp": ach[2],
+        "points": ach[3]
+    } for ach in c.fetchall()]
+
+    return {
+        "is_first_visit": False,
+        **visit_fields(visit_data),
+        "recent_events": recent_events,
+        "achievements": achievements,
+        "total_achievement_points": sum(ach["points"] for ach in achievements)
+    }
+
+def visit_fields(visit_data) -> Dict:
+    return {
+        "first_visit": visit_data[0],
+        "last_visit": visit_data[1],
+        "visit_count": visit_data[2],
+        "total_time_spent_seconds": visit_data[3],
+        "last_page": visit_data[4],
+        "device_type": visit_data[5],
+        "city": visit_data[6],
+        "country": visit_data[7],
+        "streak_days": visit_data[8],
+        "weekly_visits": visit_data[9],
+        "monthly_visits": visit_data[10],
+        "engagement_score": visit_data[11],
+    }
+
+def profile_response(document: Dict) -> Tuple[str, bytes]:
+    """(ETag, JSON body) for a profile document, as served by GET /analytics/user/{visitor_id}."""
+    body = json.dumps({"success": True, "data": document}, separators=(",", ":")).encode()
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"', body
+
+def load_profile_document(c, visitor_id: str) -> Optional[Dict]:
+    c.execute('SELECT document FROM visitor_profiles WHERE visitor_id = ?', (visitor_id,))
+    row = c.fetchone()
+    return json.loads(row[0]) if row else None
+
+def refresh_profiles(c, event_rows: List[Tuple], achievement_rows: List[Tuple], visitors) -> Dict[str, Tuple[str, bytes]]:
+    """
+    Update the materialized profiles of the visitors a batch touched and return their responses.
+    An existing document is patched with the batch's events and achievements plus the latest
+    visit row; visitors without one are built from the base tables once.
+    """
+    new_events: Dict[str, List[Dict]] = {}
+    for visitor_id, event_type, event_data, timestamp, _page, value in event_rows:
+        new_events.setdefault(visitor_id, []).append(
+            {"type": event_type, "data": event_data, "timestamp": timestamp, "engagement_value": value}
+        )
+    new_achievements: Dict[str, List[Dict]] = {}
+    for visitor_id, achievement_type, achievement_data, earned_timestamp, points in achievement_rows:
+        new_achievements.setdefault(visitor_id, []).append({
+            "type": achievement_type,
+            "data": json.loads(achievement_data),
+            "earned_timestamp": earned_timestamp,
+            "points": points
+        })
+
+    now = datetime.utcnow().isoformat()
+    responses, rows = {}, []
+    for visitor_id in visitors:
+        document = load_profile_document(c, visitor_id)
+        if document is None or document.get("is_first_visit"):
+            document = build_profile(c, visitor_id)
+        else:
+            c.execute('''
+                SELECT first_visit_timestamp, last_visit_timestamp, visit_count, total_time_spent,
+                       last_page, device_type, city, country, streak_days, weekly_visits,
+                       monthly_visits, engagement_score
+                FROM user_visits
+                WHERE visitor_id = ?
+                ORDER BY last_visit_timestamp DESC
+                LIMIT 1
+            ''', (visitor_id,))
+            document.update(visit_fields(c.fetchone()))
+            events = document["recent_events"] + new_events.get(visitor_id, [])
+            events.sort(key=lambda event: event["timestamp"], reverse=True)
+            document["recent_events"] = events[:RECENT_EVENTS]
+            # INSERT OR IGNORE keeps the first award of each achievement
+            earned = {ach["type"] for ach in document["achievements"]}
+            achievements = document["achievements"] + [
+                ach for ach in new_achievements.get(visitor_id, []) if ach["type"] not in earned
+            ]
+            achievements.sort(key=lambda ach: ach["earned_timestamp"], reverse=True)
+            document["achievements"] = achievements
+            document["total_achievement_points"] = sum(ach["points"] for ach in achievements)
+        etag, body = profile_response(document)
+        responses[visitor_id] = (etag, body)
+        rows.append((visitor_id, json.dumps(document), etag, now))
+
+    c.executemany(
+        'INSERT OR REPLACE INTO visitor_profiles (visitor_id, document, etag, updated_at) VALUES (?, ?, ?, ?)',
+        rows
+    )
+    return responses
+
+class ProfileCache:
+    """Thread-safe LRU of profile responses: visitor_id -> (ETag, JSON body)."""
+
+    def __init__(self, max_entries: int = ANALYTICS_PROFILE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, visitor_id: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(visitor_id)
+            if entry is not None:
+                self._entries.move_to_end(visitor_id)
+            return entry
+
+    def put(self, visitor_id: str, entry: Tuple[str, bytes], replace: bool = True):
+        """`replace=False` is for readers: a response loaded before a concurrent write must not overwrite it."""
+        with self._lock:
+            if not replace and visitor_id in self._entries:
+                return
+            self._entries[visitor_id] = entry
+            self._entries.move_to_end(visitor_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class AnalyticsStore:
+    """
+    Owns the analytics database: schema setup (once, at startup), the writer thread and
+    per-thread read connections. `submit` never blocks the event loop; the writer flushes
+    queued events in one transaction per `batch_size` events or `flush_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        path: str = ANALYTICS_DB_PATH,
+        queue_size: int = ANALYTICS_QUEUE_SIZE,
+        batch_size: int = ANALYTICS_BATCH_SIZE,
+        flush_interval: float = ANALYTICS_FLUSH_INTERVAL
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._readers = threading.local()
+        self.profiles = ProfileCache()
+        self.dropped = 0
+
+    def ensure_schema(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = connect(self.path)
+        try:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def start(self):
+        """Create the schema and start the writer thread. Safe to call more than once."""
+        if self._writer and self._writer.is_alive():
+            return
+        self.ensure_schema()
+        self._writer = threading.Thread(target=self._run_writer, name="analytics-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"Analytics writer started on {self.path}")
+
+    def stop(self, timeout: float = 30.0):
+        """Flush everything already queued, then stop the writer thread."""
+        if not self._writer:
+            return
+        self._queue.put(None)
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logger.error(f"Analytics writer did not drain within {timeout}s; {self._queue.qsize()} events left")
+        self._writer = None
+
+    def submit(self, data: Dict) -> bool:
+        """Queue one tracking payload for the writer. Returns False (and drops it) when the queue is full."""
+        try:
+            self._queue.put_nowait(data)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Analytics queue full; dropped event for {data.get('visitor_id')} ({self.dropped} total)")
+            return False
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued event has been written (benchmarks, tests)."""
+        self._queue.join()
+
+    def _next_batch(self) -> Tuple[List[Dict], bool]:
+        """
+        Block for the next event, then keep collecting until the batch is full or `flush_interval`
+        has passed since it started. The second value is True when stop() was requested.
+        """
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                data = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if data is None:
+                return batch, True
+            batch.append(data)
+        return batch, False
+
+    def _run_writer(self):
+        conn = connect(self.path)
+        next_prune = 0.0
+        try:
+            while True:
+                batch, stopping = self._next_batch()
+                try:
+                    if batch:
+                        with span("analytics.flush"):
+                            self._flush(conn, batch)
+                finally:
+                    for _ in range(len(batch) + stopping):
+                        self._queue.task_done()
+                if stopping:
+                    return
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + ROLLUP_PRUNE_INTERVAL
+                    self._prune(conn)
+        finally:
+            conn.close()
+
+    def _prune(self, conn: sqlite3.Connection):
+        try:
+            with span("analytics.prune"):
+                deleted = prune_hourly(conn)
+            if deleted:
+                logger.info(f"Pruned {deleted} expired hourly analytics buckets")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Failed to prune hourly analytics buckets: {e}")
+
+    def _flush(self, conn: sqlite3.Connection, batch: List[Dict]):
+        """Write a batch in one transaction; if it fails, retry event by event so one bad payload loses only itself."""
+        try:
+            profiles = record_visits(conn.cursor(), batch)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if len(batch) == 1:
+                logger.error(f"Error tracking visitor {batch[0].get('visitor_id')}: {e}")
+                return
+            logger.warning(f"Analytics batch of {len(batch)} failed ({e}); retrying events individually")
+            for data in batch:
+                self._flush(conn, [data])
+            return
+        # Write-through after commit, so the next profile load is served from memory
+        for visitor_id, entry in profiles.items():
+            self.profiles.put(visitor_id, entry)
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = connect(self.path)
+        return conn
+
+    def read(self, query: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """Run `query(cursor)` on this thread's read connection. Call through asyncio.to_thread."""
+        return query(self._reader().cursor())
+
+    def load_profile(self, visitor_id: str) -> Tuple[str, bytes]:
+        """Profile response on a cache miss: the materialized document, else built from the base tables."""
+        with span("analytics.profile_load"):
+            def query(c):
+                document = load_profile_document(c, visitor_id)
+                return document if document is not None else build_profile(c, visitor_id)
+            entry = profile_response(self.read(query))
+        self.profiles.put(visitor_id, entry, replace=False)
+        return entry
+
+analytics_store = AnalyticsStore()
+
+__all__ = ["analytics_store", "AnalyticsStore", "backfill_aggregates", "connect", "record_visits"]
+
+if __name__ == "__main__":
+    # python -m database.analytics backfill            (from backend/)
+    # python -m database.analytics backfill-rollups
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Site analytics database maintenance")
+    parser.add_argument(
+        "command", choices=["backfill", "backfill-rollups"],
+        help="backfill: rebuild visitor_aggregates; backfill-rollups: rebuild the hourly/daily rollups from user_events"
+    )
+    parser.add_argument("--db", default=ANALYTICS_DB_PATH)
+    args = parser.parse_args()
+
+    store = AnalyticsStore(args.db)
+    store.ensure_schema()  # also creates the user_events indexes the rebuild relies on
+    conn = connect(args.db)
+    try:
+        started = time.perf_counter()
+        if args.command == "backfill":
+            visitors = backfill_aggregates(conn)
+            logger.info(f"Rebuilt aggregates for {visitors} visitors in {time.perf_counter() - started:.1f}s")
+        else:
+            events = backfill_rollups(conn)
+            logger.info(f"Rolled up {events} events in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
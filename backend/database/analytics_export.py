@@ -0,0 +1,383 @@
+# backend/database/analytics_export.py
+# Columnar export of the site analytics tables (Parquet or Arrow IPC) for offline analysis, and
+# the matching loader with vectorized retention metrics.
+#
+# Exports read the table in keyset-ordered chunks and write one row group / record batch per
+# chunk, so memory stays bounded by --chunk-rows whatever the table size. A named checkpoint
+# remembers where the last export stopped, so the next one only writes newer rows.
+#
+# Usage (from backend/):
+#   python -m database.analytics_export export user_events --out events.parquet --checkpoint warehouse
+#   python -m database.analytics_export export user_visits --format arrow --out visits.arrow --since 2026-01-01
+#   python -m database.analytics_export retention events.parquet --out retention.parquet
+#
+# Requires pyarrow (and pandas for the retention helpers); both are optional dependencies.
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from database.analytics import ANALYTICS_DB_PATH, connect
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_ROWS = int(os.getenv("ANALYTICS_EXPORT_CHUNK_ROWS", "50000"))  # rows per row group / record batch
+ANALYTICS_EXPORT_TOKEN = os.getenv("ANALYTICS_EXPORT_TOKEN", "")  # bearer token for /analytics/export; unset disables it
+FORMATS = ("parquet", "arrow")
+MEDIA_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.file"}
+
+class ExportTable(NamedTuple):
+    # Keyset columns in export order; rowid breaks ties and is exported as `row_id`
+    cursor: Tuple[str, ...]
+    # Column filtered by since/until
+    time_column: str
+    # (column, arrow type name); "timestamp" columns are ISO text in SQLite
+    columns: Tuple[Tuple[str, str], ...]
+
+EXPORT_TABLES: Dict[str, ExportTable] = {
+    # Append-only, so insertion order is the natural cursor
+    "user_events": ExportTable(
+        cursor=("rowid",),
+        time_column="timestamp",
+        columns=(
+            ("visitor_id", "string"), ("event_type", "string"), ("event_data", "string"),
+            ("timestamp", "timestamp"), ("page", "string"), ("engagement_value", "float64"),
+        ),
+    ),
+    # Rows are updated in place; ordering by last visit re-exports sessions that changed
+    "user_visits": ExportTable(
+        cursor=("last_visit_timestamp", "rowid"),
+        time_column="last_visit_timestamp",
+        columns=(
+            ("visitor_id", "string"), ("session_id", "string"),
+            ("first_visit_timestamp", "timestamp"), ("last_visit_timestamp", "timestamp"),
+            ("visit_count", "int64"), ("total_time_spent", "int64"), ("last_page", "string"),
+            ("user_agent", "string"), ("screen_resolution", "string"), ("device_type", "string"),
+            ("city", "string"), ("country", "string"), ("days_active", "int64"),
+            ("weekly_visits", "int64"), ("monthly_visits", "int64"), ("streak_days", "int64"),
+            ("last_streak_update", "timestamp"), ("engagement_score", "float64"),
+        ),
+    ),
+    "user_achievements": ExportTable(
+        cursor=("earned_timestamp", "rowid"),
+        time_column="earned_timestamp",
+        columns=(
+            ("visitor_id", "string"), ("achievement_type", "string"), ("achievement_data", "string"),
+            ("earned_timestamp", "timestamp"), ("points", "int64"),
+        ),
+    ),
+}
+
+CHECKPOINT_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS analytics_export_checkpoints (
+        name TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        cursor TEXT NOT NULL,
+        rows_exported INTEGER DEFAULT 0,
+        updated_at TEXT,
+        PRIMARY KEY (name, table_name)
+    )
+'''
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Analytics export needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+def arrow_schema(table: str):
+    pa = _pyarrow()
+    types = {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64(), "timestamp": pa.timestamp("us")}
+    return pa.schema([("row_id", pa.int64())] + [(name, types[kind]) for name, kind in EXPORT_TABLES[table].columns])
+
+def get_checkpoint(conn, name: str, table: str) -> Optional[List]:
+    conn.execute(CHECKPOINT_SCHEMA)
+    row = conn.execute(
+        'SELECT cursor FROM analytics_export_checkpoints WHERE name = ? AND table_name = ?', (name, table)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def save_checkpoint(conn, name: str, table: str, cursor: List, rows: int):
+    conn.execute(CHECKPOINT_SCHEMA)
+    conn.execute('''
+        INSERT INTO analytics_export_checkpoints (name, table_name, cursor, rows_exported, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(name, table_name) DO UPDATE SET
+            cursor = excluded.cursor,
+            rows_exported = rows_exported + excluded.rows_exported,
+            updated_at = excluded.updated_at
+    ''', (name, table, json.dumps(cursor), rows, datetime.utcnow().isoformat()))
+    conn.commit()
+
+def iter_batches(
+    conn,
+    table: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[List] = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS
+) -> Iterator[Tuple[Any, List]]:
+    """
+    Yield (RecordBatch, cursor of its last row) in keyset order, starting after `after`.
+    since/until are compared with the table's timestamps, which are server-local ISO text.
+    """
+    pa = _pyarrow()
+    spec = EXPORT_TABLES[table]
+    schema = arrow_schema(table)
+    names = [name for name, _ in spec.columns]
+    cursor_sql = ", ".join(spec.cursor)
+    select = f"SELECT rowid, {', '.join(names)}, {cursor_sql} FROM {table}"
+
+    filters, params = [], []
+    if since:
+        filters.append(f"{spec.time_column} >= ?")
+        params.append(since.isoformat())
+    if until:
+        filters.append(f"{spec.time_column} < ?")
+        params.append(until.isoformat())
+
+    position = list(after) if after else None
+    while True:
+        where, args = list(filters), list(params)
+        if position is not None:
+            where.append(f"({cursor_sql}) > ({', '.join('?' for _ in spec.cursor)})")
+            args.extend(position)
+        sql = select + (f" WHERE {' AND '.join(where)}" if where else "") + f" ORDER BY {cursor_sql} LIMIT ?"
+        rows = conn.execute(sql, (*args, chunk_rows)).fetchall()
+        if not rows:
+            return
+        width = len(names) + 1
+        columns = list(zip(*(row[:width] for row in rows)))
+        arrays = [
+            # Timestamps arrive as ISO text; Arrow parses them column-at-a-time
+            pa.array(column, pa.string()).cast(field.type) if pa.types.is_timestamp(field.type) else pa.array(column, field.type)
+            for column, field in zip(columns, schema)
+        ]
+        position = list(rows[-1][width:])
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema), position
+        if len(rows) < chunk_rows:
+            return
+
+class _Writer:
+    """Parquet or Arrow IPC file writer over a path or a binary file object, one batch at a time."""
+
+    def __init__(self, sink: Union[str, BinaryIO], table: str, fmt: str):
+        pa = _pyarrow()
+        schema = arrow_schema(table)
+        if fmt == "parquet":
+            self._writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+            self._write = lambda batch: self._writer.write_table(pa.Table.from_batches([batch]))
+        elif fmt == "arrow":
+            self._writer = pa.ipc.new_file(sink, schema)
+            self._write = self._writer.write_batch
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+    def write(self, batch):
+        self._write(batch)
+
+    def close(self):
+        self._writer.close()
+
+def export_table(
+    table: str,
+    sink: Union[str, BinaryIO],
+    fmt: str = "parquet",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    checkpoint: Optional[str] = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    db_path: str = ANALYTICS_DB_PATH
+) -> Dict:
+    """
+    Write `table` to `sink`. With `checkpoint`, only rows after that checkpoint's cursor are
+    written, and the checkpoint advances once the file is complete.
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown analytics table: {table}")
+    conn = connect(db_path)
+    try:
+        after = get_checkpoint(conn, checkpoint, table) if checkpoint else None
+        writer = _Writer(sink, table, fmt)
+        rows, position = 0, after
+        try:
+            for batch, position in iter_batches(conn, table, since, until, after, chunk_rows):
+                writer.write(batch)
+                rows += batch.num_rows
+        finally:
+            writer.close()
+        if checkpoint and position is not None:
+            save_checkpoint(conn, checkpoint, table, position, rows)
+        return {"table": table, "format": fmt, "rows": rows, "cursor": position}
+    finally:
+        conn.close()
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes to a streaming response."""
+
+    def __init__(self):
+        self.closed = False
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+def stream_export(
+    table: str,
+    fmt: str = "parquet",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    checkpoint: Optional[str] = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    db_path: str = ANALYTICS_DB_PATH
+) -> Iterator[bytes]:
+    """
+    export_table as a synchronous byte iterator for StreamingResponse: each chunk is sent as soon
+    as its row group is encoded. The checkpoint only advances if the client reads to the end.
+    """
+    conn = connect(db_path)
+    try:
+        after = get_checkpoint(conn, checkpoint, table) if checkpoint else None
+        sink = _ChunkSink()
+        writer = _Writer(sink, table, fmt)
+        rows, position = 0, after
+        for batch, position in iter_batches(conn, table, since, until, after, chunk_rows):
+            writer.write(batch)
+            rows += batch.num_rows
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+        if checkpoint and position is not None:
+            save_checkpoint(conn, checkpoint, table, position, rows)
+        logger.info(f"Streamed {rows} {table} rows as {fmt}")
+    finally:
+        conn.close()
+
+# ------------------ Offline analysis ------------------
+
+def load_export(path: str):
+    """Load a Parquet or Arrow IPC export as a pandas DataFrame."""
+    pa = _pyarrow()
+    with open(path, "rb") as f:
+        magic = f.read(6)
+    if magic == b"ARROW1":
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    else:
+        table = pa.parquet.read_table(path)
+    return table.to_pandas()
+
+def visitor_retention(events, as_of: Optional[datetime] = None):
+    """
+    Per-visitor retention from an exported user_events frame, computed column-wise:
+    first/last seen, active days, current and longest daily streak, and active days in the
+    7 and 30 days up to `as_of` (default: the last event), plus the engagement total.
+    """
+    import pandas as pd
+
+    days = events[["visitor_id", "timestamp"]].assign(day=events["timestamp"].dt.normalize())
+    days = days.drop_duplicates(["visitor_id", "day"]).sort_values(["visitor_id", "day"])
+    as_of = pd.Timestamp(as_of).normalize() if as_of is not None else days["day"].max()
+
+    # A new run starts whenever the gap to the visitor's previous active day isn't exactly one day
+    gap = days.groupby("visitor_id")["day"].diff().dt.days
+    days["run"] = (gap != 1).cumsum()
+    runs = days.groupby(["visitor_id", "run"]).agg(length=("day", "size"), last_day=("day", "max")).reset_index()
+    last_runs = runs.groupby("visitor_id").tail(1).set_index("visitor_id")
+    # The latest run only counts as current if it reaches as_of or the day before
+    current_streak = last_runs["length"].where((as_of - last_runs["last_day"]).dt.days <= 1, 0)
+
+    age = (as_of - days["day"]).dt.days
+    per_visitor = days.assign(
+        active_7d=age.between(0, 6),
+        active_30d=age.between(0, 29),
+    ).groupby("visitor_id").agg(
+        first_seen=("day", "min"),
+        last_seen=("day", "max"),
+        days_active=("day", "size"),
+        active_days_7d=("active_7d", "sum"),
+        active_days_30d=("active_30d", "sum"),
+    )
+    per_visitor["current_streak"] = current_streak
+    per_visitor["longest_streak"] = runs.groupby("visitor_id")["length"].max()
+    per_visitor["events"] = events.groupby("visitor_id").size()
+    per_visitor["engagement"] = events.groupby("visitor_id")["engagement_value"].sum()
+    return per_visitor.reset_index()
+
+def cohort_retention(events, period: str = "W"):
+    """
+    Share of each first-seen cohort (weekly by default; any pandas period alias) active
+    0, 1, 2, ... periods later, as a cohort x offset DataFrame.
+    """
+    periods = events[["visitor_id"]].assign(period=events["timestamp"].dt.to_period(period))
+    periods = periods.drop_duplicates()
+    periods["cohort"] = periods.groupby("visitor_id")["period"].transform("min")
+    periods["offset"] = (periods["period"] - periods["cohort"]).apply(lambda offset: offset.n)
+    active = periods.groupby(["cohort", "offset"])["visitor_id"].nunique().unstack(fill_value=0)
+    return active.div(active[0], axis=0)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Columnar export and offline analysis of site analytics")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write an analytics table to Parquet or Arrow IPC")
+    export.add_argument("table", choices=sorted(EXPORT_TABLES))
+    export.add_argument("--out", required=True)
+    export.add_argument("--format", choices=FORMATS, default="parquet")
+    export.add_argument("--since", type=datetime.fromisoformat)
+    export.add_argument("--until", type=datetime.fromisoformat)
+    export.add_argument("--checkpoint", help="Name of an incremental checkpoint; only rows after it are written")
+    export.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    export.add_argument("--db", default=ANALYTICS_DB_PATH)
+
+    retention = commands.add_parser("retention", help="Per-visitor retention from an exported user_events file")
+    retention.add_argument("path")
+    retention.add_argument("--as-of", type=datetime.fromisoformat)
+    retention.add_argument("--out", help="Write the result as Parquet instead of printing a preview")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        # Write next to the destination and rename, so a failed export never leaves a partial file
+        partial = f"{args.out}.partial"
+        try:
+            stats = export_table(
+                args.table, partial, args.format, args.since, args.until, args.checkpoint, args.chunk_rows, args.db
+            )
+            os.replace(partial, args.out)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        logger.info(f"Exported {stats['rows']} {args.table} rows to {args.out}")
+    else:
+        result = visitor_retention(load_export(args.path), args.as_of)
+        if args.out:
+            result.to_parquet(args.out, index=False)
+            logger.info(f"Wrote retention for {len(result)} visitors to {args.out}")
+        else:
+            print(result.head(20).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
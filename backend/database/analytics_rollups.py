@@ -0,0 +1,215 @@
+# backend/database/analytics_rollups.py
+# Time-bucketed rollups of site analytics, maintained by the analytics writer as events arrive.
+# Dashboard questions (traffic over time, DAU/WAU/MAU, top pages, device mix) are answered from
+# these tables, so their cost depends on the number of buckets asked for, not on event volume.
+#
+#   analytics_hourly / analytics_daily   counters per (dimension, UTC bucket, value)
+#   analytics_daily_visitors             one row per visitor per active UTC day
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+ANALYTICS_HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "90"))  # daily rollups are kept forever
+MAX_SUMMARY_BUCKETS = 1000  # largest series a single summary request may ask for
+
+# 'total' has a single empty value; the others break page views (and events, for event_type) down
+DIMENSIONS = ("total", "page", "device_type", "country", "event_type")
+BUCKETS = {
+    "hour": ("analytics_hourly", "%Y-%m-%dT%H", timedelta(hours=1)),
+    "day": ("analytics_daily", "%Y-%m-%d", timedelta(days=1)),
+}
+
+ROLLUP_SCHEMA = [
+    f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        dimension TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        value TEXT NOT NULL,
+        page_views INTEGER DEFAULT 0,
+        events INTEGER DEFAULT 0,
+        engagement FLOAT DEFAULT 0.0,
+        PRIMARY KEY (dimension, bucket, value)
+    ) WITHOUT ROWID
+    '''
+    for table, _, _ in BUCKETS.values()
+] + [
+    '''
+    CREATE TABLE IF NOT EXISTS analytics_daily_visitors (
+        day TEXT NOT NULL,
+        visitor_id TEXT NOT NULL,
+        PRIMARY KEY (day, visitor_id)
+    ) WITHOUT ROWID
+    ''',
+]
+
+# One tracked payload as the rollups see it; engagement is None when the payload carried no event
+RollupEvent = Tuple[int, str, str, Optional[str], Optional[str], Optional[str], Optional[float]]
+
+def record_rollups(c, events: Iterable[RollupEvent], page_views: bool = True):
+    """
+    Add a batch of (timestamp_ms, visitor_id, page, device_type, country, event_type, engagement)
+    to the hourly and daily counters: one upsert per touched counter, however many events hit it.
+    `page_views=False` counts only the events (backfills from user_events).
+    """
+    counters: Dict[str, Dict[Tuple[str, str, str], List]] = {table: {} for table, _, _ in BUCKETS.values()}
+    active: Set[Tuple[str, str]] = set()
+
+    for timestamp, visitor_id, page, device_type, country, event_type, engagement in events:
+        moment = datetime.utcfromtimestamp(timestamp / 1000)
+        active.add((moment.strftime(BUCKETS["day"][1]), visitor_id))
+        breakdown = [("total", ""), ("page", page), ("device_type", device_type or ""), ("country", country or "")]
+        if event_type:
+            breakdown.append(("event_type", event_type))
+        for table, bucket_format, _ in BUCKETS.values():
+            bucket = moment.strftime(bucket_format)
+            for dimension, value in breakdown:
+                counter = counters[table].setdefault((dimension, bucket, value), [0, 0, 0.0])
+                # Every payload is a page view; the event_type breakdown only counts events
+                if page_views and dimension != "event_type":
+                    counter[0] += 1
+                if event_type:
+                    counter[1] += 1
+                    counter[2] += engagement or 0.0
+
+    for table, rows in counters.items():
+        c.executemany(f'''
+            INSERT INTO {table} (dimension, bucket, value, page_views, events, engagement)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(dimension, bucket, value) DO UPDATE SET
+                page_views = page_views + excluded.page_views,
+                events = events + excluded.events,
+                engagement = engagement + excluded.engagement
+        ''', [(*key, *counter) for key, counter in rows.items()])
+    c.executemany('INSERT OR IGNORE INTO analytics_daily_visitors (day, visitor_id) VALUES (?, ?)', active)
+
+def prune_hourly(conn: sqlite3.Connection, retention_days: int = ANALYTICS_HOURLY_RETENTION_DAYS) -> int:
+    """Compaction: drop hourly buckets older than the retention window. Returns rows deleted."""
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime(BUCKETS["hour"][1])
+    deleted = conn.execute('DELETE FROM analytics_hourly WHERE bucket < ?', (cutoff,)).rowcount
+    conn.commit()
+    return deleted
+
+def bucket_range(bucket: str, start: datetime, end: datetime) -> Tuple[str, str]:
+    """
+    First and last bucket keys overlapping [start, end), both inclusive; a partial bucket at
+    either end (e.g. the current hour) is included. Raises ValueError for oversized or inverted ranges.
+    """
+    _, bucket_format, step = BUCKETS[bucket]
+    if end <= start:
+        raise ValueError("end must be after start")
+    if (end - start) / step > MAX_SUMMARY_BUCKETS:
+        raise ValueError(f"Range spans more than {MAX_SUMMARY_BUCKETS} {bucket} buckets")
+    return start.strftime(bucket_format), (end - timedelta(microseconds=1)).strftime(bucket_format)
+
+def summary(c, start: datetime, end: datetime, bucket: str = "day") -> Dict:
+    """Traffic totals and a per-bucket series for the buckets overlapping [start, end)."""
+    table, _, _ = BUCKETS[bucket]
+    first, last = bucket_range(bucket, start, end)
+    c.execute(f'''
+        SELECT bucket, page_views, events, engagement
+        FROM {table}
+        WHERE dimension = 'total' AND bucket >= ? AND bucket <= ?
+        ORDER BY bucket
+    ''', (first, last))
+    series = [
+        {"bucket": row[0], "page_views": row[1], "events": row[2], "engagement": row[3]}
+        for row in c.fetchall()
+    ]
+
+    # Hour keys start with their day key
+    day_first, day_last = first[:10], last[:10]
+    if bucket == "day":
+        c.execute('''
+            SELECT day, COUNT(*) FROM analytics_daily_visitors
+            WHERE day >= ? AND day <= ?
+            GROUP BY day
+        ''', (day_first, day_last))
+        visitors = dict(c.fetchall())
+        for point in series:
+            point["visitors"] = visitors.get(point["bucket"], 0)
+
+    # Visitor activity is kept per day, so the distinct count covers the days the range touches
+    c.execute('''
+        SELECT COUNT(DISTINCT visitor_id) FROM analytics_daily_visitors
+        WHERE day >= ? AND day <= ?
+    ''', (day_first, day_last))
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "page_views": sum(point["page_views"] for point in series),
+        "events": sum(point["events"] for point in series),
+        "engagement": sum(point["engagement"] for point in series),
+        "unique_visitors": c.fetchone()[0],
+        "series": series,
+    }
+
+def top_values(c, dimension: str, start: datetime, end: datetime, bucket: str = "day", limit: int = 10) -> List[Dict]:
+    """Most viewed pages / device types / countries, or most frequent event types, over [start, end)."""
+    table, _, _ = BUCKETS[bucket]
+    first, last = bucket_range(bucket, start, end)
+    order = "events" if dimension == "event_type" else "page_views"
+    c.execute(f'''
+        SELECT value, SUM(page_views) AS page_views, SUM(events) AS events, SUM(engagement)
+        FROM {table}
+        WHERE dimension = ? AND bucket >= ? AND bucket <= ?
+        GROUP BY value
+        ORDER BY {order} DESC
+        LIMIT ?
+    ''', (dimension, first, last, limit))
+    return [
+        {"value": row[0], "page_views": row[1], "events": row[2], "engagement": row[3]}
+        for row in c.fetchall()
+    ]
+
+def active_visitors(c, day: datetime) -> Dict:
+    """DAU, WAU and MAU for the UTC day `day` (trailing 1, 7 and 30 days)."""
+    counts = {}
+    for name, days in (("dau", 1), ("wau", 7), ("mau", 30)):
+        c.execute('''
+            SELECT COUNT(DISTINCT visitor_id) FROM analytics_daily_visitors
+            WHERE day > ? AND day <= ?
+        ''', ((day - timedelta(days=days)).strftime("%Y-%m-%d"), day.strftime("%Y-%m-%d")))
+        counts[name] = c.fetchone()[0]
+    return {"day": day.strftime("%Y-%m-%d"), **counts}
+
+def local_timestamp_ms(value: str) -> int:
+    # user_visits / user_events timestamps are server-local ISO strings
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+def backfill_rollups(conn: sqlite3.Connection) -> int:
+    """
+    Rebuild the rollups from user_events, plus daily activity from user_visits. Page views are
+    not recoverable (user_visits keeps one row per session), so those counters start at zero.
+    Returns the number of events rolled up.
+    """
+    c = conn.cursor()
+    for table, _, _ in BUCKETS.values():
+        c.execute(f"DELETE FROM {table}")
+    c.execute("DELETE FROM analytics_daily_visitors")
+
+    count = 0
+    rows = conn.execute('SELECT visitor_id, event_type, timestamp, page, engagement_value FROM user_events')
+    while True:
+        chunk = rows.fetchmany(10000)
+        if not chunk:
+            break
+        record_rollups(c, [
+            (local_timestamp_ms(timestamp), visitor_id, page, None, None, event_type, engagement)
+            for visitor_id, event_type, timestamp, page, engagement in chunk
+        ], page_views=False)
+        count += len(chunk)
+
+    # Sessions without events still mark their first and last day as active
+    active = set()
+    for visitor_id, first_visit, last_visit in conn.execute(
+        'SELECT visitor_id, first_visit_timestamp, last_visit_timestamp FROM user_visits'
+    ):
+        for value in (first_visit, last_visit):
+            if value:
+                day = datetime.utcfromtimestamp(local_timestamp_ms(value) / 1000).strftime(BUCKETS["day"][1])
+                active.add((day, visitor_id))
+    c.executemany('INSERT OR IGNORE INTO analytics_daily_visitors (day, visitor_id) VALUES (?, ?)', active)
+    conn.commit()
+    return count
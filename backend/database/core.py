@@ -1,7 +1,8 @@
 # /home/pi/caringmind/backend/database/core.py
 import json
 from sqlalchemy import Table, Column, Integer, String, Text
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Table, Text, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Table, Text, func
+from database.result_format import ResultDocument
 from utils.db_state import database, metadata
 
 prompt_schema_table = Table(
@@ -15,18 +16,41 @@ prompt_schema_table = Table(
     Column("updated_at", Integer, nullable=False)
 )
 
-# === Define the Device Registration Table ===
+# === Define the Account and Device Tables ===
+# One account per Google account; every install registers its own device under it. accounts.id is
+# the user_id stored with processed audio (migrated accounts keep their old device_registration ids).
 
-device_registration_table = Table(
-    "device_registration",
+accounts_table = Table(
+    "accounts",
     metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("google_account_id", String, index=True, nullable=False, unique=True),
-    Column("device_uuid", String, index=True, nullable=False, unique=True),
+    Column("id", Integer, primary_key=True),
+    Column("google_account_id", String, nullable=False),
+    Column("created_at", DateTime, default=func.now(), nullable=False),
+    Column("updated_at", DateTime, default=func.now(), onupdate=func.now(), nullable=False),
+    # Lookups by Google account return the id straight from the index
+    Index("ux_accounts_google_account_id", "google_account_id", unique=True, postgresql_include=["id"]),
+)
+
+devices_table = Table(
+    "devices",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("account_id", Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False),
+    Column("device_uuid", String, nullable=False),
     Column("id_token", String, nullable=False),
-    Column("access_token", String, nullable=False),
+    Column("access_token", String, nullable=True),
+    Column("device_name", String, nullable=True),
+    Column("os_version", String, nullable=True),
+    Column("app_version", String, nullable=True),
     Column("created_at", DateTime, default=func.now(), nullable=False),
     Column("updated_at", DateTime, default=func.now(), onupdate=func.now(), nullable=False),
+    # Upsert target, and the index-only (account, device) check in AuthService.verify_user
+    Index("ux_devices_account_device", "account_id", "device_uuid", unique=True),
+    # Device-only lookups pick the most recently updated device of a UUID and read its account
+    # from the index
+    Index("ix_devices_device_updated", "device_uuid", "updated_at", "id", "account_id"),
+    # Keyset pagination of the newest-first registration list
+    Index("ix_devices_created_id", "created_at", "id"),
 )
 
 # === Define the Processed Audio Files Table ===
@@ -35,11 +59,67 @@ processed_audio_files_table = Table(
     "processed_audio_files",
     metadata,
     Column("id", Integer, primary_key=True, index=True),
-    Column("user_id", Integer, ForeignKey("device_registration.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("accounts.id"), nullable=False),
     Column("file_name", String, nullable=False),
     Column("file_uri", String, nullable=True),
-    Column("gemini_result", Text, nullable=False),
+    # JSONB on Postgres, a compressed blob on SQLite (database/result_format.py)
+    Column("gemini_result", ResultDocument, nullable=False),
     Column("uploaded_at", DateTime, default=func.now(), nullable=False),
     Column("created_at", DateTime, default=func.now(), nullable=False),
     Column("updated_at", DateTime, default=func.now(), onupdate=func.now(), nullable=False),
-)
\ No newline at end of file
+    # A user's results, newest first (database.processed_results.fetch_results)
+    Index("ix_processed_audio_files_user_id", "user_id", "id"),
+)
+
+# === Define the Gemini Result Cache Table ===
+# Content-addressed: cache_key hashes the audio bytes together with the prompt and generation settings
+
+gemini_result_cache_table = Table(
+    "gemini_result_cache",
+    metadata,
+    Column("cache_key", String(64), primary_key=True),
+    Column("prompt_type", String, nullable=False),
+    Column("model_name", String, nullable=False),
+    Column("result", Text, nullable=False),
+    Column("hit_count", Integer, default=0, nullable=False),
+    Column("created_at", DateTime, default=func.now(), nullable=False),
+    Column("last_accessed_at", DateTime, default=func.now(), nullable=False, index=True),
+)
+
+# === Define the Audio Jobs Table ===
+# Durable work queue: workers claim rows by setting locked_by/locked_until, expired leases are reclaimed
+
+audio_jobs_table = Table(
+    "audio_jobs",
+    metadata,
+    Column("id", String(36), primary_key=True),
+    Column("kind", String, nullable=False),
+    Column("status", String, nullable=False, index=True),  # queued | running | succeeded | failed
+    Column("payload", Text, nullable=False),
+    Column("result", Text, nullable=True),
+    Column("error", Text, nullable=True),
+    Column("attempts", Integer, default=0, nullable=False),
+    Column("max_attempts", Integer, nullable=False),
+    Column("webhook_url", String, nullable=True),
+    Column("locked_by", String, nullable=True),
+    Column("locked_until", DateTime, nullable=True),
+    Column("available_at", DateTime, default=func.now(), nullable=False, index=True),
+    Column("created_at", DateTime, default=func.now(), nullable=False),
+    Column("updated_at", DateTime, default=func.now(), onupdate=func.now(), nullable=False),
+)
+
+# === Define the Gemini File Handles Table ===
+# Maps audio content hashes to files already uploaded to the Gemini Files API (kept there for 48h)
+
+gemini_file_handles_table = Table(
+    "gemini_file_handles",
+    metadata,
+    Column("content_hash", String(64), primary_key=True),
+    Column("file_name", String, nullable=False),  # Files API resource name, e.g. files/abc123
+    Column("file_uri", String, nullable=False, index=True),
+    Column("mime_type", String, nullable=False),
+    Column("size_bytes", Integer, nullable=True),
+    Column("expires_at", DateTime, nullable=False),
+    Column("created_at", DateTime, default=func.now(), nullable=False),
+    Column("last_used_at", DateTime, default=func.now(), nullable=False),
+)
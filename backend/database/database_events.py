@@ -1,11 +1,19 @@
+# each user main app should have a uuid, we want to be able to verify the device in the server with it in the case we handle monetization outside the perview of apple
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from utils.db_state import database
+from database.lifecycle import db_lifecycle
 
 def register_db_events(app: FastAPI):
-    @app.on_event("startup")
-    async def startup():
-        await database.connect()
+    """
+    Hold the database connections for the app's whole lifespan: opened before any router's startup
+    hook runs and closed after every shutdown hook (e.g. the job worker's final writes) has finished.
+    """
+    app_lifespan = app.router.lifespan_context
 
-    @app.on_event("shutdown")
-    async def shutdown():
-        await database.disconnect()
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        async with db_lifecycle.connected():
+            async with app_lifespan(app) as state:
+                yield state
+
+    app.router.lifespan_context = lifespan
@@ -0,0 +1,324 @@
+# backend/database/devices.py
+# Account/device registration queries and the one-time migration from the legacy
+# device_registration table (one row per Google account *and* per device, so a reinstall with a
+# new device UUID could not register).
+#
+# Usage (from backend/), after deploying the accounts/devices schema:
+#   python -m database.devices migrate
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import sqlalchemy
+from sqlalchemy import bindparam, or_, select, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.core import accounts_table, database, devices_table
+from database.statements import PreparedStatement, register_statement
+from utils.db_state import DATABASE_URL, metadata
+
+logger = logging.getLogger(__name__)
+
+# Registration as the API reports it: the device row plus its account's Google id
+REGISTRATION_COLUMNS = (
+    devices_table.c.id,
+    devices_table.c.account_id,
+    accounts_table.c.google_account_id,
+    devices_table.c.device_uuid,
+    devices_table.c.device_name,
+    devices_table.c.os_version,
+    devices_table.c.app_version,
+    devices_table.c.created_at,
+    devices_table.c.updated_at,
+)
+# Columns a repeated registration refreshes
+REFRESHED_COLUMNS = ("id_token", "device_name", "os_version", "app_version", "updated_at")
+# Largest batch for the bulk helpers; keeps multi-row statements under SQLite's bound-parameter limit
+MAX_BULK_DEVICES = 500
+
+# "Most recently updated device wins" for accounts and device UUIDs with several devices
+LATEST_DEVICE_FIRST = (devices_table.c.updated_at.desc(), devices_table.c.id.desc())
+
+def registration_select():
+    return select(*REGISTRATION_COLUMNS).select_from(
+        devices_table.join(accounts_table, devices_table.c.account_id == accounts_table.c.id)
+    )
+
+# Identity lookups by which identifiers are present: (google_account_id, device_uuid) -> account id.
+# Every variant is answered from the unique/covering indexes on accounts and devices without
+# reading table rows.
+IDENTITY_STATEMENTS: Dict[Tuple[bool, bool], PreparedStatement] = {
+    (True, True): register_statement("identity.account_device", select(accounts_table.c.id).select_from(
+        accounts_table.join(devices_table, devices_table.c.account_id == accounts_table.c.id)
+    ).where(
+        accounts_table.c.google_account_id == bindparam("google_account_id"),
+        devices_table.c.device_uuid == bindparam("device_uuid")
+    )),
+    (True, False): register_statement("identity.account", select(accounts_table.c.id).where(
+        accounts_table.c.google_account_id == bindparam("google_account_id")
+    )),
+    # A device UUID shared by several accounts resolves to its most recently updated device,
+    # like registration_check_statement and find_registrations
+    (False, True): register_statement("identity.device", select(devices_table.c.account_id.label("id")).where(
+        devices_table.c.device_uuid == bindparam("device_uuid")
+    ).order_by(*LATEST_DEVICE_FIRST).limit(1)),
+}
+
+def identity_statement(google_account_id: Optional[str] = None, device_uuid: Optional[str] = None) -> PreparedStatement:
+    """The precompiled identity lookup for the identifiers given; run it with both as parameters."""
+    return IDENTITY_STATEMENTS[(bool(google_account_id), bool(device_uuid))]
+
+def identity_query(google_account_id: Optional[str] = None, device_uuid: Optional[str] = None):
+    """The account id (`id`) behind a Google account and/or device UUID, as a Core select."""
+    return identity_statement(google_account_id, device_uuid).statement.params(
+        google_account_id=google_account_id, device_uuid=device_uuid
+    )
+
+REGISTRATION_BY_ID = register_statement(
+    "registration.by_id", registration_select().where(devices_table.c.id == bindparam("id"))
+)
+
+def registration_check_statement(google_account_id: Optional[str], device_uuid: Optional[str]) -> PreparedStatement:
+    """
+    The precompiled registration lookup for POST /register/check. An account alone, or a device
+    UUID under several accounts, reports the most recently updated device.
+    """
+    variant = (bool(google_account_id), bool(device_uuid))
+    name = {(True, True): "account_device", (True, False): "account", (False, True): "device"}[variant]
+    query = registration_select()
+    if google_account_id:
+        query = query.where(accounts_table.c.google_account_id == bindparam("google_account_id"))
+    if device_uuid:
+        query = query.where(devices_table.c.device_uuid == bindparam("device_uuid"))
+    return register_statement(
+        f"registration.check.{name}", query.order_by(*LATEST_DEVICE_FIRST).limit(1)
+    )
+
+def dialect_insert():
+    return postgresql.insert if database.url.dialect == "postgresql" else sqlite.insert
+
+def account_upsert(google_account_ids: Iterable[str], now: datetime):
+    """INSERT ... ON CONFLICT for accounts, returning (id, google_account_id) whether new or not."""
+    statement = dialect_insert()(accounts_table).values([
+        {"google_account_id": google_account_id, "created_at": now, "updated_at": now}
+        for google_account_id in google_account_ids
+    ])
+    return statement.on_conflict_do_update(
+        index_elements=[accounts_table.c.google_account_id],
+        set_={"updated_at": statement.excluded.updated_at}
+    ).returning(accounts_table.c.id, accounts_table.c.google_account_id)
+
+def device_upsert(statement):
+    """ON CONFLICT clause shared by the single and bulk device upserts."""
+    return statement.on_conflict_do_update(
+        index_elements=[devices_table.c.account_id, devices_table.c.device_uuid],
+        set_={name: statement.excluded[name] for name in REFRESHED_COLUMNS}
+    ).returning(*devices_table.c)
+
+# Device values upsert_device binds, in statement order
+DEVICE_VALUES = ("device_uuid", "id_token", "device_name", "os_version", "app_version", "created_at", "updated_at")
+
+def device_upsert_statement() -> PreparedStatement:
+    """
+    The single-device upsert, precompiled. Postgres does both upserts in one statement (a
+    data-modifying CTE). SQLite has no DML in CTEs, so there it is two upsert statements, still
+    without a read-before-write; this returns the device half, see account_upsert_statement.
+    """
+    insert = dialect_insert()
+    values = {name: bindparam(name, type_=devices_table.c[name].type) for name in DEVICE_VALUES}
+    if database.url.dialect == "postgresql":
+        account = account_upsert([bindparam("google_account_id")], bindparam("created_at")).cte("account")
+        statement = insert(devices_table).from_select(["account_id", *values], select(account.c.id, *values.values()))
+        # Data-modifying CTEs must sit at the top of the statement
+        return register_statement("devices.upsert", device_upsert(statement).add_cte(account))
+    return register_statement(
+        "devices.upsert", device_upsert(insert(devices_table).values(account_id=bindparam("account_id"), **values))
+    )
+
+def account_upsert_statement() -> PreparedStatement:
+    return register_statement(
+        "accounts.upsert", account_upsert([bindparam("google_account_id")], bindparam("created_at"))
+    )
+
+async def upsert_device(
+    google_account_id: str,
+    device_uuid: str,
+    id_token: str,
+    device_name: Optional[str] = None,
+    os_version: Optional[str] = None,
+    app_version: Optional[str] = None
+) -> Dict:
+    """
+    Register a device under its account, creating the account on first sight, or refresh the
+    tokens and metadata of an existing registration. Returns the registration row.
+    One precompiled statement on Postgres, two on SQLite (see device_upsert_statement).
+    """
+    now = datetime.utcnow()
+    device = {
+        "device_uuid": device_uuid,
+        "id_token": id_token,
+        "device_name": device_name,
+        "os_version": os_version,
+        "app_version": app_version,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+    if database.url.dialect == "postgresql":
+        row = await device_upsert_statement().fetch_one(google_account_id=google_account_id, **device)
+    else:
+        # No transaction around the pair: each upsert is atomic and idempotent on its own, and an
+        # open write transaction would hold SQLite's lock across awaits under concurrent registrations
+        account_row = await account_upsert_statement().fetch_one(google_account_id=google_account_id, created_at=now)
+        row = await device_upsert_statement().fetch_one(account_id=account_row["id"], **device)
+    return {**row, "google_account_id": google_account_id}
+
+async def account_id_for(google_account_id: str) -> int:
+    """Id of the account for `google_account_id`, creating it if needed (one upsert)."""
+    return (await database.fetch_one(account_upsert([google_account_id], datetime.utcnow())))["id"]
+
+async def upsert_devices(registrations: List[Dict]) -> List[Dict]:
+    """
+    upsert_device for a batch of registration dicts: one multi-row account upsert and one
+    multi-row device upsert, whatever the batch size. A device listed twice is registered once,
+    with its last values. Returns the registration rows in first-seen order.
+    """
+    if not registrations:
+        return []
+    now = datetime.utcnow()
+    # ON CONFLICT may not touch the same row twice in one statement
+    unique = {(item["google_account_id"], item["device_uuid"]): item for item in registrations}
+    insert = dialect_insert()
+    # Two idempotent statements; no transaction is held open between them (see upsert_device)
+    account_ids = {
+        row["google_account_id"]: row["id"]
+        for row in await database.fetch_all(account_upsert(dict.fromkeys(key[0] for key in unique), now))
+    }
+    rows = await database.fetch_all(device_upsert(insert(devices_table).values([
+        {
+            "account_id": account_ids[google_account_id],
+            "device_uuid": device_uuid,
+            "id_token": item["id_token"],
+            "device_name": item.get("device_name"),
+            "os_version": item.get("os_version"),
+            "app_version": item.get("app_version"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for (google_account_id, device_uuid), item in unique.items()
+    ])))
+    # RETURNING order isn't guaranteed
+    by_key = {(row["account_id"], row["device_uuid"]): row for row in rows}
+    return [
+        {**by_key[(account_ids[google_account_id], device_uuid)]._mapping, "google_account_id": google_account_id}
+        for google_account_id, device_uuid in unique
+    ]
+
+async def find_registrations(identities: List[Tuple[Optional[str], Optional[str]]]) -> List[Optional[Dict]]:
+    """
+    The registration for each (google_account_id, device_uuid), or None, from one query for the
+    whole batch. Either identifier may be missing; an account alone (or a device UUID registered
+    under several accounts) reports its most recently updated device.
+    """
+    pairs = [(g, d) for g, d in identities if g and d]
+    accounts_only = [g for g, d in identities if g and not d]
+    devices_only = [d for g, d in identities if d and not g]
+    conditions = []
+    if pairs:
+        conditions.append(tuple_(accounts_table.c.google_account_id, devices_table.c.device_uuid).in_(pairs))
+    if accounts_only:
+        conditions.append(accounts_table.c.google_account_id.in_(accounts_only))
+    if devices_only:
+        conditions.append(devices_table.c.device_uuid.in_(devices_only))
+    if not conditions:
+        return [None] * len(identities)
+
+    found: Dict[Tuple[Optional[str], Optional[str]], Dict] = {}
+    rows = await database.fetch_all(
+        registration_select().where(or_(*conditions)).order_by(devices_table.c.updated_at, devices_table.c.id)
+    )
+    # Reverse of LATEST_DEVICE_FIRST, so the latest device per account / UUID is written last
+    for row in rows:
+        registration = dict(row._mapping)
+        found[(registration["google_account_id"], registration["device_uuid"])] = registration
+        found[(registration["google_account_id"], None)] = registration
+        found[(None, registration["device_uuid"])] = registration
+    return [found.get((g or None, d or None)) for g, d in identities]
+
+# ------------------ Migration from device_registration ------------------
+
+def migrate_device_registration(connection) -> int:
+    """
+    Copy legacy device_registration rows into accounts and devices, keeping their ids so existing
+    processed_audio_files.user_id values still point at the right account. Runs once: skipped
+    when the legacy table is absent or accounts already has rows. Returns rows migrated.
+    The legacy table is left in place; drop it once the migration has been checked.
+    """
+    inspector = sqlalchemy.inspect(connection)
+    if not inspector.has_table("device_registration"):
+        return 0
+    if connection.execute(select(sqlalchemy.func.count()).select_from(accounts_table)).scalar():
+        return 0
+
+    legacy = {column["name"] for column in inspector.get_columns("device_registration")}
+    optional = [name for name in ("access_token", "device_name", "os_version", "app_version") if name in legacy]
+    columns = ", ".join(["device_uuid", "id_token", *optional, "created_at", "updated_at"])
+    connection.execute(text('''
+        INSERT INTO accounts (id, google_account_id, created_at, updated_at)
+        SELECT id, google_account_id, created_at, updated_at FROM device_registration
+    '''))
+    migrated = connection.execute(text(f'''
+        INSERT INTO devices (id, account_id, {columns})
+        SELECT id, id, {columns} FROM device_registration
+    ''')).rowcount
+
+    if connection.dialect.name == "postgresql":
+        # Explicit ids don't advance the serial sequences
+        for table in ("accounts", "devices"):
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            ))
+        # Postgres enforces the old user_id -> device_registration.id key; SQLite doesn't by default
+        for foreign_key in inspector.get_foreign_keys("processed_audio_files"):
+            if foreign_key["referred_table"] == "device_registration":
+                connection.execute(text(f'ALTER TABLE processed_audio_files DROP CONSTRAINT "{foreign_key["name"]}"'))
+                connection.execute(text(
+                    "ALTER TABLE processed_audio_files ADD CONSTRAINT processed_audio_files_user_id_fkey "
+                    "FOREIGN KEY (user_id) REFERENCES accounts (id)"
+                ))
+    logger.info(f"Migrated {migrated} device registrations to accounts/devices")
+    return migrated
+
+def migrate_development_database() -> int:
+    """Run the migration against the development SQLite database (called on startup)."""
+    engine = sqlalchemy.create_engine(DATABASE_URL.replace("+aiosqlite", ""))
+    try:
+        with engine.begin() as connection:
+            return migrate_device_registration(connection)
+    finally:
+        engine.dispose()
+
+async def migrate():
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url, connect_args = DATABASE_URL, {}
+    if "sslmode=require" in url:
+        # asyncpg takes SSL as a connect argument, not a URL parameter
+        url, connect_args = url.replace("?sslmode=require", ""), {"ssl": "require"}
+    engine = create_async_engine(url, connect_args=connect_args)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(metadata.create_all)
+            migrated = await connection.run_sync(migrate_device_registration)
+        print(f"Migrated {migrated} device registrations")
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Account/device registration maintenance")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+    asyncio.run(migrate())
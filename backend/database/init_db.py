@@ -14,6 +14,8 @@ async def init_db():
     try:
         # Import database configuration
         from utils.db_state import database, metadata
+        # Register the application tables on the shared metadata
+        from database import core, waitlist  # noqa: F401
         
         # Get environment
         env = os.getenv("ENVIRONMENT", "development")
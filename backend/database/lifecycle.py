@@ -0,0 +1,151 @@
+# backend/database/lifecycle.py
+# Opens and closes the shared `databases` connections (primary and optional read replica) and
+# reports how busy their pools are. index.py wires it in once through register_db_events; scripts
+# use `async with db_lifecycle.connected():`, which reuses the app's connection if one is open.
+#
+# Pool metrics on /metrics:
+#   caringmind_db_pool_connections{database,state}   in_use / waiting / size / max_size
+#   caringmind_db_pool_acquire_seconds{database}     time spent waiting for a pooled connection
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Tuple
+
+import databases
+
+from database.devices import migrate_development_database
+from database.processed_results import migrate_development_results, processed_results_writer
+from utils.db_state import ENV, create_development_tables, database, read_database
+from utils.telemetry import REGISTRY, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "caringmind_db_pool_acquire_seconds",
+    "Time spent waiting for a database connection from the pool.",
+    ["database"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+class InstrumentedPool:
+    """
+    Stands in for a backend's connection pool (asyncpg's, or the per-acquire SQLite one) and
+    counts connections in use and acquires waiting, without changing how the pool behaves.
+    """
+
+    def __init__(self, pool, name: str):
+        self.pool = pool
+        self.name = name
+        self.in_use = 0
+        self.waiting = 0
+
+    async def acquire(self):
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            connection = await self.pool.acquire()
+        finally:
+            self.waiting -= 1
+            DB_POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - started, self.name)
+        self.in_use += 1
+        return connection
+
+    async def release(self, connection):
+        self.in_use -= 1
+        return await self.pool.release(connection)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+class DatabaseLifecycle:
+    """Reference-counted connect/disconnect for the primary database and its read replica."""
+
+    def __init__(self, connections: Dict[str, databases.Database]):
+        self.connections = connections
+        self._users = 0
+
+    async def connect(self):
+        self._users += 1
+        if self._users > 1:
+            return
+        try:
+            if ENV == "development":
+                # Route modules register their tables on import, after utils.db_state first ran create_all
+                create_development_tables()
+                # One-time copy of legacy device_registration rows into accounts/devices
+                migrate_development_database()
+                # gemini_result text from before results were stored as compressed blobs
+                migrate_development_results()
+            for name, connection in self.connections.items():
+                await connection.connect()
+                backend = connection._backend
+                backend._pool = InstrumentedPool(backend._pool, name)
+                logger.info(f"Connected to the {name} database")
+            # Write-behind for processed audio results; drained in _close before the pools go away
+            processed_results_writer.start()
+        except BaseException:
+            self._users = 0
+            await self._close()
+            raise
+
+    async def _close(self):
+        await processed_results_writer.stop()
+        for name, connection in reversed(list(self.connections.items())):
+            if not connection.is_connected:
+                continue
+            backend = connection._backend
+            if isinstance(backend._pool, InstrumentedPool):
+                backend._pool = backend._pool.pool
+            await connection.disconnect()
+            logger.info(f"Disconnected from the {name} database")
+
+    async def disconnect(self):
+        if self._users == 0:
+            return
+        self._users -= 1
+        if not self._users:
+            await self._close()
+
+    @asynccontextmanager
+    async def connected(self) -> AsyncIterator[None]:
+        await self.connect()
+        try:
+            yield
+        finally:
+            await self.disconnect()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Connections in use and waiting per database, plus asyncpg's pool size where there is one."""
+        stats = {}
+        for name, connection in self.connections.items():
+            pool = connection._backend._pool
+            if not isinstance(pool, InstrumentedPool):
+                stats[name] = {"connected": False}
+                continue
+            entry = {"connected": True, "in_use": pool.in_use, "waiting": pool.waiting}
+            if hasattr(pool.pool, "get_size"):
+                entry.update(size=pool.get_size(), max_size=pool.get_max_size())
+                entry["saturation"] = round(pool.in_use / entry["max_size"], 3)
+            stats[name] = entry
+        return stats
+
+    def _collect(self) -> Dict[Tuple[str, ...], float]:
+        return {
+            (name, state): value
+            for name, entry in self.stats().items()
+            for state, value in entry.items()
+            if state in ("in_use", "waiting", "size", "max_size")
+        }
+
+db_lifecycle = DatabaseLifecycle(
+    {"primary": database, **({"replica": read_database} if read_database is not database else {})}
+)
+REGISTRY.extend([
+    DB_POOL_ACQUIRE_SECONDS,
+    Gauge(
+        "caringmind_db_pool_connections",
+        "Database connections by state: in_use, waiting (for a free connection), size and max_size.",
+        ["database", "state"],
+        db_lifecycle._collect
+    ),
+])
@@ -0,0 +1,372 @@
+# backend/database/processed_results.py
+# Write-behind persistence of processed audio results (processed_audio_files).
+#
+# Request handlers hand rows to `processed_results_writer` and return; one background task
+# collects whatever is queued (up to PROCESSED_RESULTS_BATCH_SIZE rows, waiting at most
+# PROCESSED_RESULTS_FLUSH_INTERVAL for a batch to fill) and writes it with a single precompiled
+# INSERT executed for every row in one transaction. A batch upload of N files therefore costs the
+# request one enqueue, not N inserts. database/lifecycle.py starts the writer after connecting and
+# drains it before disconnecting (for up to PROCESSED_RESULTS_DRAIN_TIMEOUT); without a running
+# writer, rows are written inline.
+#
+# gemini_result is stored as JSONB on Postgres and as a compressed blob on SQLite
+# (database/result_format.py); fetch_results() filters on name, topics and confidence_score in
+# SQL on Postgres and after decoding on SQLite, so callers see the same results either way.
+#
+# Usage (from backend/), to convert an existing gemini_result column and create its indexes:
+#   python -m database.processed_results migrate
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import databases
+import sqlalchemy
+from sqlalchemy import Float, bindparam, literal_column, select, text, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+
+from database.core import processed_audio_files_table
+from database.result_format import dump_result, load_result
+from database.statements import register_statement
+from utils.db_state import DATABASE_URL, metadata, read_database
+
+logger = logging.getLogger(__name__)
+
+PROCESSED_RESULTS_QUEUE_SIZE = int(os.getenv("PROCESSED_RESULTS_QUEUE_SIZE", "10000"))  # rows buffered before submitters wait
+PROCESSED_RESULTS_BATCH_SIZE = int(os.getenv("PROCESSED_RESULTS_BATCH_SIZE", "200"))  # rows written per transaction at most
+PROCESSED_RESULTS_FLUSH_INTERVAL = float(os.getenv("PROCESSED_RESULTS_FLUSH_INTERVAL", "0.1"))  # seconds a row may wait for its batch
+PROCESSED_RESULTS_DRAIN_TIMEOUT = float(os.getenv("PROCESSED_RESULTS_DRAIN_TIMEOUT", "30"))  # seconds stop() waits for the queue
+WRITE_ATTEMPTS = 3
+MIGRATION_CHUNK_ROWS = 1000
+FETCH_CHUNK_ROWS = 500  # rows decoded per round trip when SQLite filters results in Python
+
+# Inline: the writer doesn't need the generated ids, and executemany has no use for RETURNING
+INSERT_PROCESSED_FILE = register_statement(
+    "processed_audio_files.insert_many",
+    processed_audio_files_table.insert().inline().values(
+        user_id=bindparam("user_id"),
+        file_name=bindparam("file_name"),
+        file_uri=bindparam("file_uri"),
+        gemini_result=bindparam("gemini_result", type_=processed_audio_files_table.c.gemini_result.type),
+        uploaded_at=bindparam("now", type_=processed_audio_files_table.c.uploaded_at.type),
+        created_at=bindparam("now", type_=processed_audio_files_table.c.created_at.type),
+        updated_at=bindparam("now", type_=processed_audio_files_table.c.updated_at.type),
+    )
+)
+
+def result_row(user_id: int, file_name: str, file_uri: Optional[str], gemini_result: Any) -> Dict[str, Any]:
+    """One processed_audio_files row, timestamped now (when the result was produced, not written)."""
+    return {
+        "user_id": user_id,
+        "file_name": file_name,
+        "file_uri": file_uri,
+        "gemini_result": gemini_result,  # encoded by the column type when the writer inserts it
+        "now": datetime.utcnow(),
+    }
+
+async def insert_results(rows: List[Dict[str, Any]]):
+    """Write result_row() dicts in one transaction."""
+    await INSERT_PROCESSED_FILE.execute_many(rows)
+
+class ProcessedResultWriter:
+    """Background batch writer for processed_audio_files rows."""
+
+    def __init__(
+        self,
+        queue_size: int = PROCESSED_RESULTS_QUEUE_SIZE,
+        batch_size: int = PROCESSED_RESULTS_BATCH_SIZE,
+        flush_interval: float = PROCESSED_RESULTS_FLUSH_INTERVAL,
+        drain_timeout: float = PROCESSED_RESULTS_DRAIN_TIMEOUT
+    ):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drain_timeout = drain_timeout
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.abandoned = 0
+        self._writing = 0  # rows of the batch being written
+
+    def start(self):
+        if self._task is None or self._task.done():
+            # Created here so the queue belongs to the running event loop
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+            logger.info("Processed result writer started")
+
+    async def stop(self):
+        """
+        Write what is still queued (for up to drain_timeout), then stop the background task. With the
+        database unreachable every batch retries, so an unbounded drain could hold up shutdown for minutes.
+        """
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            abandoned = self.queue.qsize() + self._writing
+            self.abandoned += abandoned
+            logger.error(f"Abandoning {abandoned} unwritten processed results on shutdown")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info(f"Processed result writer stopped ({self.written} rows written)")
+
+    async def submit(self, rows: List[Dict[str, Any]]):
+        """
+        Queue result_row() dicts for the writer. Only waits when the queue is full (backpressure
+        rather than dropping results); writes inline when the writer isn't running.
+        """
+        if self._task is None or self._task.done():
+            await insert_results(rows)
+            self.written += len(rows)
+            return
+        for row in rows:
+            await self.queue.put(row)
+
+    async def flush(self):
+        """Wait until every row queued so far has been written (or given up on)."""
+        if self._task is not None:
+            await self.queue.join()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            self._writing = len(batch)
+            try:
+                await self._write(batch)
+            finally:
+                self._writing = 0
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        """
+        Write a batch in one transaction, retrying transient failures; if it still fails, retry
+        row by row so one bad row (a foreign key violation, an unserializable result) loses only itself.
+        """
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                await insert_results(batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Writing {len(batch)} processed results failed (attempt {attempt}): {e}")
+                if attempt < WRITE_ATTEMPTS:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        if len(batch) == 1:
+            self._drop(batch[0])
+            return
+        logger.warning(f"Retrying {len(batch)} processed results individually")
+        for row in batch:
+            try:
+                await insert_results([row])
+                self.written += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Writing processed result {row.get('file_name')} failed: {e}")
+                self._drop(row)
+            self._writing -= 1
+
+    def _drop(self, row: Dict[str, Any]):
+        self.failed += 1
+        logger.error(f"Dropped processed result {row.get('file_name')} for user {row.get('user_id')}")
+
+    def stats(self) -> Dict:
+        """Counters for the processed result writer."""
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+            "abandoned": self.abandoned,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+processed_results_writer = ProcessedResultWriter()
+
+# ------------------ Reads ------------------
+
+# Postgres expressions, spelled exactly as in RESULT_INDEXES so the planner matches the indexes
+RESULT_DOCUMENT = type_coerce(processed_audio_files_table.c.gemini_result, JSONB)
+CONFIDENCE_SCORE = literal_column("((gemini_result ->> 'confidence_score')::float)", Float)
+
+def result_matches(
+    gemini_result: Any,
+    name: Optional[str] = None,
+    topic: Optional[str] = None,
+    min_confidence: Optional[float] = None
+) -> bool:
+    """The fetch_results filters, applied to a decoded result (what the Postgres query does in SQL)."""
+    if not isinstance(gemini_result, dict):
+        return name is None and topic is None and min_confidence is None
+    if name is not None and gemini_result.get("name") != name:
+        return False
+    if topic is not None and topic not in (gemini_result.get("topics") or []):
+        return False
+    if min_confidence is not None:
+        score = gemini_result.get("confidence_score")
+        if not isinstance(score, (int, float)) or score < min_confidence:
+            return False
+    return True
+
+def result_dict(row) -> Dict[str, Any]:
+    # Item access, not _mapping: on Postgres `databases` only runs result processors (here the
+    # JSONB decode) for values read by key
+    return {key: row[key] for key in row.keys()}
+
+async def fetch_results(
+    user_id: int,
+    name: Optional[str] = None,
+    topic: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    limit: int = 100,
+    connection: databases.Database = read_database
+) -> List[Dict[str, Any]]:
+    """
+    A user's processed results, newest first, optionally filtered on the result's name, one of
+    its topics, or a minimum confidence_score. gemini_result comes back decoded.
+    """
+    table = processed_audio_files_table
+    query = select(
+        table.c.id, table.c.file_name, table.c.file_uri, table.c.gemini_result, table.c.uploaded_at
+    ).where(table.c.user_id == user_id).order_by(table.c.id.desc())
+
+    if connection.url.dialect == "postgresql":
+        if name is not None:
+            query = query.where(RESULT_DOCUMENT.contains({"name": name}))
+        if topic is not None:
+            query = query.where(RESULT_DOCUMENT.contains({"topics": [topic]}))
+        if min_confidence is not None:
+            query = query.where(CONFIDENCE_SCORE >= bindparam("min_confidence", min_confidence, type_=Float))
+        return [result_dict(row) for row in await connection.fetch_all(query.limit(limit))]
+
+    # SQLite can't look inside compressed blobs: walk the user's rows in id order and filter decoded
+    found: List[Dict[str, Any]] = []
+    before = None
+    while len(found) < limit:
+        chunk = query if before is None else query.where(table.c.id < before)
+        rows = await connection.fetch_all(chunk.limit(FETCH_CHUNK_ROWS))
+        for row in rows:
+            result = result_dict(row)
+            if result_matches(result["gemini_result"], name, topic, min_confidence):
+                found.append(result)
+                if len(found) == limit:
+                    break
+        if len(rows) < FETCH_CHUNK_ROWS:
+            break
+        before = rows[-1]["id"]
+    return found
+
+# ------------------ Migration to the JSONB / compressed blob format ------------------
+
+# Postgres only. One jsonb_path_ops GIN index serves the containment filters on name and topics
+# (and any other key); confidence_score filters are ranges, which GIN can't answer, so it gets an
+# expression B-tree instead.
+RESULT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_processed_audio_files_result "
+    "ON processed_audio_files USING gin (gemini_result jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_processed_audio_files_confidence "
+    "ON processed_audio_files (((gemini_result ->> 'confidence_score')::float))",
+)
+
+def migrate_result_format(connection) -> int:
+    """
+    Convert gemini_result values to the current storage format: ALTER the column to JSONB and
+    create RESULT_INDEXES on Postgres (the ALTER rewrites the table under an exclusive lock, so
+    run it off-peak), recompress text values into blobs on SQLite. Safe to rerun; returns the
+    number of rows converted.
+    """
+    table = processed_audio_files_table
+    inspector = sqlalchemy.inspect(connection)
+    if not inspector.has_table(table.name):
+        return 0
+    converted = 0
+
+    if connection.dialect.name == "postgresql":
+        column = next(c for c in inspector.get_columns(table.name) if c["name"] == "gemini_result")
+        if not isinstance(column["type"], JSONB):
+            # Values compressed as "zlib:" + base64 text aren't valid JSON for the cast; decode them first
+            compressed = connection.execute(text(
+                "SELECT id, gemini_result FROM processed_audio_files WHERE gemini_result LIKE 'zlib:%'"
+            )).fetchall()
+            if compressed:
+                connection.execute(
+                    text("UPDATE processed_audio_files SET gemini_result = :result WHERE id = :id"),
+                    [{"id": row.id, "result": json.dumps(load_result(row.gemini_result))} for row in compressed]
+                )
+            connection.execute(text(
+                "ALTER TABLE processed_audio_files ALTER COLUMN gemini_result TYPE jsonb USING gemini_result::jsonb"
+            ))
+            converted = connection.execute(select(sqlalchemy.func.count()).select_from(table)).scalar()
+        for statement in RESULT_INDEXES:
+            connection.execute(text(statement))
+    else:
+        # Blobs are already converted; text values are plain or base64-compressed JSON
+        while True:
+            rows = connection.execute(text(
+                "SELECT id, gemini_result FROM processed_audio_files "
+                "WHERE typeof(gemini_result) = 'text' ORDER BY id LIMIT :limit"
+            ), {"limit": MIGRATION_CHUNK_ROWS}).fetchall()
+            if not rows:
+                break
+            connection.execute(
+                text("UPDATE processed_audio_files SET gemini_result = :result WHERE id = :id"),
+                [{"id": row.id, "result": dump_result(load_result(row.gemini_result))} for row in rows]
+            )
+            converted += len(rows)
+
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+    if converted:
+        logger.info(f"Converted {converted} processed results to the {connection.dialect.name} result format")
+    return converted
+
+def migrate_development_results() -> int:
+    """Run the result format migration against the development SQLite database (called on startup)."""
+    engine = sqlalchemy.create_engine(DATABASE_URL.replace("+aiosqlite", ""))
+    try:
+        with engine.begin() as connection:
+            return migrate_result_format(connection)
+    finally:
+        engine.dispose()
+
+async def migrate():
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url, connect_args = DATABASE_URL, {}
+    if "sslmode=require" in url:
+        # asyncpg takes SSL as a connect argument, not a URL parameter
+        url, connect_args = url.replace("?sslmode=require", ""), {"ssl": "require"}
+    engine = create_async_engine(url, connect_args=connect_args)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(metadata.create_all)
+            converted = await connection.run_sync(migrate_result_format)
+        print(f"Converted {converted} processed results")
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Processed result storage maintenance")
+    parser.add_argument("command", choices=["migrate"])
+    parser.parse_args()
+    asyncio.run(migrate())
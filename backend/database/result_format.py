@@ -0,0 +1,91 @@
+# backend/database/result_format.py
+# Storage format of processed_audio_files.gemini_result, chosen per dialect by ResultDocument:
+#   - Postgres: JSONB, so results can be filtered in SQL and indexed (see
+#     database/processed_results.py for the indexes). Postgres compresses large values itself.
+#   - SQLite: a binary blob, "zstd:" + a zstandard frame when the optional zstandard package is
+#     installed, "zlib:" + a zlib stream otherwise. Results under PROCESSED_RESULT_COMPRESS_MIN_BYTES
+#     are kept as plain JSON bytes, where compression saves nothing.
+#
+# Either way the column reads and writes Python objects. load_result() also reads the formats of
+# earlier versions (json.dumps text, and "zlib:" + base64 text), so rows not yet migrated by
+# database.processed_results.migrate_result_format still decode.
+import base64
+import json
+import logging
+import os
+import zlib
+from typing import Any, Optional
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+
+logger = logging.getLogger(__name__)
+
+PROCESSED_RESULT_COMPRESS_MIN_BYTES = int(os.getenv("PROCESSED_RESULT_COMPRESS_MIN_BYTES", "256"))  # JSON bytes
+RESULT_ZSTD_LEVEL = int(os.getenv("RESULT_ZSTD_LEVEL", "3"))
+ZSTD_PREFIX = b"zstd:"
+ZLIB_PREFIX = b"zlib:"  # no JSON document starts with "z", so plain JSON can't collide with either
+
+_zstd = None  # (compressor, decompressor), created on first use
+_zstd_checked = False
+
+def zstd_codec():
+    """A zstandard (compressor, decompressor) pair, or None when zstandard isn't installed."""
+    global _zstd, _zstd_checked
+    if not _zstd_checked:
+        _zstd_checked = True
+        try:
+            import zstandard
+            _zstd = (zstandard.ZstdCompressor(level=RESULT_ZSTD_LEVEL), zstandard.ZstdDecompressor())
+        except ImportError:
+            logger.warning("zstandard is not installed; SQLite results are compressed with zlib instead")
+    return _zstd
+
+def dump_result(gemini_result: Any) -> bytes:
+    """gemini_result as a SQLite blob: compressed JSON, or plain JSON when it is small."""
+    encoded = json.dumps(gemini_result, separators=(",", ":")).encode()
+    if len(encoded) < PROCESSED_RESULT_COMPRESS_MIN_BYTES:
+        return encoded
+    codec = zstd_codec()
+    if codec is not None:
+        return ZSTD_PREFIX + codec[0].compress(encoded)
+    return ZLIB_PREFIX + zlib.compress(encoded, 6)
+
+def load_result(stored) -> Any:
+    """The gemini_result object from any stored form (blob, JSONB text, or legacy text)."""
+    if isinstance(stored, (bytes, memoryview)):
+        stored = bytes(stored)
+        if stored.startswith(ZSTD_PREFIX):
+            codec = zstd_codec()
+            if codec is None:
+                raise RuntimeError("Reading zstd-compressed results needs zstandard: pip install zstandard")
+            stored = codec[1].decompress(stored[len(ZSTD_PREFIX):])
+        elif stored.startswith(ZLIB_PREFIX):
+            stored = zlib.decompress(stored[len(ZLIB_PREFIX):])
+        return json.loads(stored)
+    if isinstance(stored, str):
+        if stored.startswith("zlib:"):
+            # Written as base64 text before results were stored as blobs
+            stored = zlib.decompress(base64.b64decode(stored[len("zlib:"):])).decode()
+        return json.loads(stored)
+    return stored  # already decoded by the driver
+
+class ResultDocument(TypeDecorator):
+    """gemini_result column: JSONB on Postgres, a compressed JSON blob elsewhere."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect) -> Optional[Any]:
+        if value is None or dialect.name == "postgresql":
+            return value  # JSONB serializes it
+        return dump_result(value)
+
+    def process_result_value(self, value, dialect) -> Optional[Any]:
+        return None if value is None else load_result(value)
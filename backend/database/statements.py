@@ -0,0 +1,161 @@
+# backend/database/statements.py
+# Registry of hot statements, compiled to SQL once per dialect instead of on every call.
+#
+# `databases` compiles each Core construct it is handed (select, insert, ...) from scratch, which
+# costs more CPU than the query itself for single-row lookups. A registered statement is written
+# with bindparam() placeholders, compiled the first time it runs on a dialect, and afterwards
+# executed straight on the driver connection with bound parameters:
+#   - Postgres: asyncpg prepares the SQL server-side and keeps the prepared statement in its
+#     per-connection cache, so repeat executions also skip parsing and planning.
+#   - SQLite: sqlite3 reuses its cached prepared statement for the identical SQL text.
+#
+#   ACCOUNT_BY_GOOGLE_ID = register_statement(
+#       "accounts.by_google_account_id",
+#       select(accounts_table.c.id).where(accounts_table.c.google_account_id == bindparam("google_account_id"))
+#   )
+#   row = await ACCOUNT_BY_GOOGLE_ID.fetch_one(google_account_id=google_account_id)
+#
+# Statements run on the caller's task connection, so they take part in an open
+# database.transaction(). Expanding IN lists and Python-side column defaults aren't supported;
+# those statements stay on the plain `databases` API.
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import databases
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.postgresql import asyncpg
+from sqlalchemy.engine.interfaces import Dialect
+
+from utils.db_state import database
+
+logger = logging.getLogger(__name__)
+
+# Dialects matching the drivers `databases` runs on, by database.url.dialect
+DIALECTS: Dict[str, Callable[[], Dialect]] = {
+    "postgresql": asyncpg.dialect,
+    "sqlite": lambda: sqlite.dialect(paramstyle="qmark"),
+}
+
+REQUIRED = object()  # marks a bindparam without a default value
+
+class CompiledStatement(NamedTuple):
+    sql: str
+    # (bind name, default value, bind processor) per positional parameter
+    parameters: Tuple[Tuple[str, Any, Optional[Callable]], ...]
+    # (result key, result processor) per result column
+    columns: Tuple[Tuple[str, Optional[Callable]], ...]
+
+def compile_statement(statement, dialect: Dialect) -> CompiledStatement:
+    compiled = statement.compile(dialect=dialect)
+    if getattr(compiled, "insert_prefetch", None) or getattr(compiled, "update_prefetch", None):
+        raise ValueError("Statements with Python-side column defaults can't be precompiled")
+    processors = compiled._bind_processors
+    parameters = tuple(
+        (name, REQUIRED if compiled.binds[name].required else compiled.binds[name].effective_value, processors.get(name))
+        for name in compiled.positiontup or ()
+    )
+    columns = tuple(
+        (column.keyname, column.type._cached_result_processor(dialect, None))
+        for column in compiled._result_columns
+    )
+    return CompiledStatement(str(compiled), parameters, columns)
+
+class PreparedStatement:
+    """A Core statement with bindparam() placeholders, compiled once per dialect."""
+
+    def __init__(self, name: str, statement, connection: databases.Database = database):
+        self.name = name
+        self.statement = statement
+        self.database = connection
+        self._compiled: Dict[str, CompiledStatement] = {}
+        self.executions = 0
+
+    def compiled(self, dialect_name: Optional[str] = None) -> CompiledStatement:
+        dialect_name = dialect_name or self.database.url.dialect
+        compiled = self._compiled.get(dialect_name)
+        if compiled is None:
+            compiled = self._compiled[dialect_name] = compile_statement(self.statement, DIALECTS[dialect_name]())
+            logger.debug(f"Compiled statement {self.name} for {dialect_name}: {compiled.sql}")
+        return compiled
+
+    def _arguments(self, compiled: CompiledStatement, params: Dict[str, Any]) -> List[Any]:
+        arguments = []
+        for name, default, process in compiled.parameters:
+            value = params[name] if name in params else default
+            if value is REQUIRED:
+                raise KeyError(f"Statement {self.name} is missing parameter {name!r}")
+            arguments.append(process(value) if process and value is not None else value)
+        return arguments
+
+    def _row(self, compiled: CompiledStatement, values) -> Dict[str, Any]:
+        return {
+            key: process(value) if process else value
+            for (key, process), value in zip(compiled.columns, values)
+        }
+
+    async def _run(self, params: Dict[str, Any], fetch: Optional[str]):
+        compiled = self.compiled()
+        arguments = self._arguments(compiled, params)
+        self.executions += 1
+        async with self.database.connection() as connection:
+            raw = connection.raw_connection
+            if self.database.url.dialect == "postgresql":
+                if fetch == "all":
+                    return [self._row(compiled, record.values()) for record in await raw.fetch(compiled.sql, *arguments)]
+                if fetch == "one":
+                    record = await raw.fetchrow(compiled.sql, *arguments)
+                    return self._row(compiled, record.values()) if record is not None else None
+                # The first RETURNING value (inserts return the new primary key), like databases' execute
+                return await raw.fetchval(compiled.sql, *arguments)
+            cursor = await raw.execute(compiled.sql, arguments)
+            try:
+                if fetch == "all":
+                    return [self._row(compiled, values) for values in await cursor.fetchall()]
+                if fetch == "one":
+                    values = await cursor.fetchone()
+                    return self._row(compiled, values) if values is not None else None
+                return cursor.lastrowid
+            finally:
+                await cursor.close()
+
+    async def fetch_one(self, **params) -> Optional[Dict[str, Any]]:
+        return await self._run(params, "one")
+
+    async def fetch_all(self, **params) -> List[Dict[str, Any]]:
+        return await self._run(params, "all")
+
+    async def execute(self, **params) -> Any:
+        """Run a statement without reading rows; returns the new primary key for inserts."""
+        return await self._run(params, None)
+
+    async def execute_many(self, rows: List[Dict[str, Any]]) -> None:
+        """Run the statement once per parameter dict, all in one transaction (asyncpg pipelines them)."""
+        if not rows:
+            return
+        compiled = self.compiled()
+        arguments = [self._arguments(compiled, params) for params in rows]
+        self.executions += len(arguments)
+        async with self.database.transaction():
+            async with self.database.connection() as connection:
+                raw = connection.raw_connection
+                if self.database.url.dialect == "postgresql":
+                    await raw.executemany(compiled.sql, arguments)
+                else:
+                    cursor = await raw.executemany(compiled.sql, arguments)
+                    await cursor.close()
+
+STATEMENTS: Dict[str, PreparedStatement] = {}
+
+def register_statement(name: str, statement, connection: databases.Database = database) -> PreparedStatement:
+    """Register a hot statement under `name`; registering the same name again returns the existing one."""
+    prepared = STATEMENTS.get(name)
+    if prepared is None:
+        prepared = STATEMENTS[name] = PreparedStatement(name, statement, connection)
+    return prepared
+
+def statement_stats() -> Dict[str, Dict]:
+    """Executions and compiled dialects per registered statement."""
+    return {
+        name: {"executions": prepared.executions, "compiled_for": sorted(prepared._compiled)}
+        for name, prepared in sorted(STATEMENTS.items())
+    }
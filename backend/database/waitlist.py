@@ -4,6 +4,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     BigInteger,
+    Index,
     String,
     Table,
     func,
@@ -21,6 +22,8 @@ waitlist_table = Table(
     Column("comment", String, nullable=True),
     Column("referral_source", String, nullable=True),
     Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+    # Date-range counts in /waitlist/summary (listing and exports page by id)
+    Index("ix_waitlist_created_id", "created_at", "id"),
 )
 
 # Ensure database is accessible for other modules as needed
@@ -11,6 +11,7 @@ from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.responses import JSONResponse
 # from route.whisper_socket import whisper_tts
 from utils.server.middleware import setup_cors
+from utils.telemetry import setup_telemetry
 from utils.server.ngrok_command import router as ngrok_commands_router
 from utils.server.ngrok_utils import start_ngrok
 
@@ -37,8 +38,10 @@ app = FastAPI(
 # ------------------ Middleware Setup ------------------------------
 
 setup_cors(app)
+setup_telemetry(app)  # Stage/request latency histograms on /metrics, Server-Timing headers, optional OTLP export
 from database.database_events import register_db_events
-register_db_events(app)
+from database.lifecycle import db_lifecycle
+register_db_events(app)  # the only place the database connections are opened and closed (database/lifecycle.py)
 # ------------------ API Routes -------------------------------------
 
 ## EXTERNAL SERVICES (OLD TBD INTEGRATION)
@@ -103,8 +106,8 @@ app.include_router(analyze_truth_lie_v1_router)
 
 # from route.gemini.list_files import router as list_files_router
 # app.include_router(list_files_router, prefix="/api/v1", tags=["Files"])
-from route.gemini.unstable.api.routes import router as gemini_audio_router # preview has no auth no persistance
-app.include_router(gemini_audio_router, prefix="/production/v1")
+# The unstable gemini router is already mounted at /production/v1 above; including it twice registered every
+# route (and its startup/shutdown hooks) twice
  
 # TODO: one-liner & Day in the life Q's
 # -------------------------------------------------------------------------
@@ -121,6 +124,11 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/health/database")
+async def database_health():
+    """Connection pool usage for the primary database and read replica."""
+    return db_lifecycle.stats()
+
 # ------------------ OpenAPI & Swagger UI ---------------------------
 # Serve the OpenAPI schema separately
 from utils.server.docs import router as server_docs_router
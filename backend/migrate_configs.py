@@ -8,23 +8,14 @@ from pathlib import Path
 from typing import List, Optional, Dict
 from sqlalchemy import Table, Column, Integer, String, Text, MetaData, select
 from utils.db_state import database, metadata
+# prompt_schema is defined with the other shared tables; database.lifecycle imports them
+from database.core import prompt_schema_table
+from database.lifecycle import db_lifecycle
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Define the prompt_schema table
-prompt_schema_table = Table(
-    "prompt_schema",
-    metadata,
-    Column("id", Integer, primary_key=True, index=True),
-    Column("prompt_type", String, nullable=False, unique=True),
-    Column("prompt_text", Text, nullable=False),
-    Column("response_schema", Text, nullable=False),
-    Column("created_at", Integer, nullable=False),
-    Column("updated_at", Integer, nullable=False)
-)
-
 class PromptSchemaManager:
     """Manager class for CRUD operations on prompt schemas."""
     
@@ -161,9 +152,8 @@ async def migrate_configs():
         
         logger.info(f"Found config directory at: {directory}")
 
-        if not database.is_connected:
-            await database.connect()
-            logger.info("Connected to database")
+        # Reuses the app's connection when one is already open
+        await db_lifecycle.connect()
 
         # Create tables using async connection
         query = """
@@ -224,13 +214,11 @@ async def migrate_configs():
         logger.error(f"Migration failed: {e}")
         raise
     finally:
-        if database.is_connected:
-            await database.disconnect()
-            logger.info("Disconnected from database")
+        await db_lifecycle.disconnect()
 
 # Example usage
 async def main():
-    await database.connect()
+    await db_lifecycle.connect()
     try:
         # Create a new prompt schema
         new_schema = await PromptSchemaManager.create_prompt_schema(
@@ -256,7 +244,7 @@ async def main():
         print("Deleted:", deleted)
         
     finally:
-        await database.disconnect()
+        await db_lifecycle.disconnect()
 
 if __name__ == "__main__":
     print("Starting migration...")
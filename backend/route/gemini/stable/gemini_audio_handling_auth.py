@@ -10,6 +10,7 @@
 # - Prompt Constraints: While there's no explicit limit on the number of audio files in a single prompt, the combined length of all audio files in a prompt must not exceed 9.5 hours.
 import os
 import asyncio
+import hashlib
 import json
 from datetime import datetime
 from typing import List, Optional, Tuple, Union
@@ -24,7 +25,9 @@ import traceback
 
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from .gemini_process_webhook import process_with_gemini_webhook  # Ensure this module exists and is correctly implemented
+from .gemini_process_webhook import process_with_gemini_webhook, PROMPTS_SCHEMAS  # Ensure this module exists and is correctly implemented
+from route.gemini.unstable.services.result_cache_service import ResultCacheService
+from route.gemini.unstable.services.file_registry_service import FileRegistryService, parse_expiration
 
 # Configure logging for this module
 logger = logging.getLogger(__name__)
@@ -40,11 +43,9 @@ logging.basicConfig(
 load_dotenv()
 
 # Import the database module and tables
-from database.core import (
-    database,
-    device_registration_table,
-    processed_audio_files_table
-)
+from database.core import database
+from database.devices import identity_query
+from database.processed_results import processed_results_writer, result_row
 
 # Initialize FastAPI router
 router = APIRouter()
@@ -58,6 +59,20 @@ if not google_api_key:
 
 genai.configure(api_key=google_api_key)
 
+# Shared with the unstable routes: same table, same key scheme
+result_cache = ResultCacheService()
+file_registry = FileRegistryService()
+WEBHOOK_MODEL_NAME = "gemini-1.5-flash"  # process_with_gemini_webhook default
+
+def prompt_config_version(prompt_type: str) -> Optional[str]:
+    """Fingerprint of the on-disk prompt/schema config, so edited prompts never hit stale results."""
+    config = PROMPTS_SCHEMAS.get(prompt_type)
+    if not config:
+        return None
+    # response_schema is a proto Schema; hash its JSON form instead
+    material = {"prompt_text": config["prompt_text"], "response_schema": config["response_schema_dict"]}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def upload_to_gemini(file_content: bytes, mime_type: Optional[str] = None) -> object:
     """
@@ -89,8 +104,27 @@ async def process_single_file(file: UploadFile) -> object:
         content = await file.read()
         logger.debug(f"Read {len(content)} bytes from {file.filename}")
 
+        # Same recording uploaded in the last 48h (e.g. re-analysis under another prompt_type): reuse it
+        content_hash = ResultCacheService.hash_content(content)
+        handle = await file_registry.lookup(content_hash)
+        if handle:
+            try:
+                uploaded_file = await asyncio.to_thread(genai.get_file, handle["name"])
+                logger.debug(f"Reusing Gemini file {uploaded_file.uri} for {file.filename}")
+                return uploaded_file
+            except Exception as e:
+                logger.warning(f"Registered Gemini file {handle['name']} is unavailable, re-uploading: {e}")
+
         # Directly call upload_to_gemini without run_in_executor
         uploaded_file = upload_to_gemini(content, file.content_type)
+        await file_registry.register(
+            content_hash,
+            file_name=uploaded_file.name,
+            file_uri=uploaded_file.uri,
+            mime_type=uploaded_file.mime_type or file.content_type,
+            size_bytes=len(content),
+            expires_at=parse_expiration(uploaded_file.expiration_time)
+        )
 
         logger.debug(f"Uploaded file to Gemini: {uploaded_file.uri}")
         return uploaded_file
@@ -125,33 +159,24 @@ def process_individual_file(filename: str, uploaded_file: object, prompt_type: s
 
 async def store_processed_file(user_id: int, file_name: str, file_uri: str, gemini_result: object):
     """
-    Stores the processed file information in the database.
+    Queues the processed file information for the database (database/processed_results.py
+    writes it in the background).
     """
-    try:
-        query = processed_audio_files_table.insert().values(
-            user_id=user_id,
-            file_name=file_name,
-            file_uri=file_uri,  # Store the upload URL here -> TODO: we also need to return this with the post request reepsonse
-            #^ where does the file uri come from and how do we share it in the results?
-            gemini_result=json.dumps(gemini_result),
-            uploaded_at=datetime.utcnow(),
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
-        )
-        await database.execute(query)
-        logger.info(f"Stored processed file {file_name} with URI {file_uri} for user ID {user_id}.")
-    except Exception as e:
-        logger.error(f"Error storing processed file {file_name}: {e}")
-        traceback.print_exc()
-        # Optionally, handle the exception as needed
+    # file_uri is the upload URL -> TODO: we also need to return this with the post request reepsonse
+    #^ where does the file uri come from and how do we share it in the results?
+    await store_processed_files(user_id, [file_name], [file_uri], gemini_result)
 
 async def store_processed_files(user_id: int, file_names: List[str], file_uris: List[str], gemini_result: object):
     """
-    Stores the processed files information in the database for batch processing.
+    Stores the processed files information in the database for batch processing: one enqueue,
+    written as a single batch off the response path.
     """
     try:
-        for file_name, file_uri in zip(file_names, file_uris):
-            await store_processed_file(user_id, file_name, file_uri, gemini_result)
+        await processed_results_writer.submit([
+            result_row(user_id, file_name, file_uri, gemini_result)
+            for file_name, file_uri in zip(file_names, file_uris)
+        ])
+        logger.info(f"Queued {len(file_names)} processed files for user ID {user_id}.")
     except Exception as e:
         logger.error(f"Error storing processed files: {e}")
         traceback.print_exc()
@@ -163,10 +188,12 @@ async def process_audio(
     prompt_type: str = Query("default", description="Type of prompt and schema to use"),
     batch: bool = Query(False, description="Process files in batch if True"),
     google_account_id: Optional[str] = Query(None, description="Google Account ID for user identification"),
-    device_uuid: Optional[str] = Query(None, description="Device UUID for user identification")
+    device_uuid: Optional[str] = Query(None, description="Device UUID for user identification"),
+    use_cache: bool = Query(True, description="Return cached results for identical audio and prompt")
 ):
     """
     Process multiple audio files concurrently with improved error handling.
+    Identical submissions are answered from the result cache without uploading to Gemini.
     """
     supported_mime_types = {
         "audio/wav", "audio/mp3", "audio/aiff",
@@ -192,16 +219,7 @@ async def process_audio(
         raise HTTPException(status_code=400, detail="User identification required.")
 
     # Build the query based on provided identifiers
-    query = device_registration_table.select()
-    if google_account_id and device_uuid:
-        query = query.where(
-            (device_registration_table.c.google_account_id == google_account_id) &
-            (device_registration_table.c.device_uuid == device_uuid)
-        )
-    elif google_account_id:
-        query = query.where(device_registration_table.c.google_account_id == google_account_id)
-    elif device_uuid:
-        query = query.where(device_registration_table.c.device_uuid == device_uuid)
+    query = identity_query(google_account_id, device_uuid)
 
     # Execute the query
     user_entry = await database.fetch_one(query)
@@ -212,6 +230,47 @@ async def process_audio(
     user_id = user_entry['id']
     logger.info(f"Processing audio files for user ID {user_id}.")
 
+    # Look up cached results before anything is uploaded to Gemini
+    cached_results = []
+    file_cache_keys: List[Optional[str]] = [None] * len(files)
+    prompt_version = prompt_config_version(prompt_type) if use_cache else None
+    if prompt_version:
+        content_hashes = [await ResultCacheService.hash_file(file.file) for file in files]
+        if batch:
+            batch_key = ResultCacheService.build_key(
+                content_hashes, prompt_type, prompt_version, WEBHOOK_MODEL_NAME, {"batch": True}
+            )
+            cached = await result_cache.get(batch_key)
+            if cached is not None:
+                # Only results covering every file of the batch are cached (see the set below)
+                return JSONResponse(content={"results": [{
+                    "files": [file.filename for file in files],
+                    "status": "processed",
+                    "data": cached,
+                    "cache": "hit"
+                }]})
+        else:
+            pending_files = []
+            for file, content_hash in zip(files, content_hashes):
+                cache_key = ResultCacheService.build_key(
+                    content_hash, prompt_type, prompt_version, WEBHOOK_MODEL_NAME, {"batch": False}
+                )
+                cached = await result_cache.get(cache_key)
+                if cached is not None:
+                    cached_results.append({
+                        "file": file.filename,
+                        "status": "processed",
+                        "data": cached,
+                        "cache": "hit"
+                    })
+                else:
+                    pending_files.append((file, cache_key))
+            if not pending_files:
+                return JSONResponse(content={"results": cached_results})
+            files = [file for file, _ in pending_files]
+            file_cache_keys = [cache_key for _, cache_key in pending_files]
+    cache_status = "miss" if prompt_version else "bypass"
+
     try:
         # Process files concurrently for uploading
         processing_tasks = [process_single_file(file) for file in files]
@@ -220,9 +279,10 @@ async def process_audio(
         # Check for any exceptions in uploaded_files
         errors = []
         valid_uploaded_files = []
+        valid_cache_keys = []
         file_uris = []  # To store the file URIs for batch processing
 
-        for file, uploaded_file in zip(files, uploaded_files):
+        for file, uploaded_file, cache_key in zip(files, uploaded_files, file_cache_keys):
             if isinstance(uploaded_file, Exception):
                 logger.error(f"Error processing file {file.filename}: {uploaded_file}")
                 errors.append({
@@ -232,13 +292,14 @@ async def process_audio(
                 })
             else:
                 valid_uploaded_files.append((file.filename, uploaded_file))
+                valid_cache_keys.append(cache_key)
                 file_uris.append(uploaded_file.uri)  # Capture the URI
 
         if not valid_uploaded_files:
             logger.warning("All file uploads failed.")
-            return JSONResponse(content={"results": errors})
+            return JSONResponse(content={"results": cached_results + errors})
 
-        results = errors.copy()
+        results = cached_results + errors
 
         if batch:
             # Process with Gemini webhook with batch=True
@@ -256,9 +317,12 @@ async def process_audio(
                     "files": [filename for filename, _ in valid_uploaded_files],
                     "status": "processed",
                     "data": gemini_result,
-                    "file_uri": uploaded_file.uri  # Include the URI in the response
-
+                    "file_uri": uploaded_file.uri,  # Include the URI in the response
+                    "cache": cache_status
                 })
+                # batch_key covers every uploaded file, so a result missing the failed ones isn't cached
+                if prompt_version and not errors:
+                    await result_cache.set(batch_key, prompt_type, WEBHOOK_MODEL_NAME, gemini_result)
                 logger.debug("Batch processing with Gemini webhook successful.")
                 # Store the result in the database with file URIs
                 await store_processed_files(user_id, [filename for filename, _ in valid_uploaded_files], file_uris, gemini_result)
@@ -279,7 +343,8 @@ async def process_audio(
 
             individual_results = await asyncio.gather(*processing_tasks, return_exceptions=True)
 
-            for original_file, result in zip(valid_uploaded_files, individual_results):
+            processed_rows = []
+            for original_file, result, cache_key in zip(valid_uploaded_files, individual_results, valid_cache_keys):
                 filename, uploaded_file = original_file
                 if isinstance(result, Exception):
                     logger.error(f"Error in Gemini processing for file {filename}: {result}")
@@ -296,10 +361,13 @@ async def process_audio(
                         "file": fname,
                         "status": "processed",
                         "data": gemini_result,
-                        "file_uris": file_uris  # Add URIs for all processed files
+                        "file_uris": file_uris,  # Add URIs for all processed files
+                        "cache": cache_status
                     })
-                    # Store the result in the database with file URI
-                    await store_processed_file(user_id, fname, uploaded_file.uri, gemini_result)
+                    if cache_key:
+                        await result_cache.set(cache_key, prompt_type, WEBHOOK_MODEL_NAME, gemini_result)
+                    # Store the result in the database with file URI (queued together after the loop)
+                    processed_rows.append(result_row(user_id, fname, uploaded_file.uri, gemini_result))
                 else:
                     logger.error(f"Unexpected result type for file {filename}: {result}")
                     results.append({
@@ -307,6 +375,11 @@ async def process_audio(
                         "status": "failed",
                         "error": "Unexpected processing result."
                     })
+            if processed_rows:
+                try:
+                    await processed_results_writer.submit(processed_rows)
+                except Exception as e:
+                    logger.error(f"Error storing processed files: {e}")
 
         return JSONResponse(content={"results": results})
 
@@ -323,10 +396,7 @@ async def process_audio(
 async def test_user(google_account_id: str, device_uuid: str):
     logger.debug(f"Testing user lookup for google_account_id: {google_account_id} and device_uuid: {device_uuid}")
 
-    query = device_registration_table.select().where(
-        (device_registration_table.c.google_account_id == google_account_id) &
-        (device_registration_table.c.device_uuid == device_uuid)
-    )
+    query = identity_query(google_account_id, device_uuid)
     user_entry = await database.fetch_one(query)
 
     if user_entry:
@@ -7,7 +7,8 @@ import os
 from fastapi import HTTPException
 import google.generativeai as genai
 from google.ai.generativelanguage_v1beta.types import content
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
+from route.gemini.unstable.services.model_backend import ModelBackend, get_backend
 
 
 # Configure logging
@@ -39,7 +40,9 @@ def load_configurations(configs_dir: str = CONFIGS_DIR) -> Dict[str, Dict]:
                     response_schema = dict_to_schema(config.get('response_schema', {}))
                     configurations[prompt_type] = {
                         "prompt_text": config.get("prompt_text", ""),
-                        "response_schema": response_schema
+                        "response_schema": response_schema,
+                        # JSON form of the schema, for cache keys and the fake backend
+                        "response_schema_dict": config.get("response_schema", {})
                     }
                 logger.info(f"Loaded configuration '{prompt_type}' from '{filename}'.")
             except Exception as e:
@@ -92,6 +95,8 @@ def dict_to_schema(schema_dict: Dict) -> content.Schema:
 
 # Load all configurations at module import
 PROMPTS_SCHEMAS = load_configurations()
+# Selected by GEMINI_BACKEND ("genai" or "fake")
+model_backend = get_backend()
 
 def process_with_gemini_webhook(
     uploaded_files: Union[List[object], object],
@@ -101,7 +106,8 @@ def process_with_gemini_webhook(
     temperature: float = 1.0,
     top_p: float = 0.95,
     top_k: int = 40,
-    max_output_tokens: int = 8192
+    max_output_tokens: int = 8192,
+    backend: Optional[ModelBackend] = None
 ) -> Dict:
     """
     Internal webhook to process audio file(s) using Gemini's generative capabilities.
@@ -115,6 +121,7 @@ def process_with_gemini_webhook(
         top_p (float): The top-p parameter for generation.
         top_k (int): The top-k parameter for generation.
         max_output_tokens (int): The maximum number of output tokens.
+        backend (ModelBackend): Overrides the module-level backend (tests, benchmarks).
 
     Returns:
         dict: Parsed JSON response from Gemini.
@@ -138,8 +145,7 @@ def process_with_gemini_webhook(
             "response_mime_type": "application/json",
         }
 
-        model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
-        logger.info(f"Initialized Gemini GenerativeModel with prompt_type '{prompt_type}' and batch={batch}")
+        logger.info(f"Processing with prompt_type '{prompt_type}' and batch={batch}")
 
         if batch:
             # Create chat history with all uploaded files and prompt for batch processing
@@ -150,15 +156,18 @@ def process_with_gemini_webhook(
             chat_history = [{"role": "user", "parts": [uploaded_files, prompt_text]}]
             logger.debug(f"Individual prompt constructed for file '{uploaded_files.display_name}': {prompt_text}")
 
-        chat_session = model.start_chat(history=chat_history)
-        logger.info("Chat session started with Gemini.")
-
-        # Send a message to the model
-        response = chat_session.send_message("Process the audio and think deeply")
-        logger.debug(f"Received response from Gemini: {response.text}")
+        # Same request a chat session would send: the history plus the follow-up message
+        contents = chat_history + [{"role": "user", "parts": ["Process the audio and think deeply"]}]
+        response_text = (backend or model_backend).generate_content(
+            model_name,
+            contents,
+            generation_config,
+            response_schema=config["response_schema_dict"]
+        )
+        logger.debug(f"Received response from Gemini: {response_text}")
 
         # Extract JSON from the response
-        parsed_result = extract_json_from_response(response.text)
+        parsed_result = extract_json_from_response(response_text)
         logger.info("Successfully extracted JSON from Gemini response.")
 
         return parsed_result
@@ -1,16 +1,24 @@
 # api/routes.py
-from fastapi import APIRouter, File, UploadFile, Query, HTTPException, Depends, Body, Path, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, UploadFile, Query, HTTPException, Depends, Body, Path, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Optional, Dict, Union
 import asyncio
 import logging
 import json
 import os
+import time
 from ..services.auth_service import AuthService
 from ..services.audio_service import AudioService
 from ..services.gemini_service import GeminiService
 from ..services.storage_service import StorageService
+from ..services.result_cache_service import ResultCacheService
+from ..services.file_registry_service import FileRegistryService
+from ..services.job_service import JobQueue, JobWorker, job_status, validate_webhook_url, TERMINAL_STATUSES
 from ..configs.schemas import SchemaManager
+from ..utils.request_utils import cancel_on_disconnect
+from utils.telemetry import span
+from database.processed_results import processed_results_writer
+from database.statements import statement_stats
 from pydantic import BaseModel, ConfigDict, ValidationError
 
 logger = logging.getLogger(__name__)
@@ -18,6 +26,19 @@ logger = logging.getLogger(__name__)
 # Constants
 ALLOWED_AUDIO_EXTENSIONS = ('.wav', '.mp3', '.aiff', '.aac', '.ogg', '.flac')
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+MAX_CONCURRENT_FILES = int(os.getenv("PROCESS_AUDIO_CONCURRENCY", "4"))  # files analyzed in parallel per request
+JOB_EVENTS_POLL_INTERVAL = 1.0  # seconds between status checks on /jobs/{id}/events
+JOB_EVENTS_KEEPALIVE = 15  # seconds between SSE comments, keeps proxies from closing idle streams
+# Uploads above this size go through the Files API instead of inline request data
+INLINE_AUDIO_LIMIT = int(os.getenv("GEMINI_INLINE_AUDIO_LIMIT", str(4 * 1024 * 1024)))
+MIME_TYPES_BY_EXTENSION = {
+    '.wav': 'audio/wav',
+    '.mp3': 'audio/mp3',
+    '.aiff': 'audio/aiff',
+    '.aac': 'audio/aac',
+    '.ogg': 'audio/ogg',
+    '.flac': 'audio/flac',
+}
 
 # Initialize services
 try:
@@ -26,6 +47,10 @@ try:
     audio_service = AudioService()
     gemini_service = GeminiService(schema_manager)
     storage_service = StorageService()
+    result_cache = ResultCacheService()
+    file_registry = FileRegistryService(audio_service)
+    job_queue = JobQueue()
+    job_worker = JobWorker(job_queue)
 except Exception as e:
     logger.error(f"Failed to initialize services: {e}")
     raise
@@ -51,6 +76,7 @@ class AudioProcessingRequest(BaseModel):
     top_p: float = 0.95
     top_k: int = 40
     max_output_tokens: int = 8192
+    use_cache: bool = True  # False forces a fresh Gemini call
 
     @classmethod
     async def from_form(cls, form_data: str):
@@ -69,115 +95,212 @@ class AudioProcessingRequest(BaseModel):
                 detail=f"Invalid audio processing request: {str(e)}"
             )
 
+class MultiPromptRequest(AudioProcessingRequest):
+    prompt_types: List[str]
+    merge_schemas: bool = False  # answer object-schema prompts with one combined call
+
+@router.on_event("startup")
+async def start_job_worker():
+    job_worker.start()
+
+@router.on_event("shutdown")
+async def shutdown_services():
+    await job_worker.stop()
+    gemini_service.shutdown()
+
+def upload_size(file: UploadFile) -> int:
+    """Size of an upload, read from its spool file without loading the contents."""
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+def audio_mime_type(file: UploadFile) -> str:
+    """MIME type to send to Gemini, trusting the extension over generic client content types."""
+    extension = os.path.splitext(file.filename.lower())[1]
+    return MIME_TYPES_BY_EXTENSION.get(extension) or file.content_type or "audio/ogg"
+
+def generation_params_for(request: AudioProcessingRequest, prompt_type: str, mime_type: str) -> Dict:
+    """Gemini call parameters for one prompt; also part of the result cache key."""
+    return {
+        "prompt_type": prompt_type,
+        "model_name": request.model_name,
+        "temperature": request.temperature,
+        "top_p": request.top_p,
+        "top_k": request.top_k,
+        "max_output_tokens": request.max_output_tokens,
+        "mime_type": mime_type,
+    }
+
+async def process_uploaded_file(file: UploadFile, request: AudioProcessingRequest) -> Dict:
+    """Validate, read and analyze a single uploaded file, reporting failures in the result."""
+    try:
+        if isinstance(file, str):
+            # Handle file URI
+            return await process_audio_uri(
+                file, 
+                request.prompt_type,
+                request.model_name,
+                request.temperature,
+                request.top_p,
+                request.top_k,
+                request.max_output_tokens
+            )
+
+        # Validate file type
+        if not file.filename.lower().endswith(ALLOWED_AUDIO_EXTENSIONS):
+            return {
+                "status": "failed",
+                "filename": file.filename,
+                "error": f"Invalid file type. Allowed types: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}"
+            }
+
+        # Measure the spooled upload instead of copying it into memory
+        try:
+            file_size = upload_size(file)
+            if file_size > MAX_FILE_SIZE:
+                return {
+                    "status": "failed",
+                    "filename": file.filename,
+                    "error": f"File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB"
+                }
+
+            mime_type = audio_mime_type(file)
+            generation_params = generation_params_for(request, request.prompt_type, mime_type)
+
+            # The content hash keys both the result cache and the Gemini file registry
+            content_hash = await ResultCacheService.hash_file(file.file)
+
+            # Identical audio + prompt version + params: answer from the result cache
+            cache_key = None
+            if request.use_cache:
+                prompt_version = await schema_manager.get_prompt_version(request.prompt_type)
+                cache_key = ResultCacheService.build_key(
+                    content_hash, request.prompt_type, prompt_version, request.model_name, generation_params
+                )
+                cached = await result_cache.get(cache_key)
+                if cached is not None:
+                    return {
+                        "status": "success",
+                        "filename": file.filename,
+                        "result": cached,
+                        "cache": "hit"
+                    }
+
+            file_uri = None
+            if file_size <= INLINE_AUDIO_LIMIT:
+                # Small clips: one read, sent inline with the prompt
+                await file.seek(0)
+                with span("upload.read"):
+                    content = await file.read()
+                result = await gemini_service.process_audio_content(
+                    content=content,
+                    **generation_params
+                )
+            else:
+                # Large recordings: reuse a live Files API copy, or stream one up in fixed-size chunks
+                uploaded = await file_registry.get_or_upload(
+                    file.file, file_size, mime_type, display_name=file.filename, content_hash=content_hash
+                )
+                file_uri = uploaded["uri"]
+                result = await gemini_service.process_audio_uri(
+                    file_uri=file_uri,
+                    **generation_params
+                )
+            if cache_key:
+                await result_cache.set(cache_key, request.prompt_type, request.model_name, result)
+            processed = {
+                "status": "success",
+                "filename": file.filename,
+                "result": result,
+                "cache": "miss" if cache_key else "bypass"
+            }
+            if file_uri:
+                # Lets clients re-analyze under another prompt via /process-audio-uri without re-uploading.
+                # Inline clips are never registered, so their hash wouldn't resolve there.
+                processed["file_uri"] = file_uri
+                processed["content_hash"] = content_hash
+            return processed
+
+        finally:
+            # Ensure proper cleanup
+            try:
+                await file.close()
+            except Exception as e:
+                logger.warning(f"Error closing file {file.filename}: {e}")
+            
+            if hasattr(file, 'file'):
+                try:
+                    file.file.close()
+                except Exception as e:
+                    logger.warning(f"Error closing file handle for {file.filename}: {e}")
+
+    except HTTPException as e:
+        logger.error(f"Error processing file {file.filename}: {e.detail}")
+        return {
+            "status": "failed",
+            "filename": file.filename,
+            "error": e.detail
+        }
+    except Exception as e:
+        logger.error(f"Error processing file {file.filename}: {e}", exc_info=True)
+        return {
+            "status": "failed",
+            "filename": file.filename,
+            "error": str(e)
+        }
+
+def fan_out_files(files: List[UploadFile], request: AudioProcessingRequest) -> List["asyncio.Task[Dict]"]:
+    """
+    Start one task per file, with at most MAX_CONCURRENT_FILES analyses in flight.
+    Tasks are returned in input order; each resolves to that file's result dict.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+
+    async def bounded(index: int, file: UploadFile) -> Dict:
+        async with semaphore:
+            result = await process_uploaded_file(file, request)
+        return {"index": index, **result}
+
+    return [asyncio.create_task(bounded(index, file)) for index, file in enumerate(files)]
+
+async def prepare_audio_request(
+    audio_processing_request: str,
+    google_account_id: Optional[str],
+    device_uuid: Optional[str]
+) -> AudioProcessingRequest:
+    """Parse the form payload, verify the caller and validate the prompt type."""
+    request = await AudioProcessingRequest.from_form(audio_processing_request)
+    
+    # Verify user if credentials provided
+    await auth_service.verify_user(google_account_id, device_uuid)
+    
+    # Get prompt configuration (will raise 400 if invalid)
+    with span("prompt.lookup"):
+        await schema_manager.get_prompt_text(request.prompt_type)
+    return request
+
 @router.post("/process-audio")
 async def process_audio(
+    request_info: Request,
     files: List[UploadFile] = File(...),
     audio_processing_request: str = Form(...),
     google_account_id: Optional[str] = Form(None),
     device_uuid: Optional[str] = Form(None)
 ):
-    """Process audio files using Gemini API."""
-    processed_files = []
-    
+    """Process audio files using Gemini API, analyzing up to MAX_CONCURRENT_FILES files at once."""
     try:
-        # Parse audio processing request
-        request = await AudioProcessingRequest.from_form(audio_processing_request)
-        
-        # Verify user if credentials provided
-        user_id = await auth_service.verify_user(google_account_id, device_uuid)
-        
-        # Get prompt configuration (will raise 400 if invalid)
-        await schema_manager.get_prompt_text(request.prompt_type)
-        
-        for file in files:
-            try:
-                if isinstance(file, str):
-                    # Handle file URI
-                    result = await process_audio_uri(
-                        file, 
-                        request.prompt_type,
-                        request.model_name,
-                        request.temperature,
-                        request.top_p,
-                        request.top_k,
-                        request.max_output_tokens
-                    )
-                    processed_files.append(result)
-                    continue
+        request = await prepare_audio_request(audio_processing_request, google_account_id, device_uuid)
 
-                # Validate file type
-                if not file.filename.lower().endswith(ALLOWED_AUDIO_EXTENSIONS):
-                    processed_files.append({
-                        "status": "failed",
-                        "filename": file.filename,
-                        "error": f"Invalid file type. Allowed types: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}"
-                    })
-                    continue
-
-                # Read and process file
-                try:
-                    contents = bytearray()
-                    file_size = 0
-                    chunk_size = 8192
-
-                    # Read file in chunks
-                    while True:
-                        try:
-                            chunk = await file.read(chunk_size)
-                            if not chunk:
-                                break
-                            
-                            contents.extend(chunk)
-                            file_size += len(chunk)
-                            
-                            if file_size > MAX_FILE_SIZE:
-                                processed_files.append({
-                                    "status": "failed",
-                                    "filename": file.filename,
-                                    "error": f"File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB"
-                                })
-                                break
-                        except Exception as e:
-                            logger.error(f"Error reading chunk from {file.filename}: {e}")
-                            raise
-
-                    if file_size <= MAX_FILE_SIZE:
-                        # Process with Gemini
-                        result = await gemini_service.process_audio_content(
-                            content=bytes(contents),
-                            prompt_type=request.prompt_type,
-                            model_name=request.model_name,
-                            temperature=request.temperature,
-                            top_p=request.top_p,
-                            top_k=request.top_k,
-                            max_output_tokens=request.max_output_tokens
-                        )
-                        processed_files.append({
-                            "status": "success",
-                            "filename": file.filename,
-                            "result": result
-                        })
-
-                finally:
-                    # Ensure proper cleanup
-                    try:
-                        await file.close()
-                    except Exception as e:
-                        logger.warning(f"Error closing file {file.filename}: {e}")
-                    
-                    if hasattr(file, 'file'):
-                        try:
-                            file.file.close()
-                        except Exception as e:
-                            logger.warning(f"Error closing file handle for {file.filename}: {e}")
-
-            except Exception as e:
-                logger.error(f"Error processing file {file.filename}: {e}", exc_info=True)
-                processed_files.append({
-                    "status": "failed",
-                    "filename": file.filename,
-                    "error": str(e)
-                })
+        # Results keep the upload order; the whole batch is abandoned if the client goes away
+        tasks = fan_out_files(files, request)
+        results = await cancel_on_disconnect(request_info, asyncio.gather(*tasks))
+        processed_files = [
+            {key: value for key, value in result.items() if key != "index"}
+            for result in results
+        ]
 
         return JSONResponse(content={"results": processed_files})
 
@@ -190,14 +313,258 @@ async def process_audio(
             detail=f"Internal server error: {str(e)}"
         )
 
+@router.post("/process-audio/stream")
+async def process_audio_stream(
+    files: List[UploadFile] = File(...),
+    audio_processing_request: str = Form(...),
+    google_account_id: Optional[str] = Form(None),
+    device_uuid: Optional[str] = Form(None)
+):
+    """
+    Streaming variant of /process-audio.
+    Emits one NDJSON line per file as soon as it completes; `index` is the file's upload position.
+    """
+    request = await prepare_audio_request(audio_processing_request, google_account_id, device_uuid)
+
+    async def result_lines():
+        # Started here, not before returning: a client that leaves before the body starts never
+        # runs this generator, so tasks created outside it would never be cancelled
+        tasks = fan_out_files(files, request)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client disconnected mid-stream: stop the remaining analyses
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+@router.post("/process-audio/multi")
+async def process_audio_multi(
+    request_info: Request,
+    file: UploadFile = File(...),
+    audio_processing_request: str = Form(...),
+    google_account_id: Optional[str] = Form(None),
+    device_uuid: Optional[str] = Form(None)
+):
+    """
+    Analyze one recording under several prompt types in a single request.
+    The audio is read (or staged in the Files API) once and all prompts run concurrently against it.
+    """
+    started = time.perf_counter()
+    request = await MultiPromptRequest.from_form(audio_processing_request)
+    prompt_types = list(dict.fromkeys(request.prompt_types))
+    if not prompt_types:
+        raise HTTPException(status_code=400, detail="prompt_types must list at least one prompt type")
+
+    await auth_service.verify_user(google_account_id, device_uuid)
+    for prompt_type in prompt_types:
+        # Raises 400 on the first unknown prompt type
+        await schema_manager.get_prompt_text(prompt_type)
+
+    if not file.filename.lower().endswith(ALLOWED_AUDIO_EXTENSIONS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}"
+        )
+    file_size = upload_size(file)
+    if file_size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB")
+
+    mime_type = audio_mime_type(file)
+    content_hash = await ResultCacheService.hash_file(file.file)
+    results: Dict[str, Dict] = {}
+    cache_keys: Dict[str, str] = {}
+    if request.use_cache:
+        for prompt_type in prompt_types:
+            prompt_version = await schema_manager.get_prompt_version(prompt_type)
+            cache_keys[prompt_type] = ResultCacheService.build_key(
+                content_hash, prompt_type, prompt_version, request.model_name,
+                generation_params_for(request, prompt_type, mime_type)
+            )
+            cached = await result_cache.get(cache_keys[prompt_type])
+            if cached is not None:
+                results[prompt_type] = {
+                    "status": "success", "result": cached, "elapsed_ms": 0.0, "merged": False, "cache": "hit"
+                }
+
+    pending = [prompt_type for prompt_type in prompt_types if prompt_type not in results]
+    file_uri = None
+    if pending:
+        # One read or one upload, shared by every prompt
+        if file_size <= INLINE_AUDIO_LIMIT:
+            await file.seek(0)
+            with span("upload.read"):
+                content = await file.read()
+            audio_part = gemini_service.inline_audio_part(content, mime_type)
+        else:
+            uploaded = await file_registry.get_or_upload(
+                file.file, file_size, mime_type, display_name=file.filename, content_hash=content_hash
+            )
+            file_uri = uploaded["uri"]
+            audio_part = gemini_service.file_audio_part(file_uri, uploaded["mime_type"])
+
+        outcomes = await cancel_on_disconnect(request_info, gemini_service.process_audio_prompts(
+            audio_part,
+            pending,
+            model_name=request.model_name,
+            temperature=request.temperature,
+            top_p=request.top_p,
+            top_k=request.top_k,
+            max_output_tokens=request.max_output_tokens,
+            merge_schemas=request.merge_schemas
+        ))
+        for prompt_type, outcome in outcomes.items():
+            cache_key = cache_keys.get(prompt_type)
+            # Answers from a combined call are not cached under the single-prompt key
+            if cache_key and outcome["status"] == "success" and not outcome["merged"]:
+                await result_cache.set(cache_key, prompt_type, request.model_name, outcome["result"])
+            results[prompt_type] = {**outcome, "cache": "miss" if cache_key else "bypass"}
+
+    response = {
+        "filename": file.filename,
+        "results": {prompt_type: results[prompt_type] for prompt_type in prompt_types},
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+    if file_uri:
+        response["file_uri"] = file_uri
+        response["content_hash"] = content_hash
+    return JSONResponse(content=response)
+
+async def run_audio_job(payload: Dict) -> Dict:
+    """Job handler: analyze files that were staged in the Gemini Files API at submit time."""
+    request = AudioProcessingRequest(**payload["request"])
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+    errors = []
+
+    async def analyze(entry: Dict) -> Dict:
+        async with semaphore:
+            try:
+                result = await gemini_service.process_audio_uri(
+                    file_uri=entry["uri"],
+                    prompt_type=request.prompt_type,
+                    model_name=request.model_name,
+                    temperature=request.temperature,
+                    top_p=request.top_p,
+                    top_k=request.top_k,
+                    max_output_tokens=request.max_output_tokens,
+                    mime_type=entry["mime_type"]
+                )
+                return {"status": "success", "filename": entry["filename"], "result": result}
+            except Exception as e:
+                errors.append(e)
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                return {"status": "failed", "filename": entry["filename"], "error": detail}
+
+    results = await asyncio.gather(*(analyze(entry) for entry in payload["files"]))
+    if errors and len(errors) == len(results):
+        # Nothing succeeded: fail the attempt so the queue can retry it
+        raise errors[0]
+    return {"results": results}
+
+job_worker.register("process_audio", run_audio_job)
+
+@router.post("/jobs/process-audio", status_code=202)
+async def submit_audio_job(
+    request_info: Request,
+    files: List[UploadFile] = File(...),
+    audio_processing_request: str = Form(...),
+    google_account_id: Optional[str] = Form(None),
+    device_uuid: Optional[str] = Form(None),
+    webhook_url: Optional[str] = Form(None)
+):
+    """
+    Queue audio files for analysis and return immediately with a job id.
+    Poll /jobs/{job_id}, stream /jobs/{job_id}/events, or pass `webhook_url` to be called on completion.
+    """
+    request = await prepare_audio_request(audio_processing_request, google_account_id, device_uuid)
+    if webhook_url:
+        try:
+            await validate_webhook_url(webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Stage the audio in the Files API so any worker can pick the job up
+    staged = []
+    for file in files:
+        if not file.filename.lower().endswith(ALLOWED_AUDIO_EXTENSIONS):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type for {file.filename}. Allowed types: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}"
+            )
+        file_size = upload_size(file)
+        if file_size > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{file.filename} is too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB"
+            )
+        mime_type = audio_mime_type(file)
+        uploaded = await file_registry.get_or_upload(file.file, file_size, mime_type, display_name=file.filename)
+        staged.append({"filename": file.filename, "uri": uploaded["uri"], "mime_type": uploaded["mime_type"]})
+
+    job = await job_queue.enqueue(
+        "process_audio",
+        {"request": request.model_dump(), "files": staged},
+        webhook_url=webhook_url
+    )
+    job_path = str(request_info.url_for("get_job", job_id=job["id"]))
+    return JSONResponse(status_code=202, content={
+        **job_status(job),
+        "status_url": job_path,
+        "events_url": f"{job_path}/events"
+    })
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str = Path(...)):
+    """Current status of a queued job, including its result once it has succeeded."""
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JSONResponse(content=job_status(job))
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(request_info: Request, job_id: str = Path(...)):
+    """Server-sent events: one `status` event per status change, closing after the final one."""
+    if not await job_queue.get(job_id):
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    async def events():
+        last_seen = None
+        idle = 0.0
+        while not await request_info.is_disconnected():
+            job = await job_queue.get(job_id)
+            if job is None:
+                return
+            state = (job["status"], job["attempts"])
+            if state != last_seen:
+                last_seen = state
+                idle = 0.0
+                yield f"event: status\ndata: {json.dumps(job_status(job))}\n\n"
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+            elif idle >= JOB_EVENTS_KEEPALIVE:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+            idle += JOB_EVENTS_POLL_INTERVAL
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.post("/process-audio-uri")
 async def process_audio_uri(
-    file_uri: str = Body(..., embed=True),
+    request_info: Request,
+    file_uri: Optional[str] = Body(None, embed=True),
+    content_hash: Optional[str] = Body(None, embed=True),
     audio_processing_request: AudioProcessingRequest = Body(..., embed=True),
     google_account_id: Optional[str] = Query(None),
     device_uuid: Optional[str] = Query(None)
 ):
-    """Process audio using a Google media file URI."""
+    """
+    Process audio using a Google media file URI, or the `content_hash` returned by an earlier upload.
+    Either way the audio already in the Gemini Files API is reused, so re-analysis needs no upload.
+    """
     try:
         # Verify user if credentials provided
         user_id = await auth_service.verify_user(google_account_id, device_uuid)
@@ -205,23 +572,47 @@ async def process_audio_uri(
         # Get prompt configuration (will raise 400 if invalid)
         await schema_manager.get_prompt_text(audio_processing_request.prompt_type)
 
-        # Validate file URI
-        if not file_uri.startswith(("gs://", "http://", "https://")):
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid file URI. Must start with gs://, http://, or https://"
-            )
+        mime_type = "audio/ogg"
+        if content_hash:
+            handle = await file_registry.lookup(content_hash)
+            if not handle:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No live Gemini file for content hash {content_hash}; upload the audio again"
+                )
+            file_uri, mime_type = handle["uri"], handle["mime_type"]
+        elif not file_uri:
+            raise HTTPException(status_code=400, detail="Either file_uri or content_hash is required")
+        else:
+            # Validate file URI
+            if not file_uri.startswith(("gs://", "http://", "https://")):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid file URI. Must start with gs://, http://, or https://"
+                )
+            handle = await file_registry.lookup_uri(file_uri)
+            if handle:
+                if handle["expired"]:
+                    raise HTTPException(
+                        status_code=410,
+                        detail=f"Gemini file expired at {handle['expires_at']}; upload the audio again"
+                    )
+                mime_type = handle["mime_type"]
 
         # Process the file
         try:
-            result = await gemini_service.process_audio_uri(
-                file_uri=file_uri,
-                prompt_type=audio_processing_request.prompt_type,
-                model_name=audio_processing_request.model_name,
-                temperature=audio_processing_request.temperature,
-                top_p=audio_processing_request.top_p,
-                top_k=audio_processing_request.top_k,
-                max_output_tokens=audio_processing_request.max_output_tokens
+            result = await cancel_on_disconnect(
+                request_info,
+                gemini_service.process_audio_uri(
+                    file_uri=file_uri,
+                    prompt_type=audio_processing_request.prompt_type,
+                    model_name=audio_processing_request.model_name,
+                    temperature=audio_processing_request.temperature,
+                    top_p=audio_processing_request.top_p,
+                    top_k=audio_processing_request.top_k,
+                    max_output_tokens=audio_processing_request.max_output_tokens,
+                    mime_type=mime_type
+                )
             )
             
             return JSONResponse(content={"results": [{
@@ -230,6 +621,8 @@ async def process_audio_uri(
                 "result": result
             }]})
 
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Gemini processing failed: {e}", exc_info=True)
             return JSONResponse(content={"results": [{
@@ -315,6 +708,26 @@ async def delete_prompt_schema(prompt_type: str = Path(...)):
         logger.error(f"Failed to delete prompt schema: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/prompt-schema-cache/stats")
+async def prompt_schema_cache_stats():
+    """Hit/miss counters for the in-process prompt config cache."""
+    return schema_manager.cache_stats()
+
+@router.get("/auth-cache/stats")
+async def auth_cache_stats():
+    """Hit/miss counters for the in-process device identity cache."""
+    return auth_service.identity_cache.stats()
+
+@router.get("/processed-results/stats")
+async def processed_results_stats():
+    """Counters for the write-behind writer of processed audio results."""
+    return processed_results_writer.stats()
+
+@router.get("/statements/stats")
+async def statement_stats_endpoint():
+    """Executions per precompiled hot statement (database/statements.py)."""
+    return statement_stats()
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -1,49 +1,146 @@
 # configs/schemas.py
+import hashlib
 import os
-from typing import Dict
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
 import json
 import logging
 from pathlib import Path
 import datetime
+from fastapi import HTTPException
+from utils.telemetry import span
 
 logger = logging.getLogger(__name__)
 
+# How long a prompt config may be served from memory. Writes through this process invalidate
+# immediately; the TTL bounds staleness for writes made by other workers.
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "300"))
+# prompt_type comes from clients: unknown types are remembered only briefly, and the LRU bound keeps
+# random prompt types from growing the cache
+PROMPT_CACHE_NEGATIVE_TTL = float(os.getenv("PROMPT_CACHE_NEGATIVE_TTL", "5"))
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1000"))
+
+class CachedConfig(NamedTuple):
+    config: Optional[Dict]  # None caches "unknown prompt type"
+    version: Optional[str]  # content fingerprint, see prompt_fingerprint
+    expires_at: float
+
+def prompt_fingerprint(config: Dict) -> str:
+    """
+    Hash of a prompt's text and response schema. Unlike updated_at (whole seconds) it changes with
+    every edit, and an identical prompt recreated later gets the same version back.
+    """
+    material = {"prompt_text": config["prompt_text"], "response_schema": config["response_schema"]}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
 class SchemaManager:
     DEFAULT_PROMPT_TYPE = "transcription_v1"
     DEFAULT_PROMPT_TEXT = "Please analyze this audio and provide a detailed summary including: key topics discussed, speaker emotions, main points, and any notable insights or conclusions."
+    DEFAULT_CONFIG = {
+        "prompt_text": DEFAULT_PROMPT_TEXT,
+        "response_schema": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "topics": {"type": "array", "items": {"type": "string"}},
+                "emotions": {"type": "object"},
+                "key_points": {"type": "array", "items": {"type": "string"}},
+                "insights": {"type": "array", "items": {"type": "string"}}
+            }
+        }
+    }
     
-    def __init__(self):
+    def __init__(
+        self,
+        cache_ttl: float = PROMPT_CACHE_TTL,
+        negative_ttl: float = PROMPT_CACHE_NEGATIVE_TTL,
+        max_entries: int = PROMPT_CACHE_SIZE
+    ):
+        from sqlalchemy import bindparam
         from database.core import database, prompt_schema_table
+        from database.statements import register_statement
         self.database = database
         self.prompt_schema_table = prompt_schema_table
-        
-    async def get_config(self, prompt_type: str) -> Dict:
-        """Get prompt configuration, returning None if not found (except for default)."""
-        if prompt_type == self.DEFAULT_PROMPT_TYPE:
-            return {
-                "prompt_text": self.DEFAULT_PROMPT_TEXT,
-                "response_schema": {
-                    "type": "object",
-                    "properties": {
-                        "summary": {"type": "string"},
-                        "topics": {"type": "array", "items": {"type": "string"}},
-                        "emotions": {"type": "object"},
-                        "key_points": {"type": "array", "items": {"type": "string"}},
-                        "insights": {"type": "array", "items": {"type": "string"}}
-                    }
-                }
-            }
-            
-        query = self.prompt_schema_table.select().where(
-            self.prompt_schema_table.c.prompt_type == prompt_type
+        # Cache misses run this precompiled lookup instead of building and compiling a select each time
+        self._config_statement = register_statement(
+            "prompt_schema.by_type",
+            prompt_schema_table.select().where(prompt_schema_table.c.prompt_type == bindparam("prompt_type"))
         )
-        result = await self.database.fetch_one(query)
+        # Read-through LRU of parsed configs, keyed by prompt_type
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, CachedConfig]" = OrderedDict()
+        # Bumped on every invalidation so a read that started before a write can't repopulate stale data
+        self._cache_generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def _load_config(self, prompt_type: str) -> CachedConfig:
+        """Return the cached entry for `prompt_type`, reading and parsing the row on a miss."""
+        entry = self._cache.get(prompt_type)
+        if entry and entry.expires_at > time.monotonic():
+            self._cache.move_to_end(prompt_type)
+            self.cache_hits += 1
+            return entry
+
+        self.cache_misses += 1
+        generation = self._cache_generation
+        with span("prompt.db_lookup"):
+            result = await self._config_statement.fetch_one(prompt_type=prompt_type)
+        config = None
+        version = None
         if result:
-            return {
+            config = {
                 "prompt_text": result["prompt_text"],
                 "response_schema": json.loads(result["response_schema"])
             }
-        return None
+            version = prompt_fingerprint(config)
+
+        ttl = self.cache_ttl if config is not None else self.negative_ttl
+        entry = CachedConfig(config, version, time.monotonic() + ttl)
+        if generation == self._cache_generation:
+            self._cache[prompt_type] = entry
+            self._cache.move_to_end(prompt_type)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    def invalidate(self, prompt_type: Optional[str] = None):
+        """Drop one cached prompt config, or all of them when no prompt_type is given."""
+        self._cache_generation += 1
+        if prompt_type is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(prompt_type, None)
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters for the prompt config cache."""
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "entries": len(self._cache),
+            "generation": self._cache_generation,
+            "ttl_seconds": self.cache_ttl,
+            "negative_ttl_seconds": self.negative_ttl,
+            "max_entries": self.max_entries
+        }
+        
+    async def get_config(self, prompt_type: str) -> Dict:
+        """
+        Get prompt configuration, returning None if not found (except for default).
+        The returned dict is shared with the cache and must not be mutated.
+        """
+        if prompt_type == self.DEFAULT_PROMPT_TYPE:
+            return self.DEFAULT_CONFIG
+        return (await self._load_config(prompt_type)).config
+
+    async def get_prompt_version(self, prompt_type: str) -> Optional[str]:
+        """Version of the prompt for result cache keys (prompt_fingerprint); None for unknown types."""
+        if prompt_type == self.DEFAULT_PROMPT_TYPE:
+            return DEFAULT_PROMPT_VERSION
+        return (await self._load_config(prompt_type)).version
 
     async def get_prompt_text(self, prompt_type: str) -> str:
         """Get prompt text, raising 400 error if prompt type is invalid."""
@@ -52,7 +149,6 @@ class SchemaManager:
             
         config = await self.get_config(prompt_type)
         if not config:
-            from fastapi import HTTPException
             raise HTTPException(
                 status_code=400,
                 detail=f"Invalid prompt type: {prompt_type}"
@@ -62,7 +158,6 @@ class SchemaManager:
     async def create_config(self, prompt_type: str, prompt_text: str, response_schema: Dict) -> Dict:
         """Create new prompt configuration."""
         if prompt_type == self.DEFAULT_PROMPT_TYPE:
-            from fastapi import HTTPException
             raise HTTPException(
                 status_code=400,
                 detail=f"Cannot modify default prompt type: {self.DEFAULT_PROMPT_TYPE}"
@@ -78,10 +173,10 @@ class SchemaManager:
                 updated_at=current_timestamp
             )
             await self.database.execute(query)
+            self.invalidate(prompt_type)
             return await self.get_config(prompt_type)
         except Exception as e:
             logger.error(f"Error creating config: {e}", exc_info=True)
-            from fastapi import HTTPException
             raise HTTPException(
                 status_code=500,
                 detail="Failed to create prompt schema"
@@ -90,7 +185,6 @@ class SchemaManager:
     async def update_config(self, prompt_type: str, prompt_text: str = None, response_schema: Dict = None) -> Dict:
         """Update existing prompt configuration."""
         if prompt_type == self.DEFAULT_PROMPT_TYPE:
-            from fastapi import HTTPException
             raise HTTPException(
                 status_code=400,
                 detail=f"Cannot modify default prompt type: {self.DEFAULT_PROMPT_TYPE}"
@@ -110,8 +204,8 @@ class SchemaManager:
             ).values(**values)
             
             result = await self.database.execute(query)
+            self.invalidate(prompt_type)
             if not result:
-                from fastapi import HTTPException
                 raise HTTPException(
                     status_code=404,
                     detail=f"Prompt schema not found: {prompt_type}"
@@ -121,7 +215,6 @@ class SchemaManager:
             raise
         except Exception as e:
             logger.error(f"Error updating config: {e}", exc_info=True)
-            from fastapi import HTTPException
             raise HTTPException(
                 status_code=500,
                 detail="Failed to update prompt schema"
@@ -130,7 +223,6 @@ class SchemaManager:
     async def delete_config(self, prompt_type: str) -> bool:
         """Delete prompt configuration."""
         if prompt_type == self.DEFAULT_PROMPT_TYPE:
-            from fastapi import HTTPException
             raise HTTPException(
                 status_code=400,
                 detail=f"Cannot delete default prompt type: {self.DEFAULT_PROMPT_TYPE}"
@@ -141,7 +233,10 @@ class SchemaManager:
                 self.prompt_schema_table.c.prompt_type == prompt_type
             )
             result = await self.database.execute(query)
+            self.invalidate(prompt_type)
             return result is not None
         except Exception as e:
             logger.error(f"Error deleting config: {e}", exc_info=True)
             return False
+
+DEFAULT_PROMPT_VERSION = prompt_fingerprint(SchemaManager.DEFAULT_CONFIG)
@@ -1,9 +1,13 @@
 # services/audio_service.py
 from fastapi import UploadFile, HTTPException
+import asyncio
 import logging
+import os
+import aiohttp
 import google.generativeai as genai
-from typing import List, Optional
+from typing import BinaryIO, Dict, List, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential
+from utils.telemetry import span
 
 logger = logging.getLogger(__name__)
  
@@ -14,6 +18,10 @@ class AudioService:
     }
     MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB limit
     CHUNK_SIZE = 8 * 1024 * 1024  # 8MB chunks
+    # Resumable upload chunks must be a multiple of 256KB (except the last one)
+    UPLOAD_CHUNK_SIZE = int(os.getenv("GEMINI_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+    GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com")
+    FILE_ACTIVE_POLL_ATTEMPTS = 10
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def process_file(self, file: UploadFile) -> dict:
@@ -74,4 +82,85 @@ class AudioService:
                     status_code=503,
                     detail="Upload failed due to network interruption. Please try again."
                 )
-            raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def upload_stream(
+        self,
+        file_obj: BinaryIO,
+        size: int,
+        mime_type: str,
+        display_name: Optional[str] = None
+    ) -> Dict:
+        """
+        Upload a file-like object to the Gemini Files API using the resumable protocol.
+        Only UPLOAD_CHUNK_SIZE bytes are held in memory at a time, whatever the file size.
+        Returns the Files API resource (name, uri, mimeType, expirationTime, state, ...).
+        """
+        api_key = os.getenv("GOOGLE_API_KEY")
+        start_headers = {
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(size),
+            "X-Goog-Upload-Header-Content-Type": mime_type,
+        }
+        metadata = {"file": {"display_name": display_name}} if display_name else {}
+
+        try:
+            logger.debug(f"Streaming upload to Gemini (size: {size} bytes, mime_type: {mime_type})")
+            with span("gemini.upload", size=size):
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(
+                        f"{self.GEMINI_API_BASE_URL}/upload/v1beta/files",
+                        params={"key": api_key},
+                        headers=start_headers,
+                        json=metadata
+                    ) as response:
+                        if response.status != 200:
+                            raise ValueError(f"Upload session rejected ({response.status}): {await response.text()}")
+                        upload_url = response.headers["X-Goog-Upload-URL"]
+
+                    file_obj.seek(0)
+                    offset = 0
+                    while True:
+                        # Spooled uploads may live on disk; keep the read off the event loop
+                        chunk = await asyncio.to_thread(file_obj.read, self.UPLOAD_CHUNK_SIZE)
+                        is_last = offset + len(chunk) >= size
+                        if not chunk and not is_last:
+                            raise ValueError(f"File ended at {offset} of {size} bytes")
+                        headers = {
+                            "X-Goog-Upload-Command": "upload, finalize" if is_last else "upload",
+                            "X-Goog-Upload-Offset": str(offset),
+                        }
+                        async with session.post(upload_url, headers=headers, data=chunk) as response:
+                            if response.status != 200:
+                                raise ValueError(f"Chunk upload failed at offset {offset} ({response.status}): {await response.text()}")
+                            if is_last:
+                                uploaded = (await response.json())["file"]
+                                break
+                        offset += len(chunk)
+
+                    uploaded = await self._wait_until_active(session, uploaded, api_key)
+
+            logger.info(f"Successfully uploaded file as: {uploaded['uri']}")
+            return uploaded
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming upload to Gemini: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Upload to Gemini failed: {str(e)}")
+
+    async def _wait_until_active(self, session: aiohttp.ClientSession, uploaded: Dict, api_key: str) -> Dict:
+        """Poll a freshly uploaded file until Gemini has finished processing it."""
+        for attempt in range(self.FILE_ACTIVE_POLL_ATTEMPTS):
+            if uploaded.get("state", "ACTIVE") != "PROCESSING":
+                break
+            await asyncio.sleep(min(2 ** attempt, 5))
+            async with session.get(
+                f"{self.GEMINI_API_BASE_URL}/v1beta/{uploaded['name']}",
+                params={"key": api_key}
+            ) as response:
+                uploaded = await response.json()
+
+        if uploaded.get("state") == "FAILED":
+            raise ValueError(f"Gemini could not process uploaded file {uploaded.get('name')}")
+        return uploaded
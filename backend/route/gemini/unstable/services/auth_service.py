@@ -1,13 +1,122 @@
 # services/auth_service.py
+import os
+import time
+from collections import OrderedDict
 from fastapi import HTTPException
 from sqlalchemy import select
-from typing import Optional
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
 import logging
-from database.core import database, device_registration_table
+from database.core import accounts_table, database
+from database.devices import identity_statement
+from utils.telemetry import span
 
 logger = logging.getLogger(__name__)
 
+# How long a device -> user mapping is served from memory. Registration changes made through this
+# process invalidate immediately; the TTLs bound staleness for changes made by other workers.
+DEVICE_AUTH_CACHE_TTL = float(os.getenv("DEVICE_AUTH_CACHE_TTL", "300"))
+DEVICE_AUTH_NEGATIVE_TTL = float(os.getenv("DEVICE_AUTH_NEGATIVE_TTL", "30"))  # unknown devices
+DEVICE_AUTH_CACHE_SIZE = int(os.getenv("DEVICE_AUTH_CACHE_SIZE", "10000"))
+
+IdentityKey = Tuple[Optional[str], Optional[str]]  # (google_account_id, device_uuid)
+
+class CachedIdentity(NamedTuple):
+    user_id: Optional[int]  # None caches "device not registered"
+    expires_at: float
+
+class DeviceIdentityCache:
+    """
+    LRU of (google_account_id, device_uuid) -> accounts.id, including misses.
+    Shared by every AuthService; route/models/device_registration.py invalidates it on writes.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEVICE_AUTH_CACHE_TTL,
+        negative_ttl: float = DEVICE_AUTH_NEGATIVE_TTL,
+        max_entries: int = DEVICE_AUTH_CACHE_SIZE
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[IdentityKey, CachedIdentity]" = OrderedDict()
+        # Bumped on every invalidation so a lookup that started before a write can't repopulate stale data
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: IdentityKey) -> Optional[CachedIdentity]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: IdentityKey, user_id: Optional[int], generation: int):
+        if generation != self.generation:
+            return
+        ttl = self.ttl if user_id is not None else self.negative_ttl
+        self._entries[key] = CachedIdentity(user_id, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(
+        self,
+        google_account_id: Optional[str] = None,
+        device_uuid: Optional[str] = None,
+        user_id: Optional[int] = None
+    ):
+        """
+        Drop every entry keyed by either identifier or resolving to `user_id`; everything when
+        called without arguments. Writes are rare, so a scan is fine here.
+        """
+        self.generation += 1
+        if google_account_id is None and device_uuid is None and user_id is None:
+            self._entries.clear()
+            return
+        stale = [
+            key for key, entry in self._entries.items()
+            if (google_account_id is not None and key[0] == google_account_id)
+            or (device_uuid is not None and key[1] == device_uuid)
+            or (user_id is not None and entry.user_id == user_id)
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    def invalidate_many(self, identities: Iterable[IdentityKey]):
+        """invalidate() for a batch of (google_account_id, device_uuid), in one scan."""
+        google_account_ids = set()
+        device_uuids = set()
+        for google_account_id, device_uuid in identities:
+            google_account_ids.add(google_account_id)
+            device_uuids.add(device_uuid)
+        google_account_ids.discard(None)
+        device_uuids.discard(None)
+        self.generation += 1
+        stale = [key for key in self._entries if key[0] in google_account_ids or key[1] in device_uuids]
+        for key in stale:
+            del self._entries[key]
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for the device identity cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "generation": self.generation,
+            "ttl_seconds": self.ttl,
+            "negative_ttl_seconds": self.negative_ttl
+        }
+
+device_identity_cache = DeviceIdentityCache()
+
 class AuthService:
+    def __init__(self, identity_cache: DeviceIdentityCache = device_identity_cache):
+        self.identity_cache = identity_cache
+
     async def verify_user(
         self,
         google_account_id: Optional[str] = None,
@@ -22,31 +131,27 @@ class AuthService:
             if not google_account_id and not device_uuid:
                 return None
 
-            # Start with a base query selecting all columns
-            stmt = select(device_registration_table)
-
-            # Add where clauses based on provided credentials
-            conditions = []
-            if google_account_id and device_uuid:
-                stmt = stmt.where(
-                    device_registration_table.c.google_account_id == google_account_id,
-                    device_registration_table.c.device_uuid == device_uuid
-                )
-            elif google_account_id:
-                stmt = stmt.where(device_registration_table.c.google_account_id == google_account_id)
+            key = (google_account_id or None, device_uuid or None)
+            entry = self.identity_cache.get(key)
+            if entry is None:
+                generation = self.identity_cache.generation
+                # Only the account id is needed, which the accounts/devices indexes cover without touching rows;
+                # the statement is compiled once and runs with bound parameters
+                statement = identity_statement(google_account_id, device_uuid)
+                logger.debug(f"Executing auth query: {statement.name}")
+
+                with span("auth.verify_user"):
+                    user = await statement.fetch_one(google_account_id=google_account_id, device_uuid=device_uuid)
+                user_id = user["id"] if user else None
+                self.identity_cache.put(key, user_id, generation)
             else:
-                stmt = stmt.where(device_registration_table.c.device_uuid == device_uuid)
-
-            logger.debug(f"Executing auth query: {stmt}")
-            
-            # Execute the query
-            user = await database.fetch_one(stmt)
-            
-            if not user and (google_account_id or device_uuid):
+                user_id = entry.user_id
+
+            if user_id is None:
                 logger.warning(f"User not found for google_account_id={google_account_id}, device_uuid={device_uuid}")
                 raise HTTPException(status_code=401, detail="User not registered")
-            
-            return user['id'] if user else None
+
+            return user_id
 
         except HTTPException:
             raise
@@ -59,9 +164,7 @@ class AuthService:
         Retrieve user information by ID.
         """
         try:
-            stmt = select(device_registration_table).where(
-                device_registration_table.c.id == user_id
-            )
+            stmt = select(accounts_table).where(accounts_table.c.id == user_id)
             return await database.fetch_one(stmt)
         except Exception as e:
             logger.error(f"Error fetching user {user_id}: {e}")
@@ -0,0 +1,147 @@
+# services/file_registry_service.py
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, Optional
+from database.core import database, gemini_file_handles_table
+from utils.telemetry import span
+from .audio_service import AudioService
+from .result_cache_service import ResultCacheService
+
+logger = logging.getLogger(__name__)
+
+# Gemini keeps uploaded files for 48 hours
+GEMINI_FILE_RETENTION = timedelta(hours=48)
+# Handles closer than this to expiry are re-uploaded, so an analysis never races the deletion
+GEMINI_FILE_MIN_TTL = int(os.getenv("GEMINI_FILE_MIN_TTL", "3600"))  # seconds
+
+def parse_expiration(value) -> datetime:
+    """Files API expirationTime (RFC 3339 string or datetime) as naive UTC."""
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
+    except ValueError:
+        logger.warning(f"Unparseable Gemini file expiration: {value}")
+    return datetime.utcnow() + GEMINI_FILE_RETENTION
+
+class FileRegistryService:
+    """
+    Registry of audio already uploaded to the Gemini Files API, keyed by content hash.
+    Lets the same recording be analyzed under several prompts with a single upload.
+    """
+
+    def __init__(self, audio_service: Optional[AudioService] = None, min_ttl: int = GEMINI_FILE_MIN_TTL):
+        self.audio_service = audio_service or AudioService()
+        self.min_ttl = min_ttl
+        self._upload_locks: Dict[str, asyncio.Lock] = {}
+        # Tasks holding or waiting for each upload lock; the lock is dropped when this reaches zero
+        self._upload_waiters: Dict[str, int] = {}
+
+    @staticmethod
+    def _handle(row, reused: bool) -> Dict:
+        return {
+            "content_hash": row["content_hash"],
+            "name": row["file_name"],
+            "uri": row["file_uri"],
+            "mime_type": row["mime_type"],
+            "expires_at": row["expires_at"].isoformat(),
+            "reused": reused
+        }
+
+    def is_live(self, row) -> bool:
+        return row["expires_at"] > datetime.utcnow() + timedelta(seconds=self.min_ttl)
+
+    async def lookup(self, content_hash: str) -> Optional[Dict]:
+        """Live handle for `content_hash`, or None if it was never uploaded or is about to expire."""
+        with span("file_registry.lookup"):
+            row = await database.fetch_one(
+                gemini_file_handles_table.select().where(gemini_file_handles_table.c.content_hash == content_hash)
+            )
+        if not row or not self.is_live(row):
+            return None
+        await database.execute(
+            gemini_file_handles_table.update()
+            .where(gemini_file_handles_table.c.content_hash == content_hash)
+            .values(last_used_at=datetime.utcnow())
+        )
+        return self._handle(row, reused=True)
+
+    async def lookup_uri(self, file_uri: str) -> Optional[Dict]:
+        """Registry entry for a Files API URI, expired or not; None for URIs uploaded elsewhere."""
+        row = await database.fetch_one(
+            gemini_file_handles_table.select().where(gemini_file_handles_table.c.file_uri == file_uri)
+        )
+        if not row:
+            return None
+        return {**self._handle(row, reused=True), "expired": row["expires_at"] <= datetime.utcnow()}
+
+    async def register(
+        self,
+        content_hash: str,
+        file_name: str,
+        file_uri: str,
+        mime_type: str,
+        size_bytes: Optional[int] = None,
+        expires_at: Optional[datetime] = None
+    ) -> Dict:
+        """Record a fresh upload, replacing any expired handle for the same content."""
+        now = datetime.utcnow()
+        values = {
+            "content_hash": content_hash,
+            "file_name": file_name,
+            "file_uri": file_uri,
+            "mime_type": mime_type,
+            "size_bytes": size_bytes,
+            "expires_at": expires_at or now + GEMINI_FILE_RETENTION,
+            "created_at": now,
+            "last_used_at": now
+        }
+        async with database.transaction():
+            await database.execute(
+                gemini_file_handles_table.delete().where(gemini_file_handles_table.c.content_hash == content_hash)
+            )
+            await database.execute(gemini_file_handles_table.insert().values(**values))
+        return self._handle(values, reused=False)
+
+    async def get_or_upload(
+        self,
+        file_obj: BinaryIO,
+        size: int,
+        mime_type: str,
+        display_name: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Dict:
+        """Reuse the live remote copy of this audio if there is one, otherwise stream it up and register it."""
+        content_hash = content_hash or await ResultCacheService.hash_file(file_obj)
+
+        # Concurrent submissions of the same recording share one upload
+        lock = self._upload_locks.setdefault(content_hash, asyncio.Lock())
+        self._upload_waiters[content_hash] = self._upload_waiters.get(content_hash, 0) + 1
+        try:
+            async with lock:
+                handle = await self.lookup(content_hash)
+                if handle:
+                    logger.info(f"Reusing Gemini file {handle['name']} for {display_name or content_hash}")
+                    return handle
+
+                uploaded = await self.audio_service.upload_stream(file_obj, size, mime_type, display_name=display_name)
+                return await self.register(
+                    content_hash,
+                    file_name=uploaded["name"],
+                    file_uri=uploaded["uri"],
+                    mime_type=uploaded.get("mimeType", mime_type),
+                    size_bytes=size,
+                    expires_at=parse_expiration(uploaded.get("expirationTime"))
+                )
+        finally:
+            # Not lock.locked(): between a release and the next waiter resuming the lock looks free,
+            # and dropping it then would let a new request upload the same content again
+            self._upload_waiters[content_hash] -= 1
+            if not self._upload_waiters[content_hash]:
+                del self._upload_waiters[content_hash]
+                del self._upload_locks[content_hash]
@@ -1,55 +1,132 @@
 # services/gemini_service.py
 import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from google.generativeai import types as genai_types
-from typing import Dict, List, Union, Callable, Any
+from typing import Dict, List, Optional, Union, Callable, Any
 import logging
 import json
 import os
-import base64
+import time
 from fastapi import HTTPException
 from ..configs.schemas import SchemaManager
+from .model_backend import ModelBackend, get_backend
 from ..utils.json_utils import extract_json_from_response
+from utils.telemetry import span
 from fastapi import UploadFile
 import aiohttp
 
 logger = logging.getLogger(__name__)
 
+# The google-generativeai SDK is synchronous; calls run on a dedicated, bounded
+# thread pool so a slow Gemini request never blocks the event loop.
+GEMINI_MAX_WORKERS = int(os.getenv("GEMINI_MAX_WORKERS", "8"))
+GEMINI_REQUEST_TIMEOUT = float(os.getenv("GEMINI_REQUEST_TIMEOUT", "120"))
+
+# Failures worth another attempt: rate limiting (429) and server-side errors (5xx, which include
+# ServiceUnavailable and DeadlineExceeded). Anything else (InvalidArgument, PermissionDenied, a
+# malformed reply...) fails the same way every time and is raised at once.
+TRANSIENT_ERRORS = (google_exceptions.TooManyRequests, google_exceptions.ServerError)
+
 async def retry_with_exponential_backoff(
     operation: Callable[[], Any],
     initial_delay: float = 1,
     max_delay: float = 60,
     max_retries: int = 5,
     backoff_factor: float = 2,
+    budget: Optional[float] = None,
 ) -> Any:
-    """Retry an operation with exponential backoff."""
+    """
+    Retry an operation with exponential backoff on TRANSIENT_ERRORS. With a `budget` (seconds),
+    no retry starts once the attempts so far plus the next delay would exceed it.
+    """
     delay = initial_delay
-    last_exception = None
-    
+    started = time.monotonic()
+
     for attempt in range(max_retries):
         try:
-            return await operation() if asyncio.iscoroutinefunction(operation) else operation()
-        except Exception as e:
-            last_exception = e
+            result = operation()
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except TRANSIENT_ERRORS as e:
             logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-            
-            if attempt < max_retries - 1:
-                await asyncio.sleep(delay)
-                delay = min(delay * backoff_factor, max_delay)
-            
-    raise last_exception or Exception("Operation failed after max retries")
+            if attempt == max_retries - 1:
+                raise
+            if budget is not None and time.monotonic() - started + delay >= budget:
+                logger.warning(f"Not retrying: the {budget}s budget would be exceeded")
+                raise
+            await asyncio.sleep(delay)
+            delay = min(delay * backoff_factor, max_delay)
 
 class GeminiService:
-    def __init__(self, schema_manager: SchemaManager):
+    def __init__(
+        self,
+        schema_manager: SchemaManager,
+        max_workers: int = GEMINI_MAX_WORKERS,
+        request_timeout: float = GEMINI_REQUEST_TIMEOUT,
+        backend: Optional[ModelBackend] = None
+    ):
         self.schema_manager = schema_manager
+        self.request_timeout = request_timeout
+        # Selected by GEMINI_BACKEND unless injected (tests, benchmarks)
+        self.backend = backend or get_backend()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
         # Configure Gemini API
         genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-        logger.info("Initialized Gemini service with API key")
+        logger.info(
+            f"Initialized Gemini service with {type(self.backend).__name__} "
+            f"(workers={max_workers}, timeout={request_timeout}s)"
+        )
+
+    def shutdown(self):
+        """Stop the Gemini worker pool, dropping calls that have not started yet."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _generate_content(
+        self,
+        model_name: str,
+        contents: List[Any],
+        generation_config: Dict,
+        response_schema: Optional[Dict] = None
+    ) -> str:
+        """
+        Run the blocking backend call on the Gemini worker pool and return the reply text.
+        Cancelling or timing out the await frees the caller immediately, but a running
+        call can't be interrupted: its worker thread stays busy until the SDK's own
+        request timeout (the same request_timeout) ends it.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(
+            self.backend.generate_content,
+            model_name,
+            contents,
+            generation_config,
+            timeout=self.request_timeout,
+            response_schema=response_schema
+        )
+        with span("gemini.generate", model=model_name):
+            return await asyncio.wait_for(
+                loop.run_in_executor(self.executor, call),
+                timeout=self.request_timeout
+            )
 
     async def _send_message_async(self, chat, message: str):
         """Helper method to handle async message sending"""
         return await chat.send_message_async(message)
 
+    @staticmethod
+    def inline_audio_part(content: bytes, mime_type: str = "audio/ogg") -> Dict:
+        # Raw bytes go straight into the Blob; the SDK serializes them once for the transport
+        return {"inline_data": {"mime_type": mime_type, "data": content}}
+
+    @staticmethod
+    def file_audio_part(file_uri: str, mime_type: str = "audio/ogg") -> Dict:
+        return {"file_data": {"mime_type": mime_type, "file_uri": file_uri}}
+
     async def process_audio_content(
         self,
         content: bytes,
@@ -58,82 +135,241 @@ class GeminiService:
         temperature: float = 1.0,
         top_p: float = 0.95,
         top_k: int = 40,
-        max_output_tokens: int = 8192
+        max_output_tokens: int = 8192,
+        mime_type: str = "audio/ogg"
     ) -> Dict:
-        """Process audio content using Gemini API with proper prompt handling."""
+        """Process inline audio content using Gemini API with proper prompt handling."""
+        audio_part = self.inline_audio_part(content, mime_type)
+        return await self._process_audio_part(
+            audio_part, prompt_type, model_name, temperature, top_p, top_k, max_output_tokens
+        )
+
+    async def process_audio_uri(
+        self,
+        file_uri: str,
+        prompt_type: str,
+        model_name: str = "gemini-1.5-flash",
+        temperature: float = 1.0,
+        top_p: float = 0.95,
+        top_k: int = 40,
+        max_output_tokens: int = 8192,
+        mime_type: str = "audio/ogg"
+    ) -> Dict:
+        """Process audio that was already uploaded to the Gemini Files API, referenced by URI."""
+        audio_part = self.file_audio_part(file_uri, mime_type)
+        return await self._process_audio_part(
+            audio_part, prompt_type, model_name, temperature, top_p, top_k, max_output_tokens
+        )
+
+    async def _process_audio_part(
+        self,
+        audio_part: Dict,
+        prompt_type: str,
+        model_name: str,
+        temperature: float,
+        top_p: float,
+        top_k: int,
+        max_output_tokens: int
+    ) -> Dict:
+        """Run the prompt for `prompt_type` against a single audio part and parse the reply."""
+        # Get the appropriate prompt text for the given prompt type
+        prompt_text = await self.schema_manager.get_prompt_text(prompt_type)
+        config = await self.schema_manager.get_config(prompt_type)
+        generation_config = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "top_k": top_k,
+            "max_output_tokens": max_output_tokens
+        }
+        response_schema = config.get("response_schema") if config else None
+        return await self._run_prompt(
+            audio_part,
+            prompt_text,
+            model_name,
+            generation_config,
+            parse_json=bool(response_schema),
+            response_schema=response_schema
+        )
+
+    async def _run_prompt(
+        self,
+        audio_part: Dict,
+        prompt_text: str,
+        model_name: str,
+        generation_config: Dict,
+        parse_json: bool,
+        response_schema: Optional[Dict] = None
+    ) -> Dict:
+        """Send one prompt plus audio part to Gemini; the reply is parsed as JSON when `parse_json` is set."""
         try:
-            # Get the appropriate prompt text for the given prompt type
-            prompt_text = await self.schema_manager.get_prompt_text(prompt_type)
-            
-            # Initialize Gemini client
-            model = genai.GenerativeModel(model_name)
-            
-            # Configure generation parameters
-            generation_config = {
-                "temperature": temperature,
-                "top_p": top_p,
-                "top_k": top_k,
-                "max_output_tokens": max_output_tokens
-            }
-            
             # Create content with proper format for Gemini API
             content_parts = [
                 {
                     "parts": [
                         {"text": prompt_text},
-                        {
-                            "inline_data": {
-                                "mime_type": "audio/ogg",
-                                "data": base64.b64encode(content).decode('utf-8')
-                            }
-                        }
+                        audio_part
                     ]
                 }
             ]
             
             # Generate response with retry mechanism
-            response = await retry_with_exponential_backoff(
-                lambda: model.generate_content(
+            result = await retry_with_exponential_backoff(
+                lambda: self._generate_content(
+                    model_name,
                     content_parts,
-                    generation_config=generation_config
-                )
+                    generation_config,
+                    response_schema=response_schema
+                ),
+                budget=self.request_timeout
             )
             
-            # Process and validate response
-            if not response or not response.parts:
-                raise ValueError("No response generated from Gemini")
-                
-            result = response.parts[0].text
-            
             # Try to parse as JSON if response schema exists and response looks like JSON
-            config = await self.schema_manager.get_config(prompt_type)
-            if config and config.get("response_schema"):
-                try:
-                    # Only attempt JSON parsing if the response looks like JSON
-                    cleaned_text = result.strip()
-                    if cleaned_text.startswith('{') or cleaned_text.startswith('['):
-                        if cleaned_text.startswith("```json"):
-                            cleaned_text = cleaned_text[7:]
-                        if cleaned_text.endswith("```"):
-                            cleaned_text = cleaned_text[:-3]
-                        cleaned_text = cleaned_text.strip()
+            if parse_json:
+                with span("gemini.parse_json"):
+                    try:
+                        # Only attempt JSON parsing if the response looks like JSON
+                        cleaned_text = result.strip()
+                        if cleaned_text.startswith('{') or cleaned_text.startswith('['):
+                            if cleaned_text.startswith("```json"):
+                                cleaned_text = cleaned_text[7:]
+                            if cleaned_text.endswith("```"):
+                                cleaned_text = cleaned_text[:-3]
+                            cleaned_text = cleaned_text.strip()
                         
-                        # Attempt to parse JSON
-                        result = json.loads(cleaned_text)
-                except json.JSONDecodeError as e:
-                    # If JSON parsing fails, just return the text response
-                    logger.debug(f"Response is not JSON format, returning as text: {str(e)}")
-                    pass
+                            # Attempt to parse JSON
+                            result = json.loads(cleaned_text)
+                    except json.JSONDecodeError as e:
+                        # If JSON parsing fails, just return the text response
+                        logger.debug(f"Response is not JSON format, returning as text: {str(e)}")
+                        pass
                     
             return {
                 "status": "success",
                 "result": result
             }
             
+        except asyncio.TimeoutError:
+            logger.error(f"Gemini request timed out after {self.request_timeout}s")
+            raise HTTPException(
+                status_code=504,
+                detail=f"Gemini request timed out after {self.request_timeout}s"
+            )
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Gemini processing failed: {str(e)}", exc_info=True)
             raise ValueError(f"Gemini processing failed: {str(e)}")
 
+    async def process_audio_prompts(
+        self,
+        audio_part: Dict,
+        prompt_types: List[str],
+        model_name: str = "gemini-1.5-flash",
+        temperature: float = 1.0,
+        top_p: float = 0.95,
+        top_k: int = 40,
+        max_output_tokens: int = 8192,
+        merge_schemas: bool = False
+    ) -> Dict[str, Dict]:
+        """
+        Run several prompts against one audio part concurrently.
+        With `merge_schemas`, prompts whose response schemas are JSON objects are answered
+        by a single combined call. Returns an outcome per prompt type, with its timing.
+        """
+        outcomes: Dict[str, Dict] = {}
+        separate = list(dict.fromkeys(prompt_types))
+
+        if merge_schemas:
+            mergeable = []
+            for prompt_type in separate:
+                config = await self.schema_manager.get_config(prompt_type)
+                schema = (config or {}).get("response_schema")
+                # Stored schemas use Gemini's upper-case type names ("OBJECT")
+                if isinstance(schema, dict) and str(schema.get("type", "")).lower() == "object":
+                    mergeable.append(prompt_type)
+            if len(mergeable) > 1:
+                outcomes.update(await self._process_merged_prompts(
+                    audio_part, mergeable, model_name, temperature, top_p, top_k, max_output_tokens
+                ))
+                # Prompts the combined answer left out fall back to their own call
+                separate = [prompt_type for prompt_type in separate if prompt_type not in outcomes]
+
+        async def timed(prompt_type: str) -> Dict:
+            started = time.perf_counter()
+            try:
+                result = await self._process_audio_part(
+                    audio_part, prompt_type, model_name, temperature, top_p, top_k, max_output_tokens
+                )
+                outcome = {"status": "success", "result": result}
+            except Exception as e:
+                logger.error(f"Prompt {prompt_type} failed: {e}")
+                outcome = {"status": "failed", "error": e.detail if isinstance(e, HTTPException) else str(e)}
+            outcome.update(elapsed_ms=round((time.perf_counter() - started) * 1000, 1), merged=False)
+            return outcome
+
+        results = await asyncio.gather(*(timed(prompt_type) for prompt_type in separate))
+        outcomes.update(zip(separate, results))
+        return outcomes
+
+    async def _process_merged_prompts(
+        self,
+        audio_part: Dict,
+        prompt_types: List[str],
+        model_name: str,
+        temperature: float,
+        top_p: float,
+        top_k: int,
+        max_output_tokens: int
+    ) -> Dict[str, Dict]:
+        """Answer several object-schema prompts with one call whose JSON reply has a key per prompt type."""
+        sections = []
+        properties = {}
+        for prompt_type in prompt_types:
+            config = await self.schema_manager.get_config(prompt_type)
+            sections.append(f"## {prompt_type}\n{config['prompt_text']}")
+            properties[prompt_type] = config["response_schema"]
+        combined_schema = {"type": "OBJECT", "properties": properties, "required": prompt_types}
+        prompt_text = (
+            "Complete each of the following tasks for the same audio. Respond with a single JSON object "
+            f"with exactly these keys: {', '.join(prompt_types)}. Each key holds the answer to the task "
+            "of the same name.\n\n"
+            + "\n\n".join(sections)
+            + f"\n\nThe JSON object must follow this schema:\n{json.dumps(combined_schema)}"
+        )
+        generation_config = {
+            "temperature": temperature,
+            "top_p": top_p,
+            "top_k": top_k,
+            "max_output_tokens": max_output_tokens,
+            "response_mime_type": "application/json"
+        }
+
+        started = time.perf_counter()
+        try:
+            reply = await self._run_prompt(
+                audio_part, prompt_text, model_name, generation_config,
+                parse_json=True, response_schema=combined_schema
+            )
+        except Exception as e:
+            logger.warning(f"Merged call for {prompt_types} failed, running prompts separately: {e}")
+            return {}
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        combined = reply["result"]
+        if not isinstance(combined, dict):
+            logger.warning(f"Merged call for {prompt_types} returned no JSON object, running prompts separately")
+            return {}
+        return {
+            prompt_type: {
+                "status": "success",
+                "result": {"status": "success", "result": combined[prompt_type]},
+                "elapsed_ms": elapsed_ms,
+                "merged": True
+            }
+            for prompt_type in prompt_types
+            if prompt_type in combined
+        }
+
     async def process_audio(self, uploaded_files: List[Union[UploadFile, Dict]], config: Dict) -> List[Dict]:
         """Process audio files with Gemini API."""
         try:
@@ -145,10 +381,7 @@ class GeminiService:
                 "max_output_tokens": config.get('max_output_tokens', 8192),
             }
             
-            model = genai.GenerativeModel(
-                name=config.get('model_name', 'gemini-1.5-flash'),
-                generation_config=generation_config
-            )
+            model_name = config.get('model_name', 'gemini-1.5-flash')
             
             results = []
             for file in uploaded_files:
@@ -189,15 +422,11 @@ class GeminiService:
                     logger.debug(f"Final content structure: {json.dumps(content)}")
                     
                     # Process with Gemini
-                    response = await retry_with_exponential_backoff(
-                        lambda: model.generate_content(content)
+                    result = await retry_with_exponential_backoff(
+                        lambda: self._generate_content(model_name, content, generation_config),
+                        budget=self.request_timeout
                     )
                     
-                    if not response or not response.candidates:
-                        raise ValueError("No response generated from Gemini")
-                        
-                    result = response.candidates[0].content.text
-                    
                     # Try to parse as JSON if response schema exists
                     config = await self.schema_manager.get_config(config.get('prompt_type'))
                     if config and config.get("response_schema"):
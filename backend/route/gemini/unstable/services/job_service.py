@@ -0,0 +1,327 @@
+# services/job_service.py
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+import aiohttp
+from aiohttp.resolver import ThreadedResolver
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+from database.core import database, audio_jobs_table
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))  # jobs run at once per process
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))  # seconds before an unrenewed lease expires
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))  # seconds, doubled on each attempt
+WEBHOOK_ATTEMPTS = 3
+WEBHOOK_TIMEOUT = 10
+# Optional comma-separated hostnames webhooks may be sent to; any public host when unset
+WEBHOOK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+JobHandler = Callable[[Dict], Awaitable[Any]]
+
+class JobQueue:
+    """
+    Persistent job queue on the audio_jobs table.
+    A claim leases a job for `visibility_timeout` seconds; if the worker dies without
+    finishing or renewing it, the job becomes claimable again.
+    """
+
+    def __init__(
+        self,
+        visibility_timeout: int = JOB_VISIBILITY_TIMEOUT,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        retry_backoff: float = JOB_RETRY_BACKOFF
+    ):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        # Wakes idle workers in this process as soon as a job is submitted
+        self.new_job = asyncio.Event()
+
+    async def enqueue(self, kind: str, payload: Dict, webhook_url: Optional[str] = None) -> Dict:
+        now = datetime.utcnow()
+        job_id = str(uuid.uuid4())
+        await database.execute(
+            audio_jobs_table.insert().values(
+                id=job_id,
+                kind=kind,
+                status="queued",
+                payload=json.dumps(payload),
+                attempts=0,
+                max_attempts=self.max_attempts,
+                webhook_url=webhook_url,
+                available_at=now,
+                created_at=now,
+                updated_at=now
+            )
+        )
+        self.new_job.set()
+        logger.info(f"Queued {kind} job {job_id}")
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        row = await database.fetch_one(audio_jobs_table.select().where(audio_jobs_table.c.id == job_id))
+        return dict(row._mapping) if row else None
+
+    def _claimable(self, now: datetime):
+        table = audio_jobs_table.c
+        return or_(
+            and_(table.status == "queued", table.available_at <= now),
+            and_(table.status == "running", table.locked_until < now)
+        )
+
+    async def claim(self, worker_id: str) -> Optional[Dict]:
+        """Lease the oldest available job, or return None if there is nothing to do."""
+        now = datetime.utcnow()
+        candidate = await database.fetch_one(
+            select(audio_jobs_table.c.id)
+            .where(self._claimable(now))
+            .order_by(audio_jobs_table.c.available_at)
+            .limit(1)
+        )
+        if not candidate:
+            return None
+
+        # Conditional update so two workers racing for the same row cannot both win
+        lease = f"{worker_id}:{uuid.uuid4().hex}"
+        await database.execute(
+            audio_jobs_table.update()
+            .where(and_(audio_jobs_table.c.id == candidate["id"], self._claimable(now)))
+            .values(
+                status="running",
+                locked_by=lease,
+                locked_until=now + timedelta(seconds=self.visibility_timeout),
+                attempts=audio_jobs_table.c.attempts + 1,
+                updated_at=now
+            )
+        )
+        job = await database.fetch_one(
+            audio_jobs_table.select().where(and_(
+                audio_jobs_table.c.id == candidate["id"],
+                audio_jobs_table.c.locked_by == lease
+            ))
+        )
+        if not job:
+            return None
+        job = dict(job._mapping)
+
+        if job["attempts"] > job["max_attempts"]:
+            # Leased and lost too many times (worker crashes or hung calls)
+            await self.fail(job, "Job exceeded its visibility timeout too many times", retry=False)
+            return None
+        return job
+
+    async def extend_lease(self, job: Dict):
+        await database.execute(
+            audio_jobs_table.update()
+            .where(and_(audio_jobs_table.c.id == job["id"], audio_jobs_table.c.locked_by == job["locked_by"]))
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=self.visibility_timeout))
+        )
+
+    async def complete(self, job: Dict, result: Any):
+        await database.execute(
+            audio_jobs_table.update()
+            .where(and_(audio_jobs_table.c.id == job["id"], audio_jobs_table.c.locked_by == job["locked_by"]))
+            .values(
+                status="succeeded",
+                result=json.dumps(result),
+                error=None,
+                locked_by=None,
+                locked_until=None,
+                updated_at=datetime.utcnow()
+            )
+        )
+
+    async def fail(self, job: Dict, error: str, retry: bool = True) -> str:
+        """Record a failed attempt; requeue with backoff while attempts remain. Returns the new status."""
+        now = datetime.utcnow()
+        if retry and job["attempts"] < job["max_attempts"]:
+            status = "queued"
+            available_at = now + timedelta(seconds=self.retry_backoff * 2 ** (job["attempts"] - 1))
+        else:
+            status = "failed"
+            available_at = now
+        await database.execute(
+            audio_jobs_table.update()
+            .where(and_(audio_jobs_table.c.id == job["id"], audio_jobs_table.c.locked_by == job["locked_by"]))
+            .values(
+                status=status,
+                error=error,
+                locked_by=None,
+                locked_until=None,
+                available_at=available_at,
+                updated_at=now
+            )
+        )
+        return status
+
+def job_status(job: Dict) -> Dict:
+    """Public view of a job row, as returned by /jobs/{id}, SSE events and webhooks."""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": json.loads(job["result"]) if job["result"] else None,
+        "error": job["error"],
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+    }
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+class PublicResolver(ThreadedResolver):
+    """Resolves like aiohttp's default but refuses hosts with loopback, private or link-local addresses."""
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Dict[str, Any]]:
+        addresses = await super().resolve(host, port, family)
+        if not all(is_public_address(address["host"]) for address in addresses):
+            raise OSError(f"Webhook host {host} resolves to a non-public address")
+        return addresses
+
+async def validate_webhook_url(url: str):
+    """
+    Raise ValueError unless `url` is an http(s) URL on an allowed host whose addresses are all
+    public, so job results can't be POSTed to the server's own network (SSRF).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http:// or https:// URL")
+    host = parts.hostname.lower()
+    if WEBHOOK_ALLOWED_HOSTS and host not in WEBHOOK_ALLOWED_HOSTS:
+        raise ValueError(f"webhook_url host {host} is not allowed")
+    try:
+        addresses = [ipaddress.ip_address(host).compressed]
+    except ValueError:
+        try:
+            resolved = await asyncio.get_running_loop().getaddrinfo(host, parts.port or 443, type=socket.SOCK_STREAM)
+        except OSError:
+            raise ValueError(f"webhook_url host {host} does not resolve")
+        addresses = [info[4][0] for info in resolved]
+    if not all(is_public_address(address) for address in addresses):
+        raise ValueError("webhook_url must not point at a loopback, private or link-local address")
+
+async def notify_webhook(url: str, payload: Dict):
+    """POST the final job status to the client's webhook, retrying a few times."""
+    try:
+        await validate_webhook_url(url)
+    except ValueError as e:
+        logger.error(f"Not calling webhook {url} for job {payload['job_id']}: {e}")
+        return
+    timeout = aiohttp.ClientTimeout(total=WEBHOOK_TIMEOUT)
+    for attempt in range(1, WEBHOOK_ATTEMPTS + 1):
+        try:
+            # Checked again at connect time, so a host can't switch to an internal address after validation
+            connector = aiohttp.TCPConnector(resolver=PublicResolver())
+            async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+                async with session.post(url, json=payload, allow_redirects=False) as response:
+                    if response.status < 500:
+                        return
+                    logger.warning(f"Webhook {url} returned {response.status} (attempt {attempt})")
+        except Exception as e:
+            logger.warning(f"Webhook {url} failed (attempt {attempt}): {e}")
+        if attempt < WEBHOOK_ATTEMPTS:
+            await asyncio.sleep(2 ** attempt)
+    logger.error(f"Giving up on webhook {url} for job {payload['job_id']}")
+
+class JobWorker:
+    """Drains a JobQueue with at most `concurrency` jobs in flight in this process."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Optional[Dict[str, JobHandler]] = None,
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        poll_interval: float = JOB_POLL_INTERVAL
+    ):
+        self.queue = queue
+        self.handlers: Dict[str, JobHandler] = dict(handlers or {})
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._slots = []
+        self._notifications = set()
+
+    def register(self, kind: str, handler: JobHandler):
+        self.handlers[kind] = handler
+
+    def start(self):
+        if self._slots:
+            return
+        self._slots = [asyncio.create_task(self._run_slot()) for _ in range(self.concurrency)]
+        logger.info(f"Job worker {self.worker_id} started with {self.concurrency} slots")
+
+    async def stop(self):
+        # In-flight jobs keep their lease until it expires, then another worker retries them
+        for slot in self._slots:
+            slot.cancel()
+        await asyncio.gather(*self._slots, return_exceptions=True)
+        self._slots = []
+
+    async def _run_slot(self):
+        while True:
+            try:
+                job = await self.queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Failed to claim job: {e}")
+                job = None
+            if job is None:
+                self.queue.new_job.clear()
+                try:
+                    await asyncio.wait_for(self.queue.new_job.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job)
+
+    async def _keep_leased(self, job: Dict):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await self.queue.extend_lease(job)
+            except Exception as e:
+                logger.warning(f"Failed to extend lease on job {job['id']}: {e}")
+
+    async def _execute(self, job: Dict):
+        handler = self.handlers.get(job["kind"])
+        heartbeat = asyncio.create_task(self._keep_leased(job))
+        try:
+            if handler is None:
+                raise HTTPException(status_code=400, detail=f"No handler for job kind: {job['kind']}")
+            result = await handler(json.loads(job["payload"]))
+            await self.queue.complete(job, result)
+            logger.info(f"Job {job['id']} succeeded on attempt {job['attempts']}")
+        except asyncio.CancelledError:
+            raise
+        except HTTPException as e:
+            # Client errors will not succeed on retry
+            status = await self.queue.fail(job, str(e.detail), retry=e.status_code >= 500)
+            logger.error(f"Job {job['id']} attempt {job['attempts']} failed ({status}): {e.detail}")
+        except Exception as e:
+            status = await self.queue.fail(job, str(e))
+            logger.error(f"Job {job['id']} attempt {job['attempts']} failed ({status}): {e}", exc_info=True)
+        finally:
+            heartbeat.cancel()
+
+        if job["webhook_url"]:
+            final = await self.queue.get(job["id"])
+            if final and final["status"] in TERMINAL_STATUSES:
+                task = asyncio.create_task(notify_webhook(job["webhook_url"], job_status(final)))
+                self._notifications.add(task)
+                task.add_done_callback(self._notifications.discard)
@@ -0,0 +1,110 @@
+# services/model_backend.py
+import logging
+import os
+import random
+import threading
+import time
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# "genai" calls the real Gemini API; "fake" answers locally (benchmarks, offline development)
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "genai")
+GEMINI_FAKE_LATENCY = float(os.getenv("GEMINI_FAKE_LATENCY", "0.5"))  # seconds per call
+GEMINI_FAKE_ERROR_RATE = float(os.getenv("GEMINI_FAKE_ERROR_RATE", "0"))  # 0..1, share of calls that fail
+GEMINI_FAKE_SEED = int(os.getenv("GEMINI_FAKE_SEED", "0"))
+
+class ModelBackend(ABC):
+    """
+    Synchronous text generation behind GeminiService and process_with_gemini_webhook.
+    Implementations are called from worker threads and must be thread-safe.
+    """
+
+    @abstractmethod
+    def generate_content(
+        self,
+        model_name: str,
+        contents: List[Any],
+        generation_config: Dict,
+        timeout: Optional[float] = None,
+        response_schema: Optional[Dict] = None
+    ) -> str:
+        """Return the model's text reply for `contents`."""
+
+class GenAIBackend(ModelBackend):
+    """The google-generativeai SDK."""
+
+    def generate_content(self, model_name, contents, generation_config, timeout=None, response_schema=None) -> str:
+        model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+        request_options = {"timeout": timeout} if timeout else None
+        response = model.generate_content(contents, request_options=request_options)
+        if not response or not response.parts:
+            raise ValueError("No response generated from Gemini")
+        return response.parts[0].text
+
+class FakeBackend(ModelBackend):
+    """
+    Deterministic stand-in for Gemini: fixed latency (plus seeded jitter), a seeded error rate, and
+    replies synthesized from the response schema so downstream JSON handling is exercised.
+    """
+
+    def __init__(
+        self,
+        latency: float = GEMINI_FAKE_LATENCY,
+        error_rate: float = GEMINI_FAKE_ERROR_RATE,
+        seed: int = GEMINI_FAKE_SEED,
+        jitter: float = 0.0,
+        response_text: Optional[str] = None
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.response_text = response_text
+        self.call_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, model_name, contents, generation_config, timeout=None, response_schema=None) -> str:
+        with self._lock:
+            self.call_count += 1
+            fail = self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Fake Gemini call exceeded {timeout}s")
+        time.sleep(delay)
+        if fail:
+            # Transient, like the 503s it stands in for, so the retry path is exercised
+            raise google_exceptions.ServiceUnavailable("Injected fake Gemini failure")
+        if self.response_text is not None:
+            return self.response_text
+        if response_schema:
+            return json.dumps(fake_value(response_schema))
+        return f"Fake {model_name} analysis."
+
+def fake_value(schema: Dict, name: str = "value") -> Any:
+    """Smallest value that satisfies a Gemini/OpenAPI-style schema (type names in either case)."""
+    kind = str(schema.get("type", "object")).lower()
+    if schema.get("enum"):
+        return schema["enum"][0]
+    if kind == "object":
+        return {key: fake_value(child, key) for key, child in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [fake_value(schema.get("items", {"type": "string"}), name)]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return f"fake {name}"
+
+def get_backend(name: str = GEMINI_BACKEND) -> ModelBackend:
+    if name == "fake":
+        logger.warning("Using the fake Gemini backend; responses are synthetic")
+        return FakeBackend()
+    if name != "genai":
+        raise ValueError(f"Unknown GEMINI_BACKEND: {name}")
+    return GenAIBackend()
@@ -0,0 +1,144 @@
+# services/result_cache_service.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Union
+from sqlalchemy import select
+from database.core import database, gemini_result_cache_table
+from utils.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+# Run the TTL/LRU sweep once every N writes rather than on every insert
+EVICTION_INTERVAL = 100
+HASH_BLOCK_SIZE = 1024 * 1024
+
+class ResultCacheService:
+    """
+    Content-addressed cache of Gemini results, stored in the gemini_result_cache table.
+    Keys hash the audio bytes together with everything that changes the model output,
+    so identical submissions (client retries, re-recorded onboarding clips) skip Gemini.
+    """
+
+    def __init__(self, ttl: int = RESULT_CACHE_TTL, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes_since_eviction = 0
+
+    @staticmethod
+    def hash_content(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    async def hash_file(file_obj: BinaryIO) -> str:
+        """Hash a (possibly disk-backed) file object block by block, off the event loop."""
+        def digest() -> str:
+            hasher = hashlib.sha256()
+            file_obj.seek(0)
+            for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b""):
+                hasher.update(block)
+            file_obj.seek(0)
+            return hasher.hexdigest()
+        with span("upload.hash"):
+            return await asyncio.to_thread(digest)
+
+    @staticmethod
+    def build_key(
+        content_hashes: Union[str, Iterable[str]],
+        prompt_type: str,
+        prompt_version: Union[int, str],
+        model_name: str,
+        generation_params: Optional[Dict] = None
+    ) -> str:
+        """Derive the cache key for one submission."""
+        if isinstance(content_hashes, str):
+            content_hashes = [content_hashes]
+        material = json.dumps({
+            "content": list(content_hashes),
+            "prompt_type": prompt_type,
+            "prompt_version": prompt_version,
+            "model_name": model_name,
+            "params": generation_params or {},
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    async def get(self, cache_key: str) -> Optional[Any]:
+        """Return the cached result for `cache_key`, or None on a miss or an expired entry."""
+        try:
+            query = select(
+                gemini_result_cache_table.c.result,
+                gemini_result_cache_table.c.created_at
+            ).where(gemini_result_cache_table.c.cache_key == cache_key)
+            with span("result_cache.lookup"):
+                row = await database.fetch_one(query)
+            if not row:
+                return None
+            if row["created_at"] < datetime.utcnow() - timedelta(seconds=self.ttl):
+                return None
+
+            # Recency drives LRU eviction
+            await database.execute(
+                gemini_result_cache_table.update()
+                .where(gemini_result_cache_table.c.cache_key == cache_key)
+                .values(
+                    last_accessed_at=datetime.utcnow(),
+                    hit_count=gemini_result_cache_table.c.hit_count + 1
+                )
+            )
+            return json.loads(row["result"])
+        except Exception as e:
+            # The cache must never fail a request
+            logger.warning(f"Result cache lookup failed for {cache_key}: {e}")
+            return None
+
+    async def set(self, cache_key: str, prompt_type: str, model_name: str, result: Any):
+        """Store a result, replacing any previous entry for the same key."""
+        now = datetime.utcnow()
+        try:
+            async with database.transaction():
+                await database.execute(
+                    gemini_result_cache_table.delete().where(gemini_result_cache_table.c.cache_key == cache_key)
+                )
+                await database.execute(
+                    gemini_result_cache_table.insert().values(
+                        cache_key=cache_key,
+                        prompt_type=prompt_type,
+                        model_name=model_name,
+                        result=json.dumps(result),
+                        hit_count=0,
+                        created_at=now,
+                        last_accessed_at=now
+                    )
+                )
+        except Exception as e:
+            logger.warning(f"Result cache write failed for {cache_key}: {e}")
+            return
+
+        self._writes_since_eviction += 1
+        if self._writes_since_eviction >= EVICTION_INTERVAL:
+            self._writes_since_eviction = 0
+            await self.evict()
+
+    async def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries."""
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+            await database.execute(
+                gemini_result_cache_table.delete().where(gemini_result_cache_table.c.created_at < cutoff)
+            )
+            overflow = (
+                select(gemini_result_cache_table.c.cache_key)
+                .order_by(gemini_result_cache_table.c.last_accessed_at.desc())
+                .offset(self.max_entries)
+                .scalar_subquery()
+            )
+            await database.execute(
+                gemini_result_cache_table.delete().where(gemini_result_cache_table.c.cache_key.in_(overflow))
+            )
+        except Exception as e:
+            logger.warning(f"Result cache eviction failed: {e}")
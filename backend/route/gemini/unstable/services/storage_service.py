@@ -1,8 +1,6 @@
 # services/storage_service.py
-from typing import Any
-import json
-from database.core import database, processed_audio_files_table
-from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from database.processed_results import processed_results_writer, result_row
 
 class StorageService:
     async def store_processed_file(
@@ -12,14 +10,11 @@ class StorageService:
         file_uri: str,
         gemini_result: Any
     ):
-        """Store processed file results in the database."""
-        query = processed_audio_files_table.insert().values(
-            user_id=user_id,
-            file_name=file_name,
-            file_uri=file_uri,
-            gemini_result=json.dumps(gemini_result),
-            uploaded_at=datetime.utcnow(),
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
-        )
-        await database.execute(query)
\ No newline at end of file
+        """Queue a processed file result for the database; written in the background, in batches."""
+        await processed_results_writer.submit([result_row(user_id, file_name, file_uri, gemini_result)])
+
+    async def store_processed_files(self, user_id: int, files: List[Tuple[str, Optional[str], Any]]):
+        """store_processed_file for (file_name, file_uri, gemini_result) tuples, queued together."""
+        await processed_results_writer.submit([
+            result_row(user_id, file_name, file_uri, gemini_result) for file_name, file_uri, gemini_result in files
+        ])
@@ -0,0 +1,31 @@
+# utils/request_utils.py
+import asyncio
+import logging
+from typing import Awaitable, TypeVar
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Non-standard status used by nginx for "client closed request"; the client never sees it
+CLIENT_CLOSED_REQUEST = 499
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """
+    Await `awaitable` while watching the client connection.
+    If the client goes away first, the work is cancelled instead of running to completion.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected from {request.url.path}, cancelling work")
+                task.cancel()
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
@@ -12,8 +12,9 @@ This module provides CRUD operations for device registrations, including:
 - Deleting a device registration
 - **Checking if a device is registered**
 
-TODO:
-- need to allow multiple devces as its getting errors if you installthe app after the first time, each new install is a new device uuid
+Registrations live in the normalized accounts/devices tables (database/core.py): one account
+per Google account, one device row per install, so reinstalls with a new device UUID register
+alongside the old one.
 """
 
 from datetime import datetime
@@ -21,14 +22,28 @@ from typing import List, Optional
 
 import logging
 
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel, Field
 import sqlalchemy
+from sqlalchemy import tuple_
 
 from database.core import (
     database,
-    device_registration_table
+    devices_table
 )
+from database.devices import (
+    MAX_BULK_DEVICES,
+    REGISTRATION_BY_ID,
+    account_id_for,
+    find_registrations,
+    registration_check_statement,
+    registration_select,
+    upsert_device,
+    upsert_devices
+)
+from utils.db_state import read_database
+from utils.pagination import decode_cursor, encode_cursor
+from route.gemini.unstable.services.auth_service import device_identity_cache
 
 # Configure logging
 logging.basicConfig(
@@ -51,6 +66,7 @@ class DeviceRegistrationEntry(BaseModel):
     }
     
     id: int
+    account_id: int
     google_account_id: str
     device_uuid: str
     device_name: Optional[str]
@@ -106,6 +122,15 @@ class DeviceRegistrationCheckResponse(BaseModel):
     is_registered: bool
     device: Optional[DeviceRegistrationEntry]
 
+class DeviceRegistrationBulkCreate(BaseModel):
+    devices: List[DeviceRegistrationCreate] = Field(..., min_length=1, max_length=MAX_BULK_DEVICES)
+
+class DeviceRegistrationBulkCheck(BaseModel):
+    devices: List[DeviceRegistrationCheck] = Field(..., min_length=1, max_length=MAX_BULK_DEVICES)
+
+class DeviceRegistrationBulkCheckResponse(BaseModel):
+    results: List[DeviceRegistrationCheckResponse]  # in request order
+
 # === Telegram Notifier Initialization ===
 
 # notifier: Optional[TelegramNotifier] = None
@@ -126,101 +151,44 @@ async def register_device(entry: DeviceRegistrationCreate, request: Request):
     - **google_account_id**: Unique identifier for the Google account.
     - **device_uuid**: Unique UUID for the device.
     - **id_token**: Authentication ID token.
-    - **access_token**: Authentication access token.
     """
     logger.info(f"Registering device with Google Account ID: {entry.google_account_id}")
 
-    # Check if the device is already registered by google_account_id or device_uuid
-    check_query = device_registration_table.select().where(
-        (device_registration_table.c.google_account_id == entry.google_account_id) |
-        (device_registration_table.c.device_uuid == entry.device_uuid)
-    )
-    existing_entry = await database.fetch_one(check_query)
-
-    if existing_entry:
-        logger.info("Device is already registered. Updating existing registration.")
-        # Prepare the update data
-        update_data = {
-            "id_token": entry.id_token,
-            "device_name": entry.device_name,
-            "os_version": entry.os_version,
-            "app_version": entry.app_version,
-            "updated_at": datetime.utcnow()
-        }
-
-        # Update based on google_account_id or device_uuid
-        update_query = device_registration_table.update().where(
-            (device_registration_table.c.google_account_id == entry.google_account_id) |
-            (device_registration_table.c.device_uuid == entry.device_uuid)
-        ).values(**update_data)
-
-        try:
-            await database.execute(update_query)
-            logger.info("Device registration updated successfully.")
-        except Exception as e:
-            logger.error(f"Unexpected error during device registration update: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="An unexpected error occurred during device registration update.",
-            )
-
-        # Retrieve the updated device registration
-        retrieve_query = device_registration_table.select().where(
-            (device_registration_table.c.google_account_id == entry.google_account_id) |
-            (device_registration_table.c.device_uuid == entry.device_uuid)
-        )
-        updated_entry = await database.fetch_one(retrieve_query)
-        logger.info(f"Updated device registration retrieved: {updated_entry}")
-
-        return DeviceRegistrationEntry(**updated_entry)
-    else:
-        # Insert the new device registration
-        query = device_registration_table.insert().values(
+    # One upsert creates the account and device, or refreshes the tokens of a known device
+    try:
+        registration = await upsert_device(
             google_account_id=entry.google_account_id,
             device_uuid=entry.device_uuid,
             id_token=entry.id_token,
             device_name=entry.device_name,
             os_version=entry.os_version,
             app_version=entry.app_version,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
         )
+    except Exception as e:
+        logger.error(f"Unexpected error during device registration: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred during device registration.",
+        )
+    # Drops the cached "not registered" answers for this account and device
+    device_identity_cache.invalidate(entry.google_account_id, entry.device_uuid)
+    logger.info(f"Device registration {registration['id']} stored for account {registration['account_id']}")
+
+    # Send Telegram notification (if implemented)
+    """
+    if notifier:
         try:
-            last_record_id = await database.execute(query)
-            logger.info(f"Inserted device registration with ID: {last_record_id}")
-        except sqlalchemy.exc.IntegrityError as ie:
-            logger.error(f"IntegrityError: {ie}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="A device with this Google Account ID or Device UUID already exists.",
+            await notifier.send_new_device_registration(
+                google_account_id=registration['google_account_id'],
+                device_uuid=registration['device_uuid'],
+                # referral_source=new_entry['referral_source']
             )
+            logger.info(f"Telegram notification sent for device registration ID: {registration['id']}")
         except Exception as e:
-            logger.error(f"Unexpected error during device registration: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="An unexpected error occurred during device registration.",
-            )
-
-        # Retrieve the created device registration
-        query = device_registration_table.select().where(device_registration_table.c.id == last_record_id)
-        new_entry = await database.fetch_one(query)
-        logger.info(f"New device registration retrieved: {new_entry}")
-
-        # Send Telegram notification (if implemented)
-        """
-        if notifier:
-            try:
-                await notifier.send_new_device_registration(
-                    google_account_id=new_entry['google_account_id'],
-                    device_uuid=new_entry['device_uuid'],
-                    # referral_source=new_entry['referral_source']
-                )
-                logger.info(f"Telegram notification sent for device registration ID: {last_record_id}")
-            except Exception as e:
-                logger.error(f"Failed to send Telegram notification: {e}")
-                # Optionally, decide whether to fail the request or continue
-        """
-        return DeviceRegistrationEntry(**new_entry)
+            logger.error(f"Failed to send Telegram notification: {e}")
+            # Optionally, decide whether to fail the request or continue
+    """
+    return DeviceRegistrationEntry(**registration)
 
 @router.get(
     "/register/{entry_id}",
@@ -234,8 +202,7 @@ async def get_device_registration(entry_id: int):
     - **entry_id**: The ID of the device registration to retrieve.
     """
     logger.info(f"Retrieving device registration with ID: {entry_id}")
-    query = device_registration_table.select().where(device_registration_table.c.id == entry_id)
-    entry = await database.fetch_one(query)
+    entry = await REGISTRATION_BY_ID.fetch_one(id=entry_id)
     if entry is None:
         logger.warning(f"Device registration with ID {entry_id} not found.")
         raise HTTPException(status_code=404, detail="Device registration not found")
@@ -245,15 +212,34 @@ async def get_device_registration(entry_id: int):
 @router.get(
     "/register",
     response_model=List[DeviceRegistrationEntry],
-    summary="List all device registrations"
+    summary="List device registrations, newest first, one page at a time"
 )
-async def list_device_registrations():
+async def list_device_registrations(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page")
+):
     """
-    Lists all device registrations, ordered by creation date descending.
+    Lists device registrations, ordered by creation date descending.
+
+    - **limit**: Page size.
+    - **cursor**: Resume after the last row of a previous page. While more rows remain, the
+      response carries the cursor for the next page in the `X-Next-Cursor` header.
     """
-    logger.info("Listing all device registrations.")
-    query = device_registration_table.select().order_by(device_registration_table.c.created_at.desc())
-    entries = await database.fetch_all(query)
+    logger.info("Listing device registrations.")
+    query = registration_select().order_by(devices_table.c.created_at.desc(), devices_table.c.id.desc())
+    if cursor:
+        try:
+            created_at, entry_id = decode_cursor(cursor, datetime.fromisoformat, int)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        # Seeks ix_devices_created_id instead of skipping over earlier pages
+        query = query.where(tuple_(devices_table.c.created_at, devices_table.c.id) < tuple_(created_at, entry_id))
+    # One extra row tells whether another page follows
+    entries = await read_database.fetch_all(query.limit(limit + 1))
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(entries[-1]["created_at"], entries[-1]["id"])
     logger.info(f"Number of device registrations retrieved: {len(entries)}")
     return [DeviceRegistrationEntry(**entry) for entry in entries]
 
@@ -280,23 +266,31 @@ async def update_device_registration(entry_id: int, entry: DeviceRegistrationUpd
             detail="No fields provided for update.",
         )
 
-    # Execute the update
-    query = (
-        device_registration_table.update()
-        .where(device_registration_table.c.id == entry_id)
-        .values(**update_data, updated_at=datetime.utcnow())
-    )
+    existing = await REGISTRATION_BY_ID.fetch_one(id=entry_id)
+    if existing is None:
+        logger.warning(f"Device registration with ID {entry_id} not found for update.")
+        raise HTTPException(status_code=404, detail="Device registration not found")
+
     try:
-        result = await database.execute(query)
-        if not result:
-            logger.warning(f"Device registration with ID {entry_id} not found for update.")
-            raise HTTPException(status_code=404, detail="Device registration not found")
+        # Moving a device to another Google account re-parents it (creating that account if needed)
+        google_account_id = update_data.pop("google_account_id", None)
+        if google_account_id:
+            update_data["account_id"] = await account_id_for(google_account_id)
+        query = (
+            devices_table.update()
+            .where(devices_table.c.id == entry_id)
+            .values(**update_data, updated_at=datetime.utcnow())
+        )
+        await database.execute(query)
+        device_identity_cache.invalidate(existing["google_account_id"], existing["device_uuid"], existing["account_id"])
+        if google_account_id or entry.device_uuid:
+            device_identity_cache.invalidate(google_account_id, entry.device_uuid)
         logger.info(f"Device registration ID {entry_id} updated successfully.")
     except sqlalchemy.exc.IntegrityError as ie:
         logger.error(f"IntegrityError: {ie}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="A device with the provided Google Account ID or Device UUID already exists.",
+            detail="This device is already registered to that Google account.",
         )
     except Exception as e:
         logger.error(f"Unexpected error during update: {e}")
@@ -306,11 +300,7 @@ async def update_device_registration(entry_id: int, entry: DeviceRegistrationUpd
         )
 
     # Fetch the updated device registration
-    query = device_registration_table.select().where(device_registration_table.c.id == entry_id)
-    updated_entry = await database.fetch_one(query)
-    if updated_entry is None:
-        logger.warning(f"Device registration with ID {entry_id} not found after update.")
-        raise HTTPException(status_code=404, detail="Device registration not found")
+    updated_entry = await REGISTRATION_BY_ID.fetch_one(id=entry_id)
     logger.info(f"Updated device registration retrieved: {updated_entry}")
     return DeviceRegistrationEntry(**updated_entry)
 
@@ -328,16 +318,16 @@ async def delete_device_registration(entry_id: int):
     logger.info(f"Deleting device registration with ID: {entry_id}")
 
     # Check if the device registration exists
-    query = device_registration_table.select().where(device_registration_table.c.id == entry_id)
-    entry = await database.fetch_one(query)
+    entry = await REGISTRATION_BY_ID.fetch_one(id=entry_id)
     if entry is None:
         logger.warning(f"Device registration with ID {entry_id} not found for deletion.")
         raise HTTPException(status_code=404, detail="Device registration not found")
 
-    # Perform the deletion
-    delete_query = device_registration_table.delete().where(device_registration_table.c.id == entry_id)
+    # Perform the deletion; the account (and its processed audio) stays
+    delete_query = devices_table.delete().where(devices_table.c.id == entry_id)
     try:
         await database.execute(delete_query)
+        device_identity_cache.invalidate(entry["google_account_id"], entry["device_uuid"], entry["account_id"])
         logger.info(f"Device registration ID {entry_id} deleted successfully.")
     except Exception as e:
         logger.error(f"Unexpected error during deletion: {e}")
@@ -373,20 +363,9 @@ async def check_device_registration(check: DeviceRegistrationCheck):
             detail="At least one identifier (google_account_id or device_uuid) must be provided.",
         )
 
-    # Build the query based on provided identifiers
-    query = device_registration_table.select()
-    if check.google_account_id and check.device_uuid:
-        query = query.where(
-            (device_registration_table.c.google_account_id == check.google_account_id) &
-            (device_registration_table.c.device_uuid == check.device_uuid)
-        )
-    elif check.google_account_id:
-        query = query.where(device_registration_table.c.google_account_id == check.google_account_id)
-    elif check.device_uuid:
-        query = query.where(device_registration_table.c.device_uuid == check.device_uuid)
-
-    # Execute the query
-    entry = await database.fetch_one(query)
+    # Precompiled lookup for the identifiers provided; an account alone reports its most recently registered device
+    statement = registration_check_statement(check.google_account_id, check.device_uuid)
+    entry = await statement.fetch_one(google_account_id=check.google_account_id, device_uuid=check.device_uuid)
     if entry:
         logger.info("Device is registered.")
         device_entry = DeviceRegistrationEntry(**entry)
@@ -395,6 +374,59 @@ async def check_device_registration(check: DeviceRegistrationCheck):
         logger.info("Device is not registered.")
         return DeviceRegistrationCheckResponse(is_registered=False, device=None)
 
+# === Bulk Endpoints ===
+
+@router.post(
+    "/register/bulk",
+    response_model=List[DeviceRegistrationEntry],
+    status_code=status.HTTP_200_OK,
+    summary="Register or refresh many devices at once",
+)
+async def register_devices_bulk(batch: DeviceRegistrationBulkCreate):
+    """
+    Registers up to MAX_BULK_DEVICES devices with two multi-row upserts (accounts, then devices)
+    instead of one request per device. The upserts run without a transaction between them, so a
+    failure can leave accounts without their devices; both are idempotent, and retrying the
+    request completes the registration. Returns the registrations in request order; a device
+    listed twice is stored once, with its last values.
+    """
+    logger.info(f"Bulk registering {len(batch.devices)} devices.")
+    try:
+        registrations = await upsert_devices([entry.model_dump() for entry in batch.devices])
+    except Exception as e:
+        logger.error(f"Unexpected error during bulk device registration: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred during bulk device registration.",
+        )
+    device_identity_cache.invalidate_many((entry.google_account_id, entry.device_uuid) for entry in batch.devices)
+    return [DeviceRegistrationEntry(**registration) for registration in registrations]
+
+@router.post(
+    "/register/check/bulk",
+    response_model=DeviceRegistrationBulkCheckResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Check whether many devices are registered",
+)
+async def check_device_registrations_bulk(batch: DeviceRegistrationBulkCheck):
+    """
+    Answers /register/check for up to MAX_BULK_DEVICES identities with a single query.
+    Every item needs a google_account_id, a device_uuid or both.
+    """
+    if any(not check.google_account_id and not check.device_uuid for check in batch.devices):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Every item needs at least one identifier (google_account_id or device_uuid).",
+        )
+    registrations = await find_registrations([(check.google_account_id, check.device_uuid) for check in batch.devices])
+    return DeviceRegistrationBulkCheckResponse(results=[
+        DeviceRegistrationCheckResponse(
+            is_registered=registration is not None,
+            device=DeviceRegistrationEntry(**registration) if registration else None
+        )
+        for registration in registrations
+    ])
+
 # === Event Handlers ===
 
     # Initialize TelegramNotifier
@@ -407,4 +439,4 @@ async def check_device_registration(check: DeviceRegistrationCheck):
 
     #if notifier:
         # Cleanup notifier if necessary
-        # pass
\ No newline at end of file
+        # pass
@@ -1,23 +1,36 @@
 # backend/route/website_services/waitlist_router.py
 
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict, EmailStr, root_validator
-from datetime import datetime
+from datetime import datetime, timedelta
+import csv
+import hmac
+import io
+import json
 import logging
+import os
 
+from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
 
 # Import the database components from the db module
 from database.waitlist import database, waitlist_table
+from utils.db_state import read_database
 
 # Import the TelegramNotifier class from the notification module
 from utils._extensions.telegram_notification import TelegramNotifier  # Adjust the import path as necessary
+from utils.pagination import decode_cursor, encode_cursor
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+EXPORT_CHUNK_ROWS = 1000  # rows fetched per query while streaming an export
+EXPORT_COLUMNS = ("id", "name", "email", "ip_address", "comment", "referral_source", "created_at")
+WAITLIST_EXPORT_TOKEN = os.getenv("WAITLIST_EXPORT_TOKEN", "")  # bearer token for /export and /summary; unset disables them
+
 # Initialize the router
 router = APIRouter(prefix="/waitlist", tags=["Waitlist CRUD"])
 
@@ -105,7 +118,7 @@ async def create_entry(entry: WaitlistCreate, request: Request):
     new_entry = await database.fetch_one(query)
     logger.info(f"New entry retrieved: {new_entry}")
 
-    # Send a Telegram notification for the new entry
+    # Queue a Telegram notification for the new entry; the dispatcher sends it in the background
     if notifier:
         try:
             await notifier.send_new_waitlist_entry(
@@ -114,7 +127,7 @@ async def create_entry(entry: WaitlistCreate, request: Request):
                 comment=new_entry['comment'],
                 referral_source=new_entry['referral_source'],  # Include referral_source
             )
-            logger.info(f"Telegram notification sent for entry ID: {last_record_id}")
+            logger.info(f"Telegram notification queued for entry ID: {last_record_id}")
         except Exception as e:
             logger.error(f"Failed to send Telegram notification: {e}")
             # Optionally, you can choose to raise an exception or continue
@@ -122,6 +135,132 @@ async def create_entry(entry: WaitlistCreate, request: Request):
     return new_entry
 
 
+# TODO: DUE TO THE notifications with telegram we no longer need to make the list accessible via post requests i believe, its highly unsafe and bad user usage
+@router.get(
+    "/", response_model=List[WaitlistEntry], summary="List waitlist entries, newest first, one page at a time"
+)
+async def list_entries(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page")
+):
+    """
+    Retrieve waitlist entries, newest first. While more entries remain,
+    the `X-Next-Cursor` response header holds the cursor for the next page.
+    """
+    logger.info("Listing waitlist entries.")
+    # Keyed on id alone: ids follow insertion order, and created_at can't be compared reliably on
+    # SQLite (server-default values have no fractional seconds, bound datetimes do)
+    query = waitlist_table.select().order_by(waitlist_table.c.id.desc())
+    if cursor:
+        try:
+            (entry_id,) = decode_cursor(cursor, int)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        # Seeks the primary key, so deep pages cost the same as the first
+        query = query.where(waitlist_table.c.id < entry_id)
+    # One extra row tells whether another page follows
+    entries = await read_database.fetch_all(query.limit(limit + 1))
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(entries[-1]["id"])
+    logger.info(f"Number of entries retrieved: {len(entries)}")
+    return entries
+
+
+async def export_rows(chunk_rows: int = EXPORT_CHUNK_ROWS) -> AsyncIterator[List[Dict]]:
+    """Every waitlist row, oldest first, fetched `chunk_rows` at a time by keyset on id."""
+    after = None
+    while True:
+        query = waitlist_table.select().order_by(waitlist_table.c.id)
+        if after is not None:
+            query = query.where(waitlist_table.c.id > after)
+        rows = await read_database.fetch_all(query.limit(chunk_rows))
+        if not rows:
+            return
+        yield [{column: row[column] for column in EXPORT_COLUMNS} for row in rows]
+        if len(rows) < chunk_rows:
+            return
+        after = rows[-1]["id"]
+
+async def ndjson_lines() -> AsyncIterator[str]:
+    async for rows in export_rows():
+        yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+
+async def csv_lines() -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    async for rows in export_rows():
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty waitlist
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def require_export_token(request: Request):
+    """Gate for the bulk waitlist endpoints, like /analytics/export (they expose every email and IP)."""
+    if not WAITLIST_EXPORT_TOKEN:
+        raise HTTPException(status_code=404, detail="Waitlist export is disabled")
+    authorization = request.headers.get("authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {WAITLIST_EXPORT_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid export token")
+
+@router.get("/export", summary="Stream every waitlist entry as NDJSON or CSV")
+async def export_entries(request: Request, format: Literal["ndjson", "csv"] = "ndjson"):
+    """
+    Stream the whole waitlist, oldest first. Rows are read EXPORT_CHUNK_ROWS at a time and sent
+    as they arrive, so memory stays flat however long the waitlist grows.
+    """
+    require_export_token(request)
+    logger.info(f"Exporting waitlist as {format}.")
+    if format == "csv":
+        return StreamingResponse(
+            csv_lines(),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="waitlist.csv"'}
+        )
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@router.get("/summary", summary="Waitlist counts without loading entries")
+async def summarize_entries(
+    request: Request,
+    days: int = Query(30, ge=1, le=366, description="Length of the daily signup series")
+):
+    """
+    Total signups, signups per referral source and per day over the last `days` days, and the
+    first/latest signup times. Every figure is an aggregate query; no entries are loaded.
+    """
+    require_export_token(request)
+    totals = await read_database.fetch_one(select(
+        func.count().label("total"),
+        func.min(waitlist_table.c.created_at).label("first_signup"),
+        func.max(waitlist_table.c.created_at).label("latest_signup"),
+    ).select_from(waitlist_table))
+    referral_source = waitlist_table.c.referral_source
+    by_source = await read_database.fetch_all(
+        select(referral_source, func.count().label("count"))
+        .group_by(referral_source)
+        .order_by(func.count().desc())
+    )
+    day = func.date(waitlist_table.c.created_at)
+    daily = await read_database.fetch_all(
+        select(day.label("day"), func.count().label("count"))
+        .where(waitlist_table.c.created_at >= datetime.utcnow() - timedelta(days=days))
+        .group_by(day)
+        .order_by(day)
+    )
+    return {
+        "total": totals["total"],
+        "first_signup": totals["first_signup"],
+        "latest_signup": totals["latest_signup"],
+        "by_referral_source": [{"referral_source": row["referral_source"], "count": row["count"]} for row in by_source],
+        "daily": [{"day": str(row["day"]), "count": row["count"]} for row in daily],
+    }
+
+
 @router.get(
     "/{entry_id}",
     response_model=WaitlistEntry,
@@ -141,21 +280,6 @@ async def get_entry(entry_id: int):
     return entry
 
 
-# TODO: DUE TO THE notifications with telegram we no longer need to make the list accessible via post requests i believe, its highly unsafe and bad user usage
-@router.get(
-    "/", response_model=List[WaitlistEntry], summary="List all waitlist entries"
-)
-async def list_entries():
-    """
-    Retrieve all waitlist entries, ordered by creation date descending.
-    """
-    logger.info("Listing all waitlist entries.")
-    query = waitlist_table.select().order_by(waitlist_table.c.created_at.desc())
-    entries = await database.fetch_all(query)
-    logger.info(f"Number of entries retrieved: {len(entries)}")
-    return entries
-
-
 @router.put(
     "/{entry_id}", response_model=WaitlistEntry, summary="Update a waitlist entry by ID"
 )
@@ -214,7 +338,7 @@ async def update_entry(entry_id: int, entry: WaitlistUpdate):
                 comment=updated_entry['comment'],
                 referral_source=updated_entry['referral_source'],
             )
-            logger.info(f"Telegram notification sent for updated entry ID: {entry_id}")
+            logger.info(f"Telegram notification queued for updated entry ID: {entry_id}")
         except Exception as e:
             logger.error(f"Failed to send Telegram notification for update: {e}")
             # Decide whether to raise an exception or continue
@@ -254,22 +378,15 @@ async def delete_entry(entry_id: int):
     return {"message": "Entry deleted successfully", "entry_id": entry_id}
 
 
-# Event handlers to connect/disconnect the database and initialize/close the TelegramNotifier
+# Event handlers to initialize/close the TelegramNotifier; database/lifecycle.py owns the database connection
 
 @router.on_event("startup")
 async def startup():
-    logger.info("Starting up and connecting to the database.")
-    try:
-        await database.connect()
-        logger.info("Database connected successfully.")
-    except Exception as e:
-        logger.error(f"Error connecting to the database: {e}")
-        raise
-
     # Initialize the TelegramNotifier during startup
     global notifier  # Declare notifier as global to modify the global variable
     try:
         notifier = TelegramNotifier()
+        notifier.start()
         logger.info("TelegramNotifier initialized successfully.")
     except Exception as e:
         logger.error(f"Failed to initialize TelegramNotifier: {e}")
@@ -279,13 +396,6 @@ async def startup():
 
 @router.on_event("shutdown")
 async def shutdown():
-    logger.info("Shutting down and disconnecting from the database.")
-    try:
-        await database.disconnect()
-        logger.info("Database disconnected successfully.")
-    except Exception as e:
-        logger.error(f"Error disconnecting from the database: {e}")
-
     # Close the TelegramNotifier during shutdown
     if notifier:
         try:
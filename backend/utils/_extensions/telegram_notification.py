@@ -3,13 +3,46 @@
 
 import os
 import logging
-from typing import Optional
+import time
+from typing import Dict, List, Optional
 from aiogram import Bot, types
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramConflictError,
+    TelegramEntityTooLarge,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+    TelegramUnauthorizedError,
+)
 import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Background dispatch: notifications are queued and sent by one task, so callers never wait on Telegram
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", "1000"))
+TELEGRAM_MIN_INTERVAL = float(os.getenv("TELEGRAM_MIN_INTERVAL", "1.0"))  # seconds between sends to the chat
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+TELEGRAM_DRAIN_TIMEOUT = float(os.getenv("TELEGRAM_DRAIN_TIMEOUT", "10"))  # seconds close() waits for the queue
+TELEGRAM_MESSAGE_LIMIT = 4096  # Telegram's maximum message length
+DIGEST_SEPARATOR = "\n\n――――――\n\n"
+# 4xx responses: sending the same message again fails the same way
+PERMANENT_ERRORS = (
+    TelegramBadRequest,
+    TelegramConflictError,
+    TelegramEntityTooLarge,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramUnauthorizedError,
+)
+
+def escape_markdown(text: str) -> str:
+    """Escape user-supplied text for parse_mode="Markdown", so e.g. john_doe@x.com can't break parsing."""
+    for character in ("_", "*", "`", "["):
+        text = text.replace(character, "\\" + character)
+    return text
+
 class TelegramNotifier:
     def __init__(self):
         # Initialize logger
@@ -34,8 +67,118 @@ class TelegramNotifier:
 
         # Initialize the bot
         self.bot = Bot(token=self.TELEGRAM_BOT_TOKEN)
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.digests = 0
+        self.dropped = 0
+        self.failed = 0
         self.logger.info("TelegramNotifier initialized successfully.")
 
+    def start(self) -> None:
+        """Start the background dispatcher; until then notifications are sent inline."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def notify(self, message: str) -> None:
+        """
+        Queue a message for the dispatcher and return immediately. When the queue is full the
+        message is dropped, so a burst can't grow memory or slow callers down.
+        """
+        if self._dispatcher is None or self._dispatcher.done():
+            await self.send_message(message)
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.logger.warning(f"Telegram queue full, dropped notification ({self.dropped} dropped so far).")
+
+    def _digests(self, messages: List[str]) -> List[List[str]]:
+        """Group queued messages into as few digests as fit Telegram's length limit."""
+        digests: List[List[str]] = []
+        current: List[str] = []
+        size = 0
+        for message in messages:
+            added = len(message) + (len(DIGEST_SEPARATOR) if current else 0)
+            if current and size + added > TELEGRAM_MESSAGE_LIMIT - 64:  # room for the heading
+                digests.append(current)
+                current, size = [], 0
+                added = len(message)
+            current.append(message)
+            size += added
+        digests.append(current)
+        return digests
+
+    @staticmethod
+    def _digest_text(batch: List[str]) -> str:
+        return batch[0] if len(batch) == 1 else f"📬 *{len(batch)} notifications*\n\n" + DIGEST_SEPARATOR.join(batch)
+
+    async def _send_with_retry(self, message: str) -> bool:
+        for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+            try:
+                await self.send_message(message)
+                return True
+            except TelegramRetryAfter as e:
+                # Flood control tells us exactly how long to wait
+                self.logger.warning(f"Telegram rate limit hit, retrying in {e.retry_after}s.")
+                await asyncio.sleep(e.retry_after)
+            except PERMANENT_ERRORS as e:
+                self.logger.error(f"Telegram rejected the notification, not retrying: {e}")
+                return False
+            except Exception:
+                if attempt < TELEGRAM_MAX_RETRIES:
+                    await asyncio.sleep(min(2 ** attempt, 60))
+        self.logger.error(f"Giving up on Telegram notification after {TELEGRAM_MAX_RETRIES + 1} attempts.")
+        return False
+
+    async def _dispatch(self) -> None:
+        """
+        Send queued messages, at most one per TELEGRAM_MIN_INTERVAL. Whatever queues up while a
+        send or the interval is in progress goes out together as a digest on the next send; a
+        digest that fails is resent message by message, so one bad message loses only itself.
+        """
+        last_sent = 0.0
+        while True:
+            messages = [await self.queue.get()]
+            await asyncio.sleep(max(0.0, last_sent + TELEGRAM_MIN_INTERVAL - time.monotonic()))
+            while not self.queue.empty():
+                messages.append(self.queue.get_nowait())
+            try:
+                for batch in self._digests(messages):
+                    delivered = await self._send_with_retry(self._digest_text(batch))
+                    last_sent = time.monotonic()
+                    if delivered:
+                        self.sent += 1
+                        self.digests += len(batch) > 1
+                        continue
+                    if len(batch) == 1:
+                        self.failed += 1
+                        continue
+                    for message in batch:
+                        await asyncio.sleep(max(0.0, last_sent + TELEGRAM_MIN_INTERVAL - time.monotonic()))
+                        delivered = await self._send_with_retry(message)
+                        last_sent = time.monotonic()
+                        if delivered:
+                            self.sent += 1
+                        else:
+                            self.failed += 1
+            except Exception as e:
+                self.logger.error(f"Telegram dispatcher error: {e}")
+            finally:
+                for _ in messages:
+                    self.queue.task_done()
+
+    def stats(self) -> Dict:
+        """Counters for the background dispatcher."""
+        return {
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "digests": self.digests,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
     async def send_message(self, message: str) -> None:
         self.logger.debug(f"Sending Telegram message: {message}")
         try:
@@ -58,14 +201,14 @@ class TelegramNotifier:
         comment: Optional[str] = None, 
         referral_source: Optional[str] = None
     ) -> None:
-        message = f"🆕 *New Waitlist Entry:*\n\n*Name:* {name}\n*Email:* {email}"
+        message = f"🆕 *New Waitlist Entry:*\n\n*Name:* {escape_markdown(name)}\n*Email:* {escape_markdown(email)}"
         if comment:
-            message += f"\n*Comment:* {comment}"
+            message += f"\n*Comment:* {escape_markdown(comment)}"
         if referral_source:
-            message += f"\n*Referral Source:* {referral_source}"
+            message += f"\n*Referral Source:* {escape_markdown(referral_source)}"
 
         self.logger.debug("Formatted message for new waitlist entry.")
-        await self.send_message(message)
+        await self.notify(message)
 
     async def send_updated_waitlist_entry(
         self, 
@@ -74,21 +217,34 @@ class TelegramNotifier:
         comment: Optional[str] = None, 
         referral_source: Optional[str] = None
     ) -> None:
-        message = f"🔄 *Waitlist Entry Updated*\n\n*Name:* {name}\n*Email:* {email}"
+        message = f"🔄 *Waitlist Entry Updated*\n\n*Name:* {escape_markdown(name)}\n*Email:* {escape_markdown(email)}"
         if comment:
-            message += f"\n*Comment:* {comment}"
+            message += f"\n*Comment:* {escape_markdown(comment)}"
         if referral_source:
-            message += f"\n*Referral Source:* {referral_source}"
+            message += f"\n*Referral Source:* {escape_markdown(referral_source)}"
 
         self.logger.debug("Formatted message for updated waitlist entry.")
-        await self.send_message(message)
+        await self.notify(message)
 
     async def close(self) -> None:
+        """Send what is still queued (for up to TELEGRAM_DRAIN_TIMEOUT), then close the bot session."""
+        if self._dispatcher is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), TELEGRAM_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.logger.warning(f"Dropping {self.queue.qsize()} unsent Telegram notifications on shutdown.")
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
         await self.bot.session.close()
 
 if __name__ == "__main__":
     async def main():
         notifier = TelegramNotifier()
+        notifier.start()
         await notifier.send_new_waitlist_entry("John Doe", "john@example.com", "Looking forward!", "referral:google")
         await notifier.close()
 
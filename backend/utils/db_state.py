@@ -17,11 +17,11 @@ load_dotenv()
 # Define the base directory and database name
 BASE_DIR = Path(__file__).resolve().parent.parent / "data"
 DATABASE_NAME = "development.db"
-DATABASE_PATH = BASE_DIR / DATABASE_NAME
+DATABASE_PATH = Path(os.getenv("DATABASE_PATH") or BASE_DIR / DATABASE_NAME)
 
 # Ensure the directory exists
-BASE_DIR.mkdir(parents=True, exist_ok=True)
-logger.info(f"Database directory ensured at: {BASE_DIR.as_posix()}")
+DATABASE_PATH.parent.mkdir(parents=True, exist_ok=True)
+logger.info(f"Database directory ensured at: {DATABASE_PATH.parent.as_posix()}")
 
 # Get environment
 ENV = os.getenv("ENVIRONMENT", "development")
@@ -38,16 +38,58 @@ else:
     DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH.as_posix()}"
     logger.info(f"Using development SQLite database at: {DATABASE_PATH}")
 
-# Initialize database connection
-database = databases.Database(DATABASE_URL)
+# === Connection Pool ===
+# Supabase caps connections per project, so the asyncpg pool is bounded explicitly
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+# Seconds before a statement is cancelled (Postgres) or gives up on a locked database (SQLite); 0 disables
+DATABASE_STATEMENT_TIMEOUT = float(os.getenv("DATABASE_STATEMENT_TIMEOUT", "30"))
+# Optional Postgres read replica for listings and exports that tolerate replication lag
+DATABASE_READ_REPLICA_URL = os.getenv("DATABASE_READ_REPLICA_URL")
+
+def create_database(url: str) -> databases.Database:
+    """A databases.Database for `url` with pool bounds and timeouts applied (not yet connected)."""
+    if url.startswith("sqlite"):
+        # sqlite3's busy timeout; aiosqlite opens a connection per acquire, so there is no pool to size
+        return databases.Database(url, timeout=DATABASE_STATEMENT_TIMEOUT or 5.0)
+    options = {"min_size": DATABASE_POOL_MIN_SIZE, "max_size": DATABASE_POOL_MAX_SIZE}
+    if "sslmode=require" in url:
+        # asyncpg takes SSL as a connect argument, not a URL parameter
+        url, options["ssl"] = url.replace("?sslmode=require", ""), "require"
+    if DATABASE_STATEMENT_TIMEOUT:
+        options["command_timeout"] = DATABASE_STATEMENT_TIMEOUT
+        options["server_settings"] = {"statement_timeout": str(int(DATABASE_STATEMENT_TIMEOUT * 1000))}
+    return databases.Database(url, **options)
+
+# Initialize database connection; database.lifecycle connects and disconnects it
+database = create_database(DATABASE_URL)
+# Reads that may lag behind writes go here; the primary when no replica is configured
+if ENV == "production" and DATABASE_READ_REPLICA_URL:
+    read_database = create_database(DATABASE_READ_REPLICA_URL)
+    logger.info("Routing lag-tolerant reads to the read replica")
+else:
+    read_database = database
 
 # Import and use schema
 from .db_schema import metadata
 
-# Create tables in development (SQLite only)
-if ENV == "development":
+def create_development_tables():
+    """Create any missing tables in the development SQLite database."""
     # Use a sync SQLite URL for table creation
     sync_url = DATABASE_URL.replace("+aiosqlite", "")
     engine = sqlalchemy.create_engine(sync_url)
+    with engine.connect() as connection:
+        # WAL lets readers run alongside the writer instead of failing with "database is locked"
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
     metadata.create_all(engine)
+    # create_all skips tables that already exist, so indexes added to them later are created here
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    engine.dispose()
     logger.info("Created development database tables")
+
+# Create tables in development (SQLite only)
+if ENV == "development":
+    create_development_tables()
@@ -0,0 +1,25 @@
+# utils/pagination.py
+# Opaque keyset cursors for list endpoints. A cursor carries the sort key of the last row on a
+# page, so the next page starts with an index seek instead of re-reading (OFFSET) earlier rows.
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Tuple
+
+def encode_cursor(*values: Any) -> str:
+    """URL-safe cursor for a row's sort key; datetimes are stored as ISO 8601."""
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *parsers: Callable[[Any], Any]) -> Tuple:
+    """
+    The sort key in `cursor`, each part passed through the matching parser
+    (e.g. datetime.fromisoformat, int). Raises ValueError for malformed cursors.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(key, list) or len(key) != len(parsers):
+            raise ValueError
+        return tuple(parse(value) for parse, value in zip(parsers, key))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
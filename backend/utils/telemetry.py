@@ -0,0 +1,222 @@
+# utils/telemetry.py
+# Request-scoped stage timings, Prometheus-format histograms and optional OTLP tracing.
+#
+#   with span("gemini.generate", model=model_name):
+#       ...
+#
+# Every span feeds the `caringmind_stage_duration_seconds` histogram (served on /metrics) and the
+# current request's `Server-Timing` header. When OTEL_EXPORTER_OTLP_ENDPOINT is set and the
+# opentelemetry SDK is installed, spans are exported over OTLP as well.
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "caringmind-backend")
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+# Seconds; spans cover everything from a cached lookup to a multi-minute Gemini call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labelvalues, series in sorted(snapshot.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labelvalues))
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+class Gauge:
+    """Point-in-time values read from `collect` (label values -> value) whenever /metrics is scraped."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labelvalues, value in sorted(self.collect().items()):
+            labels = ",".join(f'{name}="{_escape(label)}"' for name, label in zip(self.labelnames, labelvalues))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+STAGE_SECONDS = Histogram(
+    "caringmind_stage_duration_seconds",
+    "Time spent in each instrumented pipeline stage.",
+    ["stage", "outcome"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "caringmind_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"]
+)
+# Histograms and Gauges rendered on /metrics; other modules append their own
+REGISTRY: List = [STAGE_SECONDS, HTTP_REQUEST_SECONDS]
+
+# (stage, seconds) pairs recorded during the current request, for the Server-Timing header
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+_tracer = None
+
+@contextmanager
+def span(stage: str, **attributes) -> Iterator[None]:
+    """Time a block of work as `stage`. Works in sync and async code; costs a few microseconds."""
+    otel_span = _tracer.start_as_current_span(stage, attributes=attributes) if _tracer else None
+    if otel_span:
+        otel_span.__enter__()
+    error: Optional[BaseException] = None
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage, "error" if error else "ok")
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+        if otel_span:
+            otel_span.__exit__(type(error) if error else None, error, error.__traceback__ if error else None)
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def _server_timing(spans: List[Tuple[str, float]]) -> str:
+    # Concurrent spans of the same stage (e.g. several files) are summed
+    totals: Dict[str, float] = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ", ".join(f'{stage.replace(".", "-")};dur={total * 1000:.1f}' for stage, total in totals.items())
+
+def _route_template(scope) -> str:
+    """
+    Matched route template including its router prefix, e.g. /production/v1/jobs/{job_id}.
+    Templates keep label cardinality bounded; unmatched paths share one series.
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if not path_format:
+        return "unmatched"
+    # scope["route"] is the router's own route, so recover the include prefix from the concrete path
+    try:
+        concrete = path_format.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return path_format
+    path = scope["path"]
+    return path[:-len(concrete)] + path_format if path.endswith(concrete) else path_format
+
+class TelemetryMiddleware:
+    """Pure ASGI middleware: request latency histogram plus a Server-Timing header of the request's spans."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if spans:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(spans).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], _route_template(scope), str(status))
+
+def _configure_otlp():
+    """Export spans over OTLP/HTTP when an endpoint is configured and the SDK is installed."""
+    global _tracer
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.warning(
+            "OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk / opentelemetry-exporter-otlp-proto-http "
+            "are not installed; spans are only recorded as metrics"
+        )
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    # The exporter reads OTEL_EXPORTER_OTLP_ENDPOINT / _HEADERS itself
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(__name__)
+    logger.info(f"Exporting traces over OTLP to {OTEL_EXPORTER_OTLP_ENDPOINT}")
+
+def setup_telemetry(app: FastAPI):
+    """Install the timing middleware and the Prometheus /metrics endpoint."""
+    _configure_otlp()
+    app.add_middleware(TelemetryMiddleware)
+
+    @app.get(METRICS_PATH, include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")